@@ -0,0 +1,159 @@
+"""
+Backend client for the Streamlit frontend.
+
+Streamlit re-runs the whole script on every widget change, so each call here
+goes through one pooled keep-alive session (shared by all users of the
+process) and identical calls are answered from st.cache_data: moving a
+slider no longer re-hits the API with a request it already made. Cached
+functions raise BackendError instead of returning None, so failures are
+never cached.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import streamlit as st
+
+# API Base URL (configurable)
+# Prefer Streamlit secrets, then environment variable, then default to deployed /api base
+API_BASE = (
+    st.secrets.get("API_BASE")
+    if hasattr(st, "secrets") and "API_BASE" in st.secrets
+    else os.getenv("API_BASE", "https://visualise-product-matcher-jina-ai.vercel.app/api")
+).rstrip("/")
+
+POOL_SIZE = int(os.getenv("API_POOL_SIZE", "16"))
+SEARCH_CACHE_TTL = 600  # below the API's 15 min search-session TTL, so cached tokens stay usable
+
+class BackendError(Exception):
+    def __init__(self, status: Optional[int], detail):
+        super().__init__(f"{status} {detail}" if status else str(detail))
+        self.status = status
+        self.detail = detail
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One pooled session per server process: TCP/TLS connections are reused across reruns"""
+    session = requests.Session()
+    # Idempotent GETs retry transient gateway errors; searches are POSTs and never retried
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET"}))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="api")
+
+def _call(method: str, path: str, **kwargs):
+    try:
+        response = get_session().request(method, f"{API_BASE}{path}", **kwargs)
+    except requests.RequestException as e:
+        raise BackendError(None, e)
+    if response.status_code == 200:
+        return response.json()
+    try:
+        detail = response.json().get('detail')
+    except Exception:
+        detail = response.text
+    raise BackendError(response.status_code, detail)
+
+def _resolve_thumbnails(products: list) -> list:
+    """The API links its own resize route by path; make those links absolute for the browser"""
+    for product in products:
+        thumbnails = product.get("thumbnails") or {}
+        for width, url in thumbnails.items():
+            thumbnails[width] = urljoin(API_BASE, url)
+    return products
+
+def _resolve_results(body: dict) -> dict:
+    _resolve_thumbnails([result["product"] for result in body.get("results", [])])
+    return body
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_categories() -> list:
+    return _call("GET", "/categories", timeout=5).get("categories", [])
+
+@st.cache_data(ttl=60, max_entries=200, show_spinner=False)
+def get_products_page(category=None, limit=20, cursor=None) -> dict:
+    """One browse page: {"products": [...], "next_cursor": ...}"""
+    params = {"limit": limit}
+    if category:
+        params["category"] = category
+    if cursor:
+        params["cursor"] = cursor
+    page = _call("GET", "/products/page", params=params, timeout=10)
+    _resolve_thumbnails(page["products"])
+    return page
+
+@st.cache_data(ttl=SEARCH_CACHE_TTL, max_entries=500, show_spinner=False)
+def search_url(image_url, top_k=10, min_similarity=0.25, category=None) -> dict:
+    payload = {
+        "image_url": image_url,
+        "top_k": top_k,
+        "min_similarity": min_similarity
+    }
+    if category:
+        payload["category"] = category
+    return _resolve_results(_call("POST", "/search", json=payload, timeout=30))
+
+def upload_digest(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+@st.cache_data(ttl=SEARCH_CACHE_TTL, max_entries=200, show_spinner=False)
+def search_upload(digest, _file_bytes, filename, content_type, top_k=10, min_similarity=0.25, category=None) -> dict:
+    """Cached on the upload's SHA-256 (`_file_bytes` is not hashed by Streamlit)"""
+    params = {
+        "top_k": top_k,
+        "min_similarity": min_similarity
+    }
+    if category:
+        params["category"] = category
+    return _resolve_results(_call(
+        "POST", "/search-upload",
+        files={"file": (filename, _file_bytes, content_type)},
+        params=params,
+        timeout=30
+    ))
+
+@st.cache_data(ttl=300, max_entries=1000, show_spinner=False)
+def refine_session(token, top_k=10, min_similarity=0.25, category=None, offset=0) -> dict:
+    """Page or re-threshold an earlier search; an expired session raises BackendError (404)"""
+    params = {"offset": offset, "limit": top_k, "min_similarity": min_similarity}
+    if category:
+        params["category"] = category
+    return _resolve_results(_call("GET", f"/search/sessions/{token}", params=params, timeout=10))
+
+def _attach_context(fn):
+    """Run fn on a worker thread with this script run's context, so st.cache_data works there"""
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    ctx = get_script_run_ctx()
+
+    def run(*args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return run
+
+def run_concurrently(*calls) -> list:
+    """
+    Issue independent backend calls at once: each call is (fn, *args). Returns
+    results in order, with the exception in place of a failed call's result.
+    """
+    futures = [get_executor().submit(_attach_context(fn), *args) for fn, *args in calls]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+def prefetch(fn, *args):
+    """Warm the cache for a likely next call (e.g. the next page) without waiting for it"""
+    get_executor().submit(_attach_context(fn), *args)
@@ -0,0 +1,110 @@
+import time
+from urllib.parse import parse_qs
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from app.services.profiling import profiler, token_matches
+
+# Allowance for multipart boundaries and form headers around the file part
+MULTIPART_OVERHEAD = 64 * 1024
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject oversized request bodies on upload routes before they are buffered:
+    an oversized Content-Length is refused without reading the body, and
+    chunked bodies are cut off as soon as the running total passes the cap.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: tuple):
+        self.app = app
+        self.limit = max_bytes + MULTIPART_OVERHEAD
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload exceeds the {(self.limit - MULTIPART_OVERHEAD) / (1024 * 1024):.1f} MB limit"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.limit:
+            response = JSONResponse({"detail": detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    # HTTPException passes through FastAPI's form parsing untouched
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+class ProfilingMiddleware:
+    """
+    Times every API request by stage (see profiling.record_stage) and keeps
+    the slowest ones. A request carrying the configured token in an
+    X-Profile header or a `profile` query parameter is also run under the
+    sampling profiler; the response then names its report in X-Profile-Id.
+    """
+
+    def __init__(self, app, token: str):
+        self.app = app
+        self.token = token
+
+    def _wants_profile(self, scope) -> bool:
+        if not self.token:
+            return False
+        supplied = dict(scope["headers"]).get(b"x-profile", b"").decode("latin-1")
+        if not supplied:
+            supplied = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", [""])[0]
+        return token_matches(supplied, self.token)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/") or scope["path"].startswith("/api/profiling"):
+            await self.app(scope, receive, send)
+            return
+
+        wants_profile = self._wants_profile(scope)
+        sampler = profiler.try_begin() if wants_profile else None
+        timer, token = profiler.start_timer()
+        status = 500
+        profile_headers = []
+        if sampler is not None:
+            # The report is stored under this id once the request completes
+            profile_headers.append((b"x-profile-id", sampler.profile_id.encode()))
+        elif wants_profile:
+            # Another request is being profiled; this one runs normally
+            profile_headers.append((b"x-profile-status", b"busy"))
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile_headers:
+                    message = {**message, "headers": list(message.get("headers", [])) + profile_headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            profiler.stop_timer(token)
+            request = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status,
+                "at": time.time(),
+                "duration_ms": round((time.perf_counter() - timer.started) * 1000, 2),
+                "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in timer.stages.items()},
+            }
+            if sampler is not None:
+                request["profile_id"] = sampler.profile_id
+                profiler.finish(sampler, request)
+                print(f"[PROFILE] {request['method']} {request['path']} in {request['duration_ms']}ms -> /api/profiling/{request['profile_id']}")
+            profiler.record(request)
@@ -1,20 +1,132 @@
 from fastapi import APIRouter, HTTPException, Query, UploadFile, File
-from typing import List, Optional
-import tempfile
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from contextlib import aclosing
+from typing import List, Optional, Tuple
+import asyncio
 import os
 import time
+import httpx
+from bson import ObjectId
+from pydantic import ValidationError
 from app.models.product import (
     ProductResponse,
+    ProductPage,
+    FilterExpr,
     SearchRequest,
     SearchResponse,
-    SearchResult
+    BulkProductRequest,
+    IngestJobStatus
 )
-from app.services.mongodb import get_products, get_product_by_id, get_all_embeddings
-from app.services.jina_embeddings import get_embedding, get_embedding_from_file
-from app.services.similarity import find_similar_products
+from app.services.storage import storage
+from app.services.catalog_index import catalog_index
+from app.services.jina_embeddings import (
+    get_embedding,
+    get_embedding_for_url,
+    get_embedding_from_file,
+    EmbeddingServiceUnavailable
+)
+from app.services.serialization import (
+    search_response_bytes,
+    products_list_bytes,
+    products_ndjson_bytes,
+    product_page_bytes,
+    product_fields
+)
+from app.services.thumbnails import cloudinary_thumbnail, local_thumbnail
+from app.services.uploads import UploadRejected, ingest_upload
+from app.services.ingest import ingest_worker
+from app.services.filters import FilterError, category_filter
+from app.services.search_sessions import search_sessions
+from app.services.result_cache import CachedResult, result_cache
+from app.services.profiling import record_stage
+from app.services.image_hash import match_upload
+from config import settings
 
 router = APIRouter(prefix="/api", tags=["products"])
 
+class JSONBytesResponse(Response):
+    """Pre-serialized JSON body; skips response_model validation and re-encoding"""
+    media_type = "application/json"
+
+def check_query_dim(query_embedding: list, snapshot) -> None:
+    """A mismatch means the query was not embedded like the index; fail loudly instead of returning nothing"""
+    if len(snapshot) and len(query_embedding) != snapshot.dim:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Query embedding has {len(query_embedding)} dimensions but index version "
+                   f"'{snapshot.version.key}' has {snapshot.dim}"
+        )
+
+async def run_search(snapshot, query_embedding: list, top_k: int, min_similarity: float, expr: Optional[FilterExpr]):
+    try:
+        # On a worker thread: a large-catalog scan would otherwise hold up every other request
+        return await asyncio.to_thread(
+            snapshot.search, query_embedding, top_k=top_k, min_similarity=min_similarity, filter=expr
+        )
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {e}")
+
+async def ranked_response(snapshot, query_url: str, query_embedding: list, top_k: int, min_similarity: float, expr) -> Tuple[bytes, int]:
+    """
+    Search and serialize the first page. With sessions enabled, the best
+    candidates (any score) are kept so follow-ups skip embedding and scoring.
+    Repeated searches against the same index generation are answered from
+    the result cache without scoring. Returns (body, results on the page).
+    """
+    key = result_cache.key(snapshot, query_embedding, top_k, min_similarity, expr) if result_cache.enabled else None
+    cached = result_cache.get(key) if key is not None else None
+    if cached is not None:
+        print(f"[SEARCH] Result cache hit ({cached.total} matches)")
+        # The session is this requester's own (token and query_url), over the cached candidates
+        session = None
+        if cached.ids is not None:
+            session = search_sessions.open(query_url, cached.ids, cached.scores, snapshot.version.key)
+        return _page_bytes(query_url, cached, session), len(cached.hits)
+    
+    score_start = time.perf_counter()
+    limit = settings.search_session_candidates
+    session = None
+    if limit <= 0:
+        hits = await run_search(snapshot, query_embedding, top_k, min_similarity, expr)
+        result = CachedResult([(snapshot.fragments[row], score) for row, score in hits], len(hits))
+    else:
+        limit = max(limit, top_k)
+        candidates = await run_search(snapshot, query_embedding, limit, -1.0, expr)
+        session = search_sessions.create(query_url, snapshot, candidates)
+        hits, total = session.page(snapshot, 0, top_k, min_similarity)
+        result = CachedResult(hits, total, session.ids, session.scores)
+    if key is not None:
+        result_cache.set(key, result)
+    record_stage("score", time.perf_counter() - score_start)
+    serialize_start = time.perf_counter()
+    body = _page_bytes(query_url, result, session)
+    record_stage("serialize", time.perf_counter() - serialize_start)
+    return body, len(result.hits)
+
+def _page_bytes(query_url: str, result: CachedResult, session) -> bytes:
+    if session is None:
+        return search_response_bytes(query_url, result.hits)
+    return search_response_bytes(
+        query_url, result.hits, session_token=session.token, total_matches=result.total, offset=0
+    )
+
+def parse_filter_param(filter: Optional[str]) -> Optional[FilterExpr]:
+    """Filter expression passed as a JSON query parameter"""
+    if not filter:
+        return None
+    try:
+        return FilterExpr.model_validate_json(filter)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid filter: {e.errors(include_url=False)}")
+
+def embedding_unavailable(e: Exception) -> HTTPException:
+    """503 with Retry-After so clients back off while Jina is down"""
+    return HTTPException(
+        status_code=503,
+        detail=f"Embedding service temporarily unavailable: {e}",
+        headers={"Retry-After": str(int(settings.jina_breaker_reset))}
+    )
+
 @router.get("/products", response_model=List[ProductResponse])
 async def list_products(
     category: Optional[str] = None,
@@ -22,16 +134,110 @@ async def list_products(
     skip: int = Query(0, ge=0)
 ):
     """List all products with optional category filter"""
-    products = await get_products(category=category, limit=limit, skip=skip, require_embedding=False)
-    return products
+    products = await storage.get_products(
+        category=category, limit=limit, skip=skip,
+        require_embedding=False, include_embedding=False
+    )
+    return JSONBytesResponse(products_list_bytes(products))
+
+@router.get("/products/page", response_model=ProductPage)
+async def list_products_page(
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page")
+):
+    """Browse the catalog with cursor (keyset) paging; deep pages cost the same as the first"""
+    # Cursors are product ids, always ObjectIds; anything else would silently read as the end
+    if cursor is not None and not ObjectId.is_valid(cursor):
+        raise HTTPException(status_code=400, detail="Invalid cursor; pass next_cursor of the previous page")
+    # One extra row tells whether another page exists without a count query
+    products = await storage.get_products_page(category, limit + 1, after=cursor)
+    next_cursor = str(products[limit - 1]["_id"]) if len(products) > limit else None
+    return JSONBytesResponse(product_page_bytes(products[:limit], next_cursor))
+
+@router.get("/products/stream")
+async def stream_products(
+    category: Optional[str] = None,
+    batch_size: int = Query(500, ge=1, le=5000, description="Products read and sent per chunk"),
+    include_embedding: bool = Query(False, description="Add the active version's vector as base64 float32")
+):
+    """
+    The whole catalog (or one category) as NDJSON, one product per line, in a
+    single request. Rows are read from storage batch by batch and sent as they
+    arrive, so memory stays at one batch whatever the catalog size.
+    """
+    version = await storage.get_active_version() if include_embedding else None
+    
+    async def rows():
+        start = time.time()
+        sent = 0
+        completed = False
+        try:
+            # aclosing: a client disconnect cancels us mid-iteration; close the storage cursor right away
+            async with aclosing(storage.iter_products(category, batch_size, version)) as batches:
+                async for batch in batches:
+                    yield products_ndjson_bytes(batch, include_embedding)
+                    sent += len(batch)
+            completed = True
+        finally:
+            status = "done" if completed else "cancelled"
+            print(f"[STREAM] {status}: {sent} products in {time.time() - start:.2f}s (batch {batch_size}, embeddings {include_embedding})")
+    
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+@router.post("/products/bulk", response_model=IngestJobStatus, status_code=202)
+async def bulk_ingest_products(request: BulkProductRequest):
+    """
+    Persist a batch of products and embed them in the background.
+    Poll /api/products/jobs/{job_id} for progress.
+    """
+    job = await ingest_worker.submit([item.model_dump() for item in request.products])
+    return job.to_dict()
+
+@router.get("/products/jobs/{job_id}", response_model=IngestJobStatus)
+async def get_ingest_job(job_id: str):
+    """Progress of a bulk ingestion job"""
+    job = ingest_worker.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get("/products/{product_id}/thumbnail")
+async def get_product_thumbnail(product_id: str, w: int = Query(...)):
+    """Product image resized to width `w` (one of THUMBNAIL_WIDTHS), as WEBP"""
+    if w not in settings.thumbnail_widths:
+        raise HTTPException(status_code=400, detail=f"w must be one of {settings.thumbnail_widths}")
+    product = await storage.get_product_by_id(product_id)
+    if not product or not product.get("url"):
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    cloudinary = cloudinary_thumbnail(product["url"], w)
+    if cloudinary:
+        return RedirectResponse(cloudinary, status_code=302)
+    try:
+        body = await local_thumbnail(product["url"], w)
+    except (httpx.HTTPError, UploadRejected) as e:
+        raise HTTPException(status_code=502, detail=f"Could not fetch product image: {e}")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out fetching product image")
+    except Exception as e:
+        print(f"[THUMBNAIL] Failed for {product_id}: {e}")
+        raise HTTPException(status_code=502, detail="Could not resize product image")
+    
+    # Product images rarely change; browsers and CDNs keep thumbnails for THUMBNAIL_MAX_AGE
+    return Response(
+        body,
+        media_type="image/webp",
+        headers={"Cache-Control": f"public, max-age={settings.thumbnail_max_age}"}
+    )
 
 @router.get("/products/{product_id}", response_model=ProductResponse)
 async def get_product(product_id: str):
     """Get a single product by ID"""
-    product = await get_product_by_id(product_id)
+    product = await storage.get_product_by_id(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return product_fields(product)
 
 @router.post("/search", response_model=SearchResponse)
 async def search_similar_products(request: SearchRequest):
@@ -40,10 +246,26 @@ async def search_similar_products(request: SearchRequest):
     """
     start_time = time.time()
     
-    # Step 1: Get embedding
+    # Step 1: Get the in-memory catalog snapshot; its version decides the query model
+    db_start = time.time()
+    snapshot = await catalog_index.get_snapshot()
+    db_time = time.time() - db_start
+    record_stage("snapshot", db_time)
+    print(f"[SEARCH] Catalog snapshot: {len(snapshot)} products (version {snapshot.version.key}, dim {snapshot.dim}) in {db_time:.3f}s")
+    
+    # Step 2: Get embedding
     print(f"[SEARCH] Getting embedding for: {request.image_url[:50]}...")
     embed_start = time.time()
-    query_embedding = await get_embedding(request.image_url)
+    try:
+        if settings.image_fetch_enabled:
+            # Fetched, cached and downscaled by us; Jina gets compact base64
+            query_embedding = await get_embedding_for_url(request.image_url, snapshot.version)
+        else:
+            query_embedding = await get_embedding(request.image_url, snapshot.version)
+    except EmbeddingServiceUnavailable as e:
+        raise embedding_unavailable(e)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     embed_time = time.time() - embed_start
     print(f"[SEARCH] Embedding took {embed_time:.2f}s")
     
@@ -53,109 +275,84 @@ async def search_similar_products(request: SearchRequest):
             detail="Failed to generate embedding for the provided image URL"
         )
     
-    # Step 2: Get products
-    print(f"[SEARCH] Fetching products from MongoDB...")
-    db_start = time.time()
-    all_products = await get_all_embeddings()
-    db_time = time.time() - db_start
-    print(f"[SEARCH] Fetched {len(all_products)} products in {db_time:.2f}s")
-    # Debug: dimensions snapshot
-    try:
-        dims = {}
-        for p in all_products[:20]:
-            d = len(p.get('embedding') or [])
-            dims[d] = dims.get(d, 0) + 1
-        print(f"[SEARCH] Query dim: {len(query_embedding)}, DB dims (top20 sample): {dims}")
-    except Exception as _:
-        pass
-    
-    # Filter by category if provided
-    if request.category:
-        all_products = [p for p in all_products if p.get('category') == request.category]
-        print(f"[SEARCH] Filtered to {len(all_products)} products in category: {request.category}")
-    
-    # Step 3: Find similar
-    print(f"[SEARCH] Computing similarities...")
+    check_query_dim(query_embedding, snapshot)
+    
+    # Step 3: Find similar (category and attribute filters applied inside the index)
+    # Results are formatted from cached product fragments
     sim_start = time.time()
-    similar = find_similar_products(
-        query_embedding=query_embedding,
-        products=all_products,
-        top_k=request.top_k,
-        min_similarity=request.min_similarity
+    body, found = await ranked_response(
+        snapshot,
+        request.image_url,
+        query_embedding,
+        request.top_k,
+        request.min_similarity,
+        category_filter(request.category, request.filter)
     )
     sim_time = time.time() - sim_start
-    print(f"[SEARCH] Similarity computation took {sim_time:.2f}s")
-    
-    # Format results
-    results = [
-        SearchResult(
-            product=ProductResponse(**product),
-            similarity_score=round(score, 4)
-        )
-        for product, score in similar
-    ]
+    print(f"[SEARCH] Similarity computation took {sim_time:.4f}s")
     
     total_time = time.time() - start_time
-    print(f"[SEARCH] Total search time: {total_time:.2f}s, found {len(results)} results")
+    print(f"[SEARCH] Total search time: {total_time:.2f}s, found {found} results")
     
-    return SearchResponse(
-        query_url=request.image_url,
-        results=results,
-        total_results=len(results)
-    )
+    return JSONBytesResponse(body)
 
 @router.post("/search-upload", response_model=SearchResponse)
 async def search_similar_products_upload(
     file: UploadFile = File(...),
     top_k: int = Query(10, ge=1, le=50),
     min_similarity: float = Query(0.3, ge=0.0, le=1.0),
-    category: Optional[str] = Query(None)
+    category: Optional[str] = Query(None),
+    filter: Optional[str] = Query(None, description="JSON filter expression, same shape as SearchRequest.filter")
 ):
     """
     Search for visually similar products by uploading an image file
     """
     start_time = time.time()
     
-    # Validate file type (handle None content_type)
+    # Validate the filter before reading the upload
+    expr = parse_filter_param(filter)
+    
+    # Cheap pre-check on the client-declared type; the real check sniffs magic bytes below
     content_type = file.content_type or ''
     file_ext = os.path.splitext(file.filename)[1].lower() if file.filename else ''
-    valid_exts = ['.jpg', '.jpeg', '.png', '.webp']
-    disallowed_exts = ['.avif']
-    
-    # Reject AVIF explicitly (Pillow often cannot decode AVIF in server environments)
-    if file_ext in disallowed_exts or content_type == 'image/avif':
+    if file_ext == '.avif' or content_type == 'image/avif':
         raise HTTPException(
             status_code=415,
             detail="AVIF images are not supported. Please upload PNG/JPG/JPEG/WEBP."
         )
-
-    # Accept if content type is image/* OR if extension is valid
-    if not (content_type.startswith('image/') or file_ext in valid_exts):
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Invalid file type. Expected image file, got: {content_type or 'unknown'} with extension {file_ext}"
-        )
     
     print(f"[UPLOAD] Processing file: {file.filename} (type: {content_type}, ext: {file_ext})")
     
-    # Save uploaded file temporarily
-    temp_file = None
     try:
-        # Create temporary file
-        suffix = file_ext or '.jpg'
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            content = await file.read()
-            tmp.write(content)
-            temp_file = tmp.name
+        # Stream the upload in chunks: size cap + magic-byte sniffing, no extra copy
+        try:
+            image_file, sniffed_type, file_size = await ingest_upload(file)
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        print(f"[UPLOAD] Accepted {sniffed_type} ({file_size / 1024:.1f} KB)")
         
-        file_size_kb = len(content) / 1024
-        print(f"[UPLOAD] Saved temp file: {temp_file} ({file_size_kb:.1f} KB)")
+        # The snapshot's version decides which model embeds the query
+        snapshot = await catalog_index.get_snapshot()
         
-        # Get embedding from file
         embed_start = time.time()
-        query_embedding = await get_embedding_from_file(temp_file)
-        embed_time = time.time() - embed_start
-        print(f"[UPLOAD] Embedding took {embed_time:.2f}s")
+        # Decoding and hashing are CPU-bound; keep them off the event loop
+        match = await asyncio.to_thread(match_upload, snapshot, image_file)
+        record_stage("hash_match", time.time() - embed_start)
+        if match is not None:
+            # A catalog image uploaded again: its stored vector is the query, no Jina call
+            row, distance = match
+            query_embedding = snapshot.matrix[row].tolist()
+            print(f"[UPLOAD] Matched catalog image {snapshot.ids[row]} (hash distance {distance}) in {time.time() - embed_start:.3f}s")
+        else:
+            # Get embedding from file
+            try:
+                query_embedding = await get_embedding_from_file(image_file, snapshot.version)
+            except EmbeddingServiceUnavailable as e:
+                raise embedding_unavailable(e)
+            except UploadRejected as e:
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+            embed_time = time.time() - embed_start
+            print(f"[UPLOAD] Embedding took {embed_time:.2f}s")
         
         if not query_embedding:
             raise HTTPException(
@@ -164,43 +361,23 @@ async def search_similar_products_upload(
             )
         
         print(f"[UPLOAD] Got embedding with {len(query_embedding)} dimensions")
+        check_query_dim(query_embedding, snapshot)
         
-        # Get all products with embeddings
-        print(f"[UPLOAD] Fetching products from database...")
-        all_products = await get_all_embeddings()
-        print(f"[UPLOAD] Found {len(all_products)} products with embeddings")
-        
-        # Filter by category if provided
-        if category:
-            all_products = [p for p in all_products if p.get('category') == category]
-            print(f"[UPLOAD] Filtered to {len(all_products)} products in category: {category}")
-        
-        # Find similar products
-        print(f"[UPLOAD] Computing similarities (min threshold: {min_similarity})...")
-        similar = find_similar_products(
-            query_embedding=query_embedding,
-            products=all_products,
-            top_k=top_k,
-            min_similarity=min_similarity
+        # Search the in-memory catalog snapshot
+        print(f"[UPLOAD] Catalog snapshot: {len(snapshot)} products (min threshold: {min_similarity})")
+        body, found = await ranked_response(
+            snapshot,
+            f"uploaded_file: {file.filename}",
+            query_embedding,
+            top_k,
+            min_similarity,
+            category_filter(category, expr)
         )
         
-        # Format results
-        results = [
-            SearchResult(
-                product=ProductResponse(**product),
-                similarity_score=round(score, 4)
-            )
-            for product, score in similar
-        ]
-        
         total_time = time.time() - start_time
-        print(f"[UPLOAD] Total time: {total_time:.2f}s, returning {len(results)} results")
+        print(f"[UPLOAD] Total time: {total_time:.2f}s, returning {found} results")
         
-        return SearchResponse(
-            query_url=f"uploaded_file: {file.filename}",
-            results=results,
-            total_results=len(results)
-        )
+        return JSONBytesResponse(body)
     
     except HTTPException:
         raise
@@ -209,14 +386,35 @@ async def search_similar_products_upload(
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        # Clean up temp file
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.unlink(temp_file)
-                print(f"[UPLOAD] Cleaned up temp file")
-            except:
-                pass
+
+@router.get("/search/sessions/{token}", response_model=SearchResponse)
+async def page_search_session(
+    token: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    min_similarity: float = Query(0.0, ge=-1.0, le=1.0),
+    category: Optional[str] = Query(None),
+    filter: Optional[str] = Query(None, description="JSON filter expression; narrows the original search's filter")
+):
+    """
+    Page, re-threshold or further filter the ranked candidates of an earlier
+    search. No embedding and no scoring: answered from the session cache.
+    """
+    session = search_sessions.get(token)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Search session expired or unknown; run the search again")
+    expr = category_filter(category, parse_filter_param(filter))
+    snapshot = await catalog_index.get_snapshot()
+    if snapshot.version.key != session.version_key:
+        # Scores from another embedding model do not rank against this index
+        raise HTTPException(status_code=404, detail="Search session expired or unknown; run the search again")
+    try:
+        hits, total = session.page(snapshot, offset, limit, min_similarity, expr)
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {e}")
+    return JSONBytesResponse(search_response_bytes(
+        session.query_url, hits, session_token=session.token, total_matches=total, offset=offset
+    ))
 
 @router.get("/categories")
 async def get_categories():
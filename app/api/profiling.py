@@ -0,0 +1,55 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.services.profiling import profiler, token_matches
+from config import settings
+
+router = APIRouter(prefix="/api/profiling", tags=["profiling"])
+
+def require_token(header: Optional[str], query: Optional[str]):
+    """Profiling data exposes code paths and queries: only for holders of PROFILING_TOKEN"""
+    supplied = header or query
+    if not token_matches(supplied, settings.profiling_token):
+        # Indistinguishable from a missing route when profiling is off or the token is wrong
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@router.get("/slowest")
+async def slowest_requests(
+    x_profile: Optional[str] = Header(None),
+    token: Optional[str] = Query(None)
+):
+    """Slowest API requests of the rolling window, slowest first, with per-stage milliseconds"""
+    require_token(x_profile, token)
+    return {
+        "window_s": settings.profiling_slowest_window,
+        "requests": profiler.slowest(),
+    }
+
+@router.delete("/slowest")
+async def reset_slowest_requests(
+    x_profile: Optional[str] = Header(None),
+    token: Optional[str] = Query(None)
+):
+    require_token(x_profile, token)
+    profiler.reset()
+    return {"status": "reset"}
+
+@router.get("/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("folded", pattern="^(folded|json)$"),
+    x_profile: Optional[str] = Header(None),
+    token: Optional[str] = Query(None)
+):
+    """
+    Report of a profiled request. `folded` (default) is collapsed-stack text
+    for flamegraph.pl, inferno or speedscope; `json` adds the request, its
+    stage timings and sample count.
+    """
+    require_token(x_profile, token)
+    report = profiler.get_report(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found or expired")
+    if format == "folded":
+        return PlainTextResponse(report["folded"])
+    return report
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, StrictBool, model_validator
+from typing import Dict, Optional, List, Union
+
+FilterValue = Union[StrictBool, int, float, str]
 
 class ProductResponse(BaseModel):
     id: str = Field(..., alias="_id")
@@ -7,15 +9,57 @@ class ProductResponse(BaseModel):
     category: str
     url: str
     embedding_dim: Optional[int] = None
+    # Resized image URL per width in pixels ("160", "320", ...), for srcset
+    thumbnails: Optional[Dict[str, str]] = None
     
     class Config:
         populate_by_name = True
 
+class ProductPage(BaseModel):
+    """One page of the catalog; pass next_cursor back as `cursor` for the next one"""
+    products: List[ProductResponse]
+    next_cursor: Optional[str] = None
+
+class FilterExpr(BaseModel):
+    """
+    Metadata filter over product attributes. Either a predicate on one field
+    ({"field": "brand", "in": ["acme", "globex"]}, {"field": "price", "gte": 10, "lt": 50})
+    or a combination ({"and": [...]}, {"or": [...]}, {"not": {...}}).
+    Missing values never match a predicate, so `not` includes them.
+    """
+    field: Optional[str] = None
+    eq: Optional[FilterValue] = None
+    in_: Optional[List[FilterValue]] = Field(None, alias="in", max_length=1000)
+    gt: Optional[float] = None
+    gte: Optional[float] = None
+    lt: Optional[float] = None
+    lte: Optional[float] = None
+    and_: Optional[List["FilterExpr"]] = Field(None, alias="and", max_length=32)
+    or_: Optional[List["FilterExpr"]] = Field(None, alias="or", max_length=32)
+    not_: Optional["FilterExpr"] = Field(None, alias="not")
+    
+    class Config:
+        populate_by_name = True
+    
+    def has_range(self) -> bool:
+        return any(bound is not None for bound in (self.gt, self.gte, self.lt, self.lte))
+    
+    @model_validator(mode="after")
+    def check_shape(self):
+        combinators = sum(x is not None for x in (self.and_, self.or_, self.not_))
+        is_predicate = self.field is not None
+        if combinators + is_predicate != 1:
+            raise ValueError("a filter is exactly one of: a field predicate, 'and', 'or' or 'not'")
+        if is_predicate and self.eq is None and self.in_ is None and not self.has_range():
+            raise ValueError(f"predicate on '{self.field}' needs eq, in or a range (gt/gte/lt/lte)")
+        return self
+
 class SearchRequest(BaseModel):
     image_url: str
     top_k: int = 10
     min_similarity: float = 0.0
     category: Optional[str] = None
+    filter: Optional[FilterExpr] = None
 
 class SearchResult(BaseModel):
     product: ProductResponse
@@ -25,3 +69,27 @@ class SearchResponse(BaseModel):
     query_url: str
     results: List[SearchResult]
     total_results: int
+    # Search session: page/refine via GET /api/search/sessions/{session_token}
+    session_token: Optional[str] = None
+    total_matches: Optional[int] = None
+    offset: int = 0
+
+class BulkProductItem(BaseModel):
+    name: str
+    category: str
+    url: str
+
+class BulkProductRequest(BaseModel):
+    products: List[BulkProductItem] = Field(..., min_length=1, max_length=5000)
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    status: str  # queued | running | completed | failed
+    total: int
+    inserted: int = 0
+    skipped: int = 0
+    embedded: int = 0
+    failed: int = 0
+    errors: List[str] = []
+    created_at: float
+    finished_at: Optional[float] = None
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+class TTLCache:
+    """
+    Bounded LRU mapping whose entries expire `ttl` seconds after they were
+    stored. Single event loop use; expired entries are dropped lazily.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+def write_atomic(path: str, data: bytes):
+    """Write through a uniquely named temp file and rename, so readers never see a partial file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+class DiskBudget:
+    """
+    Byte budget of an on-disk cache directory. Files ending in `suffix` are
+    the entries, and files with the same stem and a `sidecars` suffix go with
+    them. Once the entries outgrow max_bytes, the least recently used (oldest
+    mtime; readers touch() hits) are evicted. Blocking: call from a thread.
+    """
+
+    def __init__(self, suffix: str, sidecars: Tuple[str, ...] = ()):
+        self.suffix = suffix
+        self.sidecars = sidecars
+        # Bytes on disk, counted on first use and kept up to date afterwards
+        self.size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def touch(path: str):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _entries(self, root: str):
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.endswith(self.suffix):
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def account(self, root: str, max_bytes: int, written: int) -> int:
+        """Add `written` bytes to the budget and evict as needed; returns the number evicted"""
+        with self._lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self._entries(root))
+            else:
+                self.size += written
+            if self.size <= max_bytes:
+                return 0
+            entries = sorted(self._entries(root))
+            # Down to 90% so the next few writes do not trigger another walk
+            target = 0.9 * max_bytes
+            total = sum(size for _, size, _ in entries)
+            evicted = 0
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                stem = path[:-len(self.suffix)]
+                for victim in (path, *(stem + sidecar for sidecar in self.sidecars)):
+                    try:
+                        os.remove(victim)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+                evicted += 1
+            self.size = total
+            return evicted
@@ -0,0 +1,411 @@
+import asyncio
+import copy
+import math
+import time
+import numpy as np
+from collections import Counter, OrderedDict
+from typing import Iterable, List, Optional, Tuple
+from config import settings
+from app.services.storage import storage
+from app.services.embedding_versions import DEFAULT_VERSION, EmbeddingVersion
+from app.services.serialization import product_fragment
+from app.services.similarity import normalize_rows
+from app.services.parallel_scoring import scorer
+from app.services.vector_codec import as_vector
+from app.services.filters import CompiledFilter, build_column, filter_stats
+from app.services.image_hash import IMAGE_HASH_FIELD, ImageHashColumn
+from app.models.product import FilterExpr
+
+# Rebuild a compact snapshot once this share of rows are tombstones
+COMPACT_RATIO = 0.25
+
+# Products flagged with this (e.g. near-duplicates, see scripts/find_duplicates.py)
+# stay in the catalog but are never indexed for search
+SEARCH_EXCLUDED_FIELD = "search_excluded"
+
+def _product_meta(doc: dict) -> dict:
+    meta = {k: v for k, v in doc.items() if k not in ("embedding", "vectors")}
+    meta["_id"] = str(meta["_id"])
+    return meta
+
+def _doc_vector(doc: dict) -> Optional[np.ndarray]:
+    return as_vector(doc.get("embedding"), doc.get("embedding_dtype"))
+
+def is_embedded(doc: Optional[dict], version: EmbeddingVersion) -> bool:
+    if not doc:
+        return False
+    doc = version.view(doc)
+    return (doc.get("embedding_dim") or 0) > 0 and doc.get("embedding") is not None
+
+class IndexSnapshot:
+    """
+    Immutable in-memory view of the embedded catalog. Readers grab a reference
+    and keep using it even if a newer snapshot is swapped in meanwhile.
+
+    Vectors live in a row buffer that may have spare capacity: incremental
+    changes append rows past this snapshot's length and tombstone replaced or
+    deleted rows, so a newer snapshot can share the buffer without readers of
+    this one ever seeing its rows change.
+
+    A snapshot holds the vectors of a single embedding version; queries must
+    be embedded with `version` to be comparable.
+
+    Product attributes used by filters are kept as columns (numeric or
+    dictionary-encoded), built on first use and carried over on changes, at
+    most FILTER_COLUMN_CACHE_MAX of them; so are the catalog image hashes
+    used to recognise re-uploaded images.
+    """
+
+    def __init__(
+        self,
+        products: List[dict],
+        matrix: np.ndarray,
+        generation: int,
+        fragments: Optional[List[bytes]] = None,
+        version: EmbeddingVersion = DEFAULT_VERSION
+    ):
+        self.products = products
+        self.ids = [p["_id"] for p in products]
+        self.position = {pid: row for row, pid in enumerate(self.ids)}
+        self._buffer = matrix
+        self._columns: "OrderedDict[str, object]" = OrderedDict()
+        self._hashes: Optional[ImageHashColumn] = None
+        self.dim = matrix.shape[1] if matrix.ndim == 2 and len(products) else 0
+        self.fragments = fragments if fragments is not None else [product_fragment(p) for p in products]
+        # None means every row is live
+        self.alive: Optional[np.ndarray] = None
+        self.dead = 0
+        self.generation = generation
+        self.version = version
+        self.built_at = time.time()
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._buffer[:len(self.products)]
+
+    def column(self, field: str):
+        """Columnar view of one attribute over all rows (tombstoned ones included)"""
+        column = self._columns.get(field)
+        if column is not None:
+            try:
+                self._columns.move_to_end(field)
+            except KeyError:
+                pass  # evicted by a concurrent search
+            return column
+        raw = [p.get(field) for p in self.products]
+        column = build_column(raw)
+        # Fields no product has (typos, probing) are never kept
+        if any(v is not None for v in raw):
+            self._columns[field] = column
+            while len(self._columns) > settings.filter_column_cache_max:
+                self._columns.popitem(last=False)
+        return column
+
+    def image_hashes(self) -> ImageHashColumn:
+        """Perceptual hashes of the product images by row (tombstoned ones included)"""
+        if self._hashes is None:
+            self._hashes = ImageHashColumn.from_values(p.get(IMAGE_HASH_FIELD) for p in self.products)
+        return self._hashes
+
+    def __len__(self):
+        return len(self.products) - self.dead
+
+    def live_rows(self) -> Optional[np.ndarray]:
+        return None if self.alive is None else np.flatnonzero(self.alive)
+
+    def search(
+        self,
+        query_embedding: list,
+        top_k: int = 10,
+        min_similarity: float = 0.0,
+        filter: Optional[FilterExpr] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Return (row, cosine score) pairs, best first. With a filter, selective
+        ones score only matching rows (pre-filter); broad ones score every row
+        and check the filter on the best candidates only (post-filter).
+        """
+        if not len(self) or len(query_embedding) != self.dim:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+
+        if filter is None:
+            return scorer.top_k(self.matrix, query, top_k, min_similarity, self.live_rows())
+
+        # Raises FilterError for predicates that cannot apply, before any scoring
+        compiled = CompiledFilter(filter, self.column, len(self.products))
+        selectivity = compiled.selectivity(settings.filter_sample_size)
+        if selectivity >= settings.filter_postfilter_selectivity:
+            hits = self._post_filtered(query, compiled, selectivity, top_k, min_similarity)
+            if hits is not None:
+                filter_stats["postfilter"] += 1
+                return hits
+            filter_stats["postfilter_fallback"] += 1
+
+        filter_stats["prefilter"] += 1
+        mask = compiled.mask()
+        if self.alive is not None:
+            mask &= self.alive
+        return scorer.top_k(self.matrix, query, top_k, min_similarity, np.flatnonzero(mask))
+
+    def _post_filtered(
+        self,
+        query: np.ndarray,
+        compiled: CompiledFilter,
+        selectivity: float,
+        top_k: int,
+        min_similarity: float
+    ) -> Optional[List[Tuple[int, float]]]:
+        """Over-fetch candidates, then filter them; None if too few survived to be sure"""
+        want = min(len(self.products), math.ceil(top_k / selectivity * 2) + 16)
+        candidates = scorer.top_k(self.matrix, query, want, min_similarity, self.live_rows())
+        if not candidates:
+            return []
+        keep = compiled.mask(np.fromiter((row for row, _ in candidates), dtype=np.int64, count=len(candidates)))
+        hits = [hit for hit, ok in zip(candidates, keep) if ok]
+        # Fewer candidates than asked for means every row above the threshold was seen
+        if len(hits) >= top_k or len(candidates) < want:
+            return hits[:top_k]
+        return None
+
+    def with_changes(self, upserts: List[dict], deletes: Iterable[str], generation: int) -> "IndexSnapshot":
+        """
+        Copy-on-write update: returns a new snapshot with `upserts` (documents
+        carrying an `embedding`) applied and `deletes` (ids) removed. Costs
+        O(changes) vector work plus O(n) pointer copies; the matrix is not copied
+        unless the buffer has to grow.
+        """
+        if self.dim == 0:
+            return build_snapshot(upserts, generation, self.version)
+
+        new = copy.copy(self)
+        new.products = list(self.products)
+        new.ids = list(self.ids)
+        new.fragments = list(self.fragments)
+        new.position = dict(self.position)
+        n = len(self.products)
+        alive = self.alive.copy() if self.alive is not None else np.ones(n, dtype=bool)
+        dead = self.dead
+
+        def tombstone(pid: str):
+            nonlocal dead
+            row = new.position.pop(pid, None)
+            if row is not None and alive[row]:
+                alive[row] = False
+                dead += 1
+
+        for pid in deletes:
+            tombstone(str(pid))
+
+        fresh, vectors = [], []
+        for doc in upserts:
+            tombstone(str(doc["_id"]))
+            if doc.get(SEARCH_EXCLUDED_FIELD):
+                continue
+            vector = _doc_vector(doc)
+            if vector is not None and len(vector) == self.dim:
+                fresh.append(doc)
+                vectors.append(vector)
+            else:
+                print(f"[INDEX] Dropping {doc['_id']} from the index (no embedding of dim {self.dim})")
+
+        new._columns = OrderedDict(self._columns)
+        if fresh:
+            needed = n + len(fresh)
+            if needed > len(self._buffer):
+                capacity = max(needed, 2 * len(self._buffer))
+                buffer = np.empty((capacity, self.dim), dtype=np.float32)
+                buffer[:n] = self._buffer[:n]
+                new._buffer = buffer
+
+            # Rows past n are not visible to any existing snapshot
+            new._buffer[n:needed] = normalize_rows(np.stack(vectors))
+            metas = [_product_meta(doc) for doc in fresh]
+            for field, column in self._columns.items():
+                # None when a new value changes the column type; rebuilt on next use
+                extended = column.extended([meta.get(field) for meta in metas])
+                if extended is None:
+                    del new._columns[field]
+                else:
+                    new._columns[field] = extended
+            if self._hashes is not None:
+                new._hashes = self._hashes.extended([meta.get(IMAGE_HASH_FIELD) for meta in metas])
+            for offset, meta in enumerate(metas):
+                new.products.append(meta)
+                new.ids.append(meta["_id"])
+                new.fragments.append(product_fragment(meta))
+                new.position[meta["_id"]] = n + offset
+            alive = np.concatenate([alive, np.ones(len(fresh), dtype=bool)])
+
+        new.alive = alive if dead else None
+        new.dead = dead
+        new.generation = generation
+        new.built_at = time.time()
+        if dead > COMPACT_RATIO * len(new.products):
+            return new.compacted()
+        return new
+
+    def compacted(self) -> "IndexSnapshot":
+        """Drop tombstoned rows into a fresh, tightly sized snapshot (no DB access)"""
+        rows = self.live_rows()
+        if rows is None:
+            return self
+        products = [self.products[r] for r in rows]
+        fragments = [self.fragments[r] for r in rows]
+        matrix = np.ascontiguousarray(self.matrix[rows])
+        snapshot = IndexSnapshot(products, matrix, self.generation, fragments=fragments, version=self.version)
+        snapshot._columns = OrderedDict((field, column.take(rows)) for field, column in self._columns.items())
+        if self._hashes is not None:
+            snapshot._hashes = self._hashes.take(rows)
+        return snapshot
+
+def build_snapshot(docs: List[dict], generation: int, version: EmbeddingVersion = DEFAULT_VERSION) -> IndexSnapshot:
+    """Build a snapshot from product documents carrying an `embedding` (array or packed Binary)"""
+    vectors = [(d, _doc_vector(d)) for d in docs if not d.get(SEARCH_EXCLUDED_FIELD)]
+    vectors = [(d, v) for d, v in vectors if v is not None and len(v)]
+    dims = Counter(len(v) for _, v in vectors)
+    if not dims:
+        return IndexSnapshot([], np.zeros((0, 0), dtype=np.float32), generation, version=version)
+
+    # Vectors of another dimension could never match a query of the catalog's model
+    dim, _ = dims.most_common(1)[0]
+    kept = [(d, v) for d, v in vectors if len(v) == dim]
+    if len(kept) != len(vectors):
+        print(f"[INDEX] Skipping {len(vectors) - len(kept)} products with embedding dim != {dim}")
+
+    # np.stack copies the (possibly read-only frombuffer) vectors into one writable matrix
+    matrix = normalize_rows(np.stack([v for _, v in kept]).astype(np.float32, copy=False))
+    products = [_product_meta(d) for d, _ in kept]
+    return IndexSnapshot(products, matrix, generation, version=version)
+
+class CatalogIndex:
+    """
+    Process-wide holder of the current IndexSnapshot. Without a live refresher
+    it is fully reloaded when it ages out; with one, changes are applied
+    incrementally and no periodic reload happens.
+
+    Switching embedding versions is blue/green: the new version's snapshot is
+    built while the current one keeps serving, then both the vectors and the
+    query model change with a single reference swap. Changes applied while a
+    load runs are logged and replayed onto its snapshot before the swap.
+    """
+
+    def __init__(self):
+        self.snapshot: Optional[IndexSnapshot] = None
+        self.generation = 0
+        self.live = False
+        # When the current snapshot's full load started reading (epoch seconds);
+        # a refresher starting later catches up from here instead of loading again
+        self.loaded_at: Optional[float] = None
+        self._reloads_started = 0
+        self._reload_applied = 0
+        # (version, change log) of every load in flight
+        self._loading: List[Tuple[EmbeddingVersion, list]] = []
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Serverless runtimes may hand us a fresh event loop per request
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    @property
+    def version(self) -> EmbeddingVersion:
+        return self.snapshot.version if self.snapshot is not None else DEFAULT_VERSION
+
+    def versions_in_use(self) -> List[EmbeddingVersion]:
+        """The served version plus any being loaded; changes to any of them matter"""
+        return [self.version, *(version for version, _ in self._loading)]
+
+    def is_fresh(self) -> bool:
+        if self.snapshot is None:
+            return False
+        return self.live or time.time() - self.snapshot.built_at < settings.index_max_age
+
+    async def reload(self, version: Optional[EmbeddingVersion] = None) -> IndexSnapshot:
+        """Full load of the active version (or `version`); the current snapshot serves meanwhile"""
+        start = time.time()
+        self._reloads_started += 1
+        ticket = self._reloads_started
+        if version is None:
+            version = await storage.get_active_version()
+        # Registered before the read, so every change the read may have missed is logged
+        loading = (version, [])
+        self._loading.append(loading)
+        try:
+            docs = await storage.get_all_embeddings(version)
+            snapshot = build_snapshot(docs, self.generation + 1, version)
+        finally:
+            self._loading.remove(loading)
+        # A reload started later (e.g. for a cutover) already won; never roll it back
+        if ticket < self._reload_applied:
+            print(f"[INDEX] Discarding superseded load of {version.key}")
+            return self.snapshot
+        # No await from here to the swap: nothing can change in between
+        for upserts, deletes in loading[1]:
+            snapshot = snapshot.with_changes(*_split_changes(upserts, deletes, version), snapshot.generation)
+        if loading[1]:
+            print(f"[INDEX] Replayed {len(loading[1])} change batches that arrived during the load")
+        self._reload_applied = ticket
+        self.generation += 1
+        snapshot.generation = self.generation
+        self.snapshot = snapshot
+        self.loaded_at = start
+        print(f"[INDEX] Loaded {len(snapshot)} products (version {version.key}, dim {snapshot.dim}) in {time.time() - start:.2f}s")
+        return snapshot
+
+    async def sync_version(self) -> bool:
+        """Cut over to the active embedding version if it changed; True if swapped"""
+        if self.snapshot is None:
+            return False
+        active = await storage.get_active_version()
+        if active.same_as(self.snapshot.version):
+            return False
+        print(f"[INDEX] Embedding version {self.snapshot.version.key} -> {active.key}: building new index")
+        await self.reload(active)
+        return True
+
+    async def get_snapshot(self) -> IndexSnapshot:
+        if self.is_fresh():
+            return self.snapshot
+        async with self._get_lock():
+            if self.is_fresh():
+                return self.snapshot
+            return await self.reload()
+
+    def apply_changes(self, upserts: List[dict], deletes: Iterable[str] = ()) -> Optional[IndexSnapshot]:
+        """
+        Swap in a snapshot with the changes applied: `upserts` are full product
+        documents (ones not embedded with the served version leave the index),
+        `deletes` ids. Also logged for any load in flight; otherwise a no-op
+        until the first load.
+        """
+        deletes = list(deletes)
+        for _, log in self._loading:
+            log.append((upserts, deletes))
+        if self.snapshot is None:
+            return None
+        self.generation += 1
+        self.snapshot = self.snapshot.with_changes(
+            *_split_changes(upserts, deletes, self.snapshot.version), self.generation
+        )
+        return self.snapshot
+
+def _split_changes(upserts: List[dict], deletes: List[str], version: EmbeddingVersion) -> Tuple[List[dict], List[str]]:
+    """Version views of the documents embedded with `version`; the others join the deletes"""
+    views, gone = [], list(deletes)
+    for doc in upserts:
+        if is_embedded(doc, version):
+            views.append(version.view(doc))
+        else:
+            gone.append(str(doc["_id"]))
+    return views, gone
+
+catalog_index = CatalogIndex()
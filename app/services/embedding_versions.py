@@ -0,0 +1,147 @@
+import re
+from typing import List, Optional
+from app.services.indexes import EMBEDDED_FILTER
+from app.services.vector_codec import encode_embedding
+
+# The original model's vectors live in the top-level embedding fields; every
+# other version is stored beside them under vectors.<key>
+TOP_LEVEL_VERSION = "v1"
+
+# Control document in the versions collection naming the version search uses
+ACTIVE_POINTER_ID = "_active"
+
+# Versions that new products are embedded with besides the active one
+DUAL_WRITE_STATES = ("building", "ready")
+
+VERSION_KEY = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+VECTOR_FIELDS = ("embedding", "embedding_dtype", "embedding_dim", "embedding_source")
+
+class EmbeddingVersion:
+    """
+    One model/dimension combination. Several versions can coexist on a
+    product, so a new one is backfilled and indexed while the old one serves.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        model: str = "jina-clip-v2",
+        dimensions: Optional[int] = None,
+        state: str = "building"
+    ):
+        if not VERSION_KEY.match(key):
+            raise ValueError(f"Invalid embedding version key '{key}' (letters, digits, '_' and '-' only)")
+        self.key = key
+        self.model = model
+        self.dimensions = dimensions
+        self.state = state
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "EmbeddingVersion":
+        return cls(doc["_id"], doc.get("model", "jina-clip-v2"), doc.get("dimensions"), doc.get("state", "building"))
+
+    def to_doc(self) -> dict:
+        return {"_id": self.key, "model": self.model, "dimensions": self.dimensions, "state": self.state}
+
+    def same_as(self, other: Optional["EmbeddingVersion"]) -> bool:
+        return other is not None and (self.key, self.model, self.dimensions) == (other.key, other.model, other.dimensions)
+
+    @property
+    def prefix(self) -> str:
+        return "" if self.key == TOP_LEVEL_VERSION else f"vectors.{self.key}."
+
+    def field(self, name: str) -> str:
+        return self.prefix + name
+
+    def embedded_filter(self) -> dict:
+        if self.key == TOP_LEVEL_VERSION:
+            return dict(EMBEDDED_FILTER)
+        return {self.field("embedding_dim"): {"$gt": 0}}
+
+    def projection(self) -> dict:
+        """All product attributes (filters may use any of them) without other versions' top-level vector"""
+        if self.key == TOP_LEVEL_VERSION:
+            return {"vectors": 0}
+        # Sibling nested versions cannot be excluded without naming them; view() drops them
+        return {"embedding": 0}
+
+    def payload(self, inputs: list) -> dict:
+        payload = {"model": self.model, "input": inputs}
+        if self.dimensions:
+            # Matryoshka truncation on Jina's side
+            payload["dimensions"] = self.dimensions
+        return payload
+
+    def encode(self, embedding, storage: str = "array") -> dict:
+        """Fields to $set for a vector of this version"""
+        fields = {**encode_embedding(embedding, storage), "embedding_source": self.model}
+        return {self.field(k): v for k, v in fields.items()}
+
+    def view(self, doc: dict) -> dict:
+        """
+        The document as if this version were stored in the top-level fields,
+        which is the shape the catalog index and codec work with.
+        """
+        if self.key == TOP_LEVEL_VERSION:
+            return doc
+        nested = (doc.get("vectors") or {}).get(self.key) or {}
+        view = {k: v for k, v in doc.items() if k != "vectors" and k not in VECTOR_FIELDS}
+        for name in VECTOR_FIELDS:
+            view[name] = nested.get(name)
+        return view
+
+    def __repr__(self):
+        dims = f", {self.dimensions}d" if self.dimensions else ""
+        return f"EmbeddingVersion({self.key}: {self.model}{dims}, {self.state})"
+
+DEFAULT_VERSION = EmbeddingVersion(TOP_LEVEL_VERSION, "jina-clip-v2", None, state="active")
+
+async def get_version(versions_col, key: str) -> Optional[EmbeddingVersion]:
+    doc = await versions_col.find_one({"_id": key})
+    if doc:
+        return EmbeddingVersion.from_doc(doc)
+    return DEFAULT_VERSION if key == TOP_LEVEL_VERSION else None
+
+async def list_versions(versions_col) -> List[EmbeddingVersion]:
+    versions = {}
+    async for doc in versions_col.find({"_id": {"$ne": ACTIVE_POINTER_ID}}):
+        versions[doc["_id"]] = EmbeddingVersion.from_doc(doc)
+    versions.setdefault(TOP_LEVEL_VERSION, DEFAULT_VERSION)
+    return sorted(versions.values(), key=lambda v: v.key)
+
+async def get_active_version(versions_col) -> EmbeddingVersion:
+    """The version search queries and the catalog index must use; v1 until a cutover"""
+    pointer = await versions_col.find_one({"_id": ACTIVE_POINTER_ID})
+    if pointer:
+        version = await get_version(versions_col, pointer["version"])
+        if version is not None:
+            return version
+        print(f"[VERSIONS] Active version '{pointer['version']}' is not registered; using {TOP_LEVEL_VERSION}")
+    return DEFAULT_VERSION
+
+async def write_versions(versions_col) -> List[EmbeddingVersion]:
+    """Active version first, then every version being backfilled or kept for rollback"""
+    active = await get_active_version(versions_col)
+    others = [v for v in await list_versions(versions_col)
+              if v.key != active.key and v.state in DUAL_WRITE_STATES]
+    return [active, *others]
+
+async def coverage_report(products_col, versions_col) -> dict:
+    """Share of the catalog embedded by each version, and the dimensions found"""
+    total = await products_col.estimated_document_count()
+    active = await get_active_version(versions_col)
+    rows = []
+    for version in await list_versions(versions_col):
+        embedded = await products_col.count_documents(version.embedded_filter())
+        dims = await products_col.distinct(version.field("embedding_dim"), version.embedded_filter())
+        rows.append({
+            "key": version.key,
+            "model": version.model,
+            "dimensions": version.dimensions,
+            "state": "active" if version.key == active.key else version.state,
+            "embedded": embedded,
+            "coverage": round(embedded / total, 4) if total else 0.0,
+            "dims": sorted(dims),
+        })
+    return {"active": active.key, "total": total, "versions": rows}
@@ -0,0 +1,198 @@
+import numbers
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
+from app.models.product import FilterExpr
+
+# How often each plan was chosen, for /api/diagnostics
+filter_stats: Counter = Counter()
+
+class FilterError(ValueError):
+    """A filter that cannot apply to the catalog (e.g. a range over text); answered with 400"""
+
+def _is_number(value) -> bool:
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+def _hashable(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return None
+
+class NumericColumn:
+    """float64 values with NaN for missing; supports eq, in and ranges"""
+
+    numeric = True
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def from_values(cls, raw: Iterable) -> "NumericColumn":
+        return cls(np.array([float(v) if _is_number(v) else np.nan for v in raw], dtype=np.float64))
+
+    def take(self, rows: np.ndarray) -> "NumericColumn":
+        return NumericColumn(self.values[rows])
+
+    def extended(self, raw: List) -> Optional["NumericColumn"]:
+        if any(v is not None and not _is_number(v) for v in raw):
+            return None
+        return NumericColumn(np.concatenate([self.values, NumericColumn.from_values(raw).values]))
+
+    def _view(self, rows):
+        return self.values if rows is None else self.values[rows]
+
+    def eq(self, value, rows=None) -> np.ndarray:
+        if not _is_number(value):
+            return np.zeros(len(self._view(rows)), dtype=bool)
+        return self._view(rows) == float(value)
+
+    def isin(self, values: List, rows=None) -> np.ndarray:
+        numbers_only = [float(v) for v in values if _is_number(v)]
+        return np.isin(self._view(rows), numbers_only)
+
+    def range(self, gt=None, gte=None, lt=None, lte=None, rows=None) -> np.ndarray:
+        values = self._view(rows)
+        # NaN compares False, so missing values never match a range
+        mask = ~np.isnan(values)
+        if gt is not None:
+            mask &= values > gt
+        if gte is not None:
+            mask &= values >= gte
+        if lt is not None:
+            mask &= values < lt
+        if lte is not None:
+            mask &= values <= lte
+        return mask
+
+class CategoricalColumn:
+    """Dictionary-encoded values (int32 codes, -1 for missing); supports eq and in"""
+
+    numeric = False
+
+    def __init__(self, codes: np.ndarray, lookup: Dict):
+        self.codes = codes
+        self.lookup = lookup
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_values(cls, raw: Iterable, lookup: Optional[Dict] = None) -> "CategoricalColumn":
+        lookup = dict(lookup or {})
+        codes = []
+        for value in raw:
+            value = _hashable(value)
+            if value is None:
+                codes.append(-1)
+                continue
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+            codes.append(code)
+        return cls(np.array(codes, dtype=np.int32), lookup)
+
+    def take(self, rows: np.ndarray) -> "CategoricalColumn":
+        return CategoricalColumn(self.codes[rows], self.lookup)
+
+    def extended(self, raw: List) -> "CategoricalColumn":
+        tail = CategoricalColumn.from_values(raw, self.lookup)
+        return CategoricalColumn(np.concatenate([self.codes, tail.codes]), tail.lookup)
+
+    def _view(self, rows):
+        return self.codes if rows is None else self.codes[rows]
+
+    def eq(self, value, rows=None) -> np.ndarray:
+        code = self.lookup.get(_hashable(value))
+        if code is None:
+            return np.zeros(len(self._view(rows)), dtype=bool)
+        return self._view(rows) == code
+
+    def isin(self, values: List, rows=None) -> np.ndarray:
+        codes = [self.lookup[v] for v in map(_hashable, values) if v in self.lookup]
+        return np.isin(self._view(rows), codes)
+
+    def range(self, **bounds) -> np.ndarray:
+        raise FilterError("range filters need a numeric field")
+
+def build_column(raw: List):
+    """Numeric when every present value is a number (or none is present), otherwise categorical"""
+    present = [v for v in raw if v is not None]
+    if all(_is_number(v) for v in present):
+        return NumericColumn.from_values(raw)
+    return CategoricalColumn.from_values(raw)
+
+def category_filter(category: Optional[str], expr: Optional[FilterExpr]) -> Optional[FilterExpr]:
+    """Fold the legacy `category` parameter into the filter expression"""
+    if not category:
+        return expr
+    by_category = FilterExpr(field="category", eq=category)
+    return by_category if expr is None else FilterExpr(and_=[by_category, expr])
+
+class CompiledFilter:
+    """
+    A filter expression bound to a snapshot's columns. mask(rows) evaluates it
+    on all rows or only on the given row indices (post-filtering candidates).
+    """
+
+    def __init__(self, expr: FilterExpr, column: Callable[[str], object], size: int):
+        self.expr = expr
+        self._column = column
+        self._columns: Dict[str, object] = {}
+        self.size = size
+        # Fail on unusable predicates before any scoring happens
+        self._validate(expr)
+
+    def column(self, field: str):
+        # Columns the snapshot does not keep would otherwise be rebuilt per predicate
+        if field not in self._columns:
+            self._columns[field] = self._column(field)
+        return self._columns[field]
+
+    def _validate(self, node: FilterExpr):
+        for child in (node.and_ or []) + (node.or_ or []) + ([node.not_] if node.not_ else []):
+            self._validate(child)
+        if node.field is not None and node.has_range() and not self.column(node.field).numeric:
+            raise FilterError(f"Field '{node.field}' is not numeric; use eq or in")
+
+    def mask(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        return self._mask(self.expr, rows, self.size if rows is None else len(rows))
+
+    def _mask(self, node: FilterExpr, rows, n: int) -> np.ndarray:
+        if node.and_ is not None:
+            mask = np.ones(n, dtype=bool)
+            for child in node.and_:
+                mask &= self._mask(child, rows, n)
+                if not mask.any():
+                    break
+            return mask
+        if node.or_ is not None:
+            mask = np.zeros(n, dtype=bool)
+            for child in node.or_:
+                mask |= self._mask(child, rows, n)
+            return mask
+        if node.not_ is not None:
+            return ~self._mask(node.not_, rows, n)
+
+        column = self.column(node.field)
+        mask = np.ones(n, dtype=bool)
+        if node.eq is not None:
+            mask &= column.eq(node.eq, rows)
+        if node.in_ is not None:
+            mask &= column.isin(node.in_, rows)
+        if node.has_range():
+            mask &= column.range(gt=node.gt, gte=node.gte, lt=node.lt, lte=node.lte, rows=rows)
+        return mask
+
+    def selectivity(self, sample_size: int) -> float:
+        """Estimated share of rows that match, from an evenly spaced row sample"""
+        if self.size == 0:
+            return 0.0
+        if self.size <= sample_size:
+            return float(self.mask().mean())
+        sample = np.linspace(0, self.size - 1, sample_size).astype(np.int64)
+        return float(self.mask(sample).mean())
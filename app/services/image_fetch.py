@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import ipaddress
+import os
+import socket
+import time
+from collections import Counter
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+import orjson
+from config import settings
+from app.services.uploads import UploadRejected, sniff_image_type
+from app.services.profiling import record_stage
+from app.services.cache import DiskBudget, write_atomic
+
+image_fetch_stats: Counter = Counter()
+
+class FetchedImage:
+    """Bytes of a query image and their SHA-256, which keys the query-embedding cache"""
+
+    def __init__(self, content: bytes, source: str):
+        self.content = content
+        self.content_hash = hashlib.sha256(content).hexdigest()
+        # "network", "revalidated" (304) or "fresh" (cached, no request made)
+        self.source = source
+
+class ImageFetcher:
+    """
+    Fetches query images for URL searches through one pooled client, with size
+    and time limits, and keeps them in a bounded on-disk cache. Cached entries
+    younger than IMAGE_FETCH_REVALIDATE_AFTER are used as is; older ones are
+    revalidated with If-None-Match / If-Modified-Since.
+    """
+
+    def __init__(self):
+        self.client: Optional[httpx.AsyncClient] = None
+        self.loop = None
+        self.budget = DiskBudget(".bin", sidecars=(".json",))
+
+    def get_client(self) -> httpx.AsyncClient:
+        # Rebuilt if the event loop changes, like the Jina pool
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.loop is not loop or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                timeout=settings.image_fetch_timeout,
+                follow_redirects=True,
+                max_redirects=3,
+                limits=httpx.Limits(
+                    max_connections=settings.image_fetch_max_connections,
+                    max_keepalive_connections=settings.image_fetch_max_connections
+                ),
+                headers={"Accept": "image/jpeg,image/png,image/webp,image/*;q=0.8"},
+                # Checked per request, so redirects cannot lead to internal hosts either
+                event_hooks={"request": [self._check_request]}
+            )
+            self.loop = loop
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            try:
+                await self.client.aclose()
+            except Exception:
+                pass
+            self.client = None
+
+    async def _check_request(self, request: httpx.Request):
+        """Refuse hosts resolving to private, loopback or link-local addresses"""
+        if not settings.image_fetch_block_private:
+            return
+        host = request.url.host
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, request.url.port or 443, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            raise UploadRejected(400, f"Cannot resolve image host '{host}'")
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split("%")[0])
+            if not address.is_global:
+                raise UploadRejected(400, "image_url points to a non-public address")
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(settings.image_fetch_cache_dir, key[:2], key)
+        return f"{base}.json", f"{base}.bin"
+
+    def _read_entry(self, url: str):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "rb") as f:
+                meta = orjson.loads(f.read())
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return None, None
+        return meta, body
+
+    def _touch(self, url: str):
+        # mtime marks recent use for LRU eviction
+        self.budget.touch(self._paths(url)[1])
+
+    def _write_entry(self, url: str, meta: dict, body: Optional[bytes]):
+        meta_path, body_path = self._paths(url)
+        if body is not None:
+            write_atomic(body_path, body)
+        write_atomic(meta_path, orjson.dumps(meta))
+        evicted = self.budget.account(
+            settings.image_fetch_cache_dir, settings.image_fetch_cache_max_bytes, len(body) if body is not None else 0
+        )
+        image_fetch_stats["evicted"] += evicted
+
+    async def _download(self, url: str, headers: dict) -> Tuple[httpx.Response, bytes]:
+        """GET with the size cap enforced while streaming"""
+        max_bytes = settings.image_fetch_max_bytes
+        async with self.get_client().stream("GET", url, headers=headers) as response:
+            if response.status_code == 304:
+                return response, b""
+            response.raise_for_status()
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise UploadRejected(413, f"Image exceeds the {max_bytes / (1024 * 1024):.1f} MB limit")
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(413, f"Image exceeds the {max_bytes / (1024 * 1024):.1f} MB limit")
+                chunks.append(chunk)
+            return response, b"".join(chunks)
+
+    @staticmethod
+    def _check_url(url: str):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise UploadRejected(400, "image_url must be an absolute http(s) URL")
+
+    @staticmethod
+    def _check_image(content: bytes):
+        kind = sniff_image_type(content[:64])
+        if kind is None or kind == "image/avif":
+            raise UploadRejected(415, "image_url did not return a PNG, JPEG or WEBP image")
+
+    async def download(self, url: str, timeout: Optional[float] = None) -> bytes:
+        """
+        Image bytes for url with the same checks and limits as fetch, but
+        without the query-image cache: catalog images are hashed or resized
+        once and their callers keep the result.
+        """
+        self._check_url(url)
+        start = time.time()
+        _, content = await asyncio.wait_for(self._download(url, {}), timeout or settings.image_fetch_timeout)
+        record_stage("image_fetch", time.time() - start)
+        self._check_image(content)
+        return content
+
+    async def fetch(self, url: str) -> FetchedImage:
+        """
+        Image bytes for url. Raises UploadRejected for refused URLs, oversized or
+        non-image content, and httpx errors (or TimeoutError) when the fetch fails.
+        """
+        self._check_url(url)
+        meta, body = await asyncio.to_thread(self._read_entry, url)
+        now = time.time()
+        if meta is not None and now - meta["fetched_at"] < settings.image_fetch_revalidate_after:
+            image_fetch_stats["fresh"] += 1
+            await asyncio.to_thread(self._touch, url)
+            return FetchedImage(body, "fresh")
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        start = time.time()
+        response, content = await asyncio.wait_for(self._download(url, headers), settings.image_fetch_timeout)
+        image_fetch_stats["fetch_ms_total"] += int((time.time() - start) * 1000)
+        record_stage("image_fetch", time.time() - start)
+
+        if response.status_code == 304 and meta is not None:
+            image_fetch_stats["revalidated"] += 1
+            meta["fetched_at"] = now
+            await asyncio.to_thread(self._write_entry, url, meta, None)
+            await asyncio.to_thread(self._touch, url)
+            return FetchedImage(body, "revalidated")
+
+        self._check_image(content)
+        image_fetch_stats["downloaded"] += 1
+        image_fetch_stats["downloaded_bytes"] += len(content)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "fetched_at": now,
+        }
+        await asyncio.to_thread(self._write_entry, url, meta, content)
+        return FetchedImage(content, "network")
+
+image_fetcher = ImageFetcher()
@@ -0,0 +1,156 @@
+import asyncio
+from collections import Counter
+from io import BytesIO
+from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
+import httpx
+import numpy as np
+from config import settings
+from app.services.uploads import UploadRejected, open_image_guarded
+from app.services.image_fetch import image_fetcher
+
+# Upload lookups by outcome, for /api/diagnostics
+image_hash_stats: Counter = Counter()
+
+# Product field holding the hex pHash of the catalog image
+IMAGE_HASH_FIELD = "image_phash"
+
+HASH_SIZE = 8
+_SAMPLE = 32
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis; coefficients of x are _DCT @ x"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    basis = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    basis[0] /= np.sqrt(2)
+    return basis
+
+_DCT = _dct_matrix(_SAMPLE)
+
+def phash(img) -> int:
+    """
+    64-bit perceptual hash: signs of the 8x8 lowest DCT frequencies of a
+    32x32 grayscale thumbnail against their median. Survives re-encoding,
+    resizing and small colour changes, unlike a byte digest.
+    """
+    from PIL import Image
+    if img.mode in ("RGBA", "LA", "P"):
+        # Transparent areas count as white, as on the embedding path
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img)
+    gray = img.convert("L").resize((_SAMPLE, _SAMPLE), Image.Resampling.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # The DC term only carries overall brightness
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hash_hex(value: int) -> str:
+    return f"{value:016x}"
+
+def hash_image(source: Union[str, BinaryIO]) -> int:
+    """pHash of an image path or binary file object; file objects are rewound afterwards"""
+    img = open_image_guarded(source)
+    if img.format == "JPEG":
+        # Decode at a fraction of the resolution; 32x32 is all the hash looks at
+        img.draft("L", (4 * _SAMPLE, 4 * _SAMPLE))
+    try:
+        return phash(img)
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+def _parse(value) -> Optional[int]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return int(value, 16)
+    except ValueError:
+        return None
+
+# popcount of every byte value, for Hamming distances
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+class ImageHashColumn:
+    """Catalog image hashes by row (uint64, with a presence mask); nearest Hamming match"""
+
+    def __init__(self, values: np.ndarray, present: np.ndarray):
+        self.values = values
+        self.present = present
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def from_values(cls, raw: Iterable) -> "ImageHashColumn":
+        parsed = [_parse(v) for v in raw]
+        values = np.array([v or 0 for v in parsed], dtype=np.uint64)
+        present = np.array([v is not None for v in parsed], dtype=bool)
+        return cls(values, present)
+
+    def take(self, rows: np.ndarray) -> "ImageHashColumn":
+        return ImageHashColumn(self.values[rows], self.present[rows])
+
+    def extended(self, raw: List) -> "ImageHashColumn":
+        tail = ImageHashColumn.from_values(raw)
+        return ImageHashColumn(np.concatenate([self.values, tail.values]), np.concatenate([self.present, tail.present]))
+
+    def nearest(self, value: int, max_distance: int, alive: Optional[np.ndarray] = None) -> Optional[Tuple[int, int]]:
+        """(row, distance) of the closest hash within max_distance bits, or None"""
+        usable = self.present if alive is None else self.present & alive
+        if not usable.any():
+            return None
+        diff = self.values ^ np.uint64(value)
+        distance = _POPCOUNT[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+        distance[~usable] = HASH_SIZE * HASH_SIZE + 1
+        row = int(np.argmin(distance))
+        if distance[row] > max_distance:
+            return None
+        return row, int(distance[row])
+
+def match_upload(snapshot, image_file: BinaryIO) -> Optional[Tuple[int, int]]:
+    """
+    Catalog row whose image is a near-exact copy of the upload, as (row,
+    Hamming distance). Its stored vector can then stand in for the query
+    embedding. Any decoding problem is left to the regular embedding path.
+    """
+    if settings.image_hash_max_distance < 0 or not len(snapshot):
+        return None
+    try:
+        value = hash_image(image_file)
+    except Exception as e:
+        image_hash_stats["errors"] += 1
+        print(f"[HASH] Could not hash upload: {type(e).__name__}: {e}")
+        try:
+            image_file.seek(0)
+        except Exception:
+            pass
+        return None
+    match = snapshot.image_hashes().nearest(value, settings.image_hash_max_distance, snapshot.alive)
+    image_hash_stats["hits" if match else "misses"] += 1
+    return match
+
+async def fetch_image_hashes(urls: List[str]) -> List[Optional[str]]:
+    """
+    Download catalog images and hash them (hex); None where fetching or
+    decoding failed. Downloads go through the guarded image fetcher (pooled,
+    size-capped, no private hosts), since ingested URLs are not trusted.
+    """
+    semaphore = asyncio.Semaphore(settings.image_hash_fetch_concurrency)
+
+    async def one(url: str) -> Optional[str]:
+        async with semaphore:
+            try:
+                content = await image_fetcher.download(url, settings.image_hash_fetch_timeout)
+            except (UploadRejected, httpx.HTTPError, asyncio.TimeoutError, OSError) as e:
+                print(f"[HASH] Fetch failed for {url}: {type(e).__name__}")
+                return None
+        try:
+            value = await asyncio.to_thread(hash_image, BytesIO(content))
+        except Exception as e:
+            print(f"[HASH] Could not hash {url}: {type(e).__name__}: {e}")
+            return None
+        return hash_hex(value)
+
+    return list(await asyncio.gather(*(one(url) for url in urls)))
@@ -0,0 +1,273 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from bson import Timestamp
+from pymongo.errors import OperationFailure
+from config import settings
+from app.services.mongodb import MongoDB
+from app.services.storage import storage
+from app.services.catalog_index import CatalogIndex, catalog_index
+from app.services.embedding_versions import EmbeddingVersion
+
+# Server error codes meaning "change streams are not available here"
+CHANGE_STREAM_UNSUPPORTED = {40573, 40324, 136}
+# ...and "this stream cannot be resumed" (InvalidResumeToken, ChangeStreamFatalError,
+# ChangeStreamHistoryLost after the oplog rolled over): only a fresh baseline helps
+CHANGE_STREAM_RESUME_FAILED = {260, 280, 286}
+
+# Writers stamp updated_at with their own clock; re-reading a few seconds is harmless
+CLOCK_SKEW = timedelta(seconds=5)
+
+def _to_epoch(value) -> Optional[float]:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if hasattr(value, "time"):  # bson.Timestamp
+        return float(value.time)
+    return None
+
+def _touches_version(event: dict, versions: List[EmbeddingVersion]) -> bool:
+    """False for updates that only write other embedding versions, e.g. a backfill"""
+    if event["operationType"] != "update":
+        return True
+    description = event.get("updateDescription") or {}
+    fields = [*(description.get("updatedFields") or {}), *(description.get("removedFields") or [])]
+    for field in fields:
+        if field != "vectors" and not field.startswith("vectors."):
+            return True
+        for version in versions:
+            if version.prefix and (field.startswith(version.prefix) or version.prefix.startswith(field + ".")):
+                return True
+    return not fields
+
+class IndexRefresher:
+    """
+    Keeps the catalog index current without full reloads: tails a MongoDB change
+    stream when the deployment supports it, otherwise polls the storage backend
+    on `updated_at`.
+    """
+
+    def __init__(self, index: CatalogIndex):
+        self.index = index
+        self.task: Optional[asyncio.Task] = None
+        self.version_task: Optional[asyncio.Task] = None
+        self.mode = "off"
+        self.resume_token = None
+        # Set when the stream could not resume: reload and start a new stream from scratch
+        self.rebaseline = False
+        self.watermark: Optional[datetime] = None
+        # updated_at of the rows applied inside the poll's re-read window, by id
+        self.polled: Dict[str, datetime] = {}
+        self.stats = {
+            "applied_upserts": 0,
+            "applied_deletes": 0,
+            "batches": 0,
+            "errors": 0,
+            "last_change_at": None,
+            "last_applied_at": None,
+            "freshness_lag_s": None,
+            "version_switches": 0,
+        }
+
+    def start(self):
+        if settings.index_refresh_mode == "off" or self.task is not None:
+            return
+        self.task = asyncio.create_task(self._run())
+        self.version_task = asyncio.create_task(self._watch_version())
+
+    async def stop(self):
+        for task in (self.task, self.version_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self.task = self.version_task = None
+        self.index.live = False
+
+    def snapshot(self) -> dict:
+        snapshot = self.index.snapshot
+        return {
+            "mode": self.mode,
+            "live": self.index.live,
+            "generation": self.index.generation,
+            "products": len(snapshot) if snapshot is not None else None,
+            "version": self.index.version.key,
+            **self.stats,
+        }
+
+    def _apply(self, upserts: List[dict], deletes: List[str], change_times: List[float]):
+        if not upserts and not deletes:
+            return
+        self.index.apply_changes(upserts, deletes)
+        now = time.time()
+        self.stats["applied_upserts"] += len(upserts)
+        self.stats["applied_deletes"] += len(deletes)
+        self.stats["batches"] += 1
+        self.stats["last_applied_at"] = now
+        if change_times:
+            newest = max(change_times)
+            self.stats["last_change_at"] = newest
+            # Lag of the oldest change in the batch: worst-case staleness readers saw
+            self.stats["freshness_lag_s"] = round(now - min(change_times), 3)
+
+    async def _run(self):
+        mode = settings.index_refresh_mode
+        if not storage.supports_change_stream:
+            mode = "poll"
+        while True:
+            try:
+                if mode in ("auto", "change_stream"):
+                    try:
+                        self.mode = "change_stream"
+                        await self._watch()
+                    except OperationFailure as e:
+                        if mode == "auto" and e.code in CHANGE_STREAM_UNSUPPORTED:
+                            print(f"[REFRESH] Change streams unavailable ({e.code}); falling back to polling")
+                            mode = "poll"
+                            continue
+                        if e.code in CHANGE_STREAM_RESUME_FAILED:
+                            # Retrying the same token would fail forever while the index goes stale
+                            print(f"[REFRESH] Change stream cannot resume ({e.code}); reloading the index")
+                            self.stats["errors"] += 1
+                            self.index.live = False
+                            self.resume_token = None
+                            self.rebaseline = True
+                            continue
+                        raise
+                else:
+                    self.mode = "poll"
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                self.index.live = False
+                print(f"[REFRESH] {self.mode} failed: {type(e).__name__}: {e}; retrying in {settings.index_poll_interval}s")
+                await asyncio.sleep(settings.index_poll_interval)
+
+    async def _watch_version(self):
+        # A live index never reloads by age, so cutovers are picked up here
+        while True:
+            await asyncio.sleep(settings.embedding_version_check_interval)
+            try:
+                if await self.index.sync_version():
+                    self.stats["version_switches"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[REFRESH] Version check failed: {type(e).__name__}: {e}")
+
+    async def _watch(self):
+        col = MongoDB.get_collection()
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        # Open the stream before the baseline load so no change can fall in between;
+        # replayed events are harmless because upserts and deletes are idempotent.
+        # A snapshot already loaded (warm-up) is the baseline: replay from just before its load.
+        start_at = None
+        if (self.resume_token is None and not self.rebaseline
+                and self.index.snapshot is not None and self.index.loaded_at is not None):
+            start_at = Timestamp(int(self.index.loaded_at - CLOCK_SKEW.total_seconds()), 0)
+        async with col.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self.resume_token,
+            start_at_operation_time=start_at
+        ) as stream:
+            if self.resume_token is None and start_at is None:
+                await self.index.reload()
+                self.rebaseline = False
+            # A retry resumes here rather than replaying from start_at or loading again
+            self.resume_token = self.resume_token or stream.resume_token
+            self.index.live = True
+            print("[REFRESH] Tailing change stream")
+            while True:
+                change = await stream.next()
+                batch = [change]
+                while len(batch) < settings.index_refresh_batch:
+                    more = await stream.try_next()
+                    if more is None:
+                        break
+                    batch.append(more)
+
+                # A version being loaded for a cutover needs its backfill writes too
+                versions = self.index.versions_in_use()
+                upserts, deletes, times = {}, set(), []
+                for event in batch:
+                    if not _touches_version(event, versions):
+                        continue
+                    doc_id = str(event["documentKey"]["_id"])
+                    ts = _to_epoch(event.get("wallTime")) or _to_epoch(event.get("clusterTime"))
+                    if ts:
+                        times.append(ts)
+                    doc = event.get("fullDocument")
+                    if event["operationType"] != "delete" and doc:
+                        upserts[doc_id] = doc
+                        deletes.discard(doc_id)
+                    else:
+                        upserts.pop(doc_id, None)
+                        deletes.add(doc_id)
+                self._apply(list(upserts.values()), list(deletes), times)
+                self.resume_token = stream.resume_token
+
+    async def _poll(self):
+        # Catch up from the load behind the current snapshot (warm-up's, or the last
+        # watermark after a failure) rather than loading the catalog again
+        adopted = self.watermark is None and self.index.snapshot is not None and self.index.loaded_at is not None
+        if self.watermark is None:
+            if not adopted:
+                await self.index.reload()
+            self.watermark = datetime.fromtimestamp(self.index.loaded_at, tz=timezone.utc)
+            self.polled = {}
+        self.index.live = True
+        print(f"[REFRESH] Polling updated_at every {settings.index_poll_interval}s")
+        polls = 0
+        while True:
+            await asyncio.sleep(settings.index_poll_interval)
+            polls += 1
+            await self._poll_changes()
+
+            # updated_at cannot reveal deletions; reconcile ids periodically, and once
+            # straight away for a snapshot loaded before polling started
+            reconcile = polls % settings.index_reconcile_every == 0 or (adopted and polls == 1)
+            if reconcile and self.index.snapshot is not None:
+                live_ids = await storage.embedded_ids(self.index.version)
+                self._apply([], [pid for pid in self.index.snapshot.position if pid not in live_ids], [])
+
+    async def _poll_changes(self):
+        """
+        Re-read every row stamped since watermark - CLOCK_SKEW, paging on
+        (updated_at, _id): neither a burst of rows sharing one timestamp nor a
+        write committed a little after its stamp can slip past the watermark.
+        Rows already applied with the same updated_at are skipped.
+        """
+        newest = self.watermark
+        cursor, after = self.watermark - CLOCK_SKEW, None
+        while True:
+            page = await storage.changed_since(cursor, settings.index_refresh_batch, after)
+            upserts, times = [], []
+            for doc in page:
+                ts = doc["updated_at"]
+                if ts.tzinfo is None:
+                    ts = ts.replace(tzinfo=timezone.utc)
+                if self.polled.get(doc["_id"]) == ts:
+                    continue
+                self.polled[doc["_id"]] = ts
+                newest = max(newest, ts)
+                times.append(ts.timestamp())
+                # The index drops those not embedded with the version it serves
+                upserts.append(doc)
+            self._apply(upserts, [], times)
+            if len(page) < settings.index_refresh_batch:
+                break
+            cursor, after = page[-1]["updated_at"], page[-1]["_id"]
+
+        self.watermark = newest
+        # Only rows inside the re-read window can come back
+        floor = newest - CLOCK_SKEW
+        self.polled = {pid: ts for pid, ts in self.polled.items() if ts >= floor}
+
+index_refresher = IndexRefresher(catalog_index)
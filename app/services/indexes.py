@@ -0,0 +1,84 @@
+from typing import List
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Every writer sets embedding_dim together with the vector, so this marker is
+# what the partial index (and every "has an embedding" query) keys on. Unlike
+# {"embedding": {"$ne": None}}, it excludes seeded placeholders with embedding: None.
+EMBEDDED_FILTER = {"embedding_dim": {"$gt": 0}}
+
+INDEX_MODELS: List[IndexModel] = [
+    # Browse by category, paged in _id order
+    IndexModel([("category", ASCENDING), ("_id", ASCENDING)], name="category_id"),
+    # Seeding/ingestion dedupe on URL
+    IndexModel([("url", ASCENDING)], name="url_unique", unique=True),
+    # Keyed on what EMBEDDED_FILTER queries test (full index load, embedded counts), and
+    # only over embedded products, so placeholders cost neither reads nor index writes
+    IndexModel([("embedding_dim", ASCENDING)], name="embedded_dim", partialFilterExpression=EMBEDDED_FILTER),
+    # Polling fallback of the live index refresher
+    IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"),
+]
+
+EMBEDDED_HINT = "embedded_dim"
+
+# Replaced indexes, dropped when indexes are ensured. embedded_category_id duplicated
+# category_id's keys and no embedded-product query could use it
+OBSOLETE_INDEXES = ["embedded_category_id"]
+
+# Legacy documents carrying a vector but no embedding_dim would be invisible to EMBEDDED_FILTER
+BACKFILL_FILTER = {"embedding": {"$type": "array"}, "embedding_dim": {"$exists": False}}
+BACKFILL_UPDATE = [{"$set": {"embedding_dim": {"$size": "$embedding"}}}]
+
+async def ensure_indexes(col) -> dict:
+    """
+    Create missing indexes one by one (Motor); a failing index does not block
+    the others. Runs at startup, so it leaves the collection-scanning
+    embedding_dim backfill to scripts/ensure_indexes.py.
+    """
+    report = {"created": [], "failed": {}, "dropped": []}
+    for model in INDEX_MODELS:
+        name = model.document["name"]
+        try:
+            await col.create_indexes([model])
+            report["created"].append(name)
+        except OperationFailure as e:
+            report["failed"][name] = e.details.get("errmsg", str(e)) if e.details else str(e)
+    existing = [index["name"] async for index in col.list_indexes()]
+    for name in OBSOLETE_INDEXES:
+        if name in existing:
+            await col.drop_index(name)
+            report["dropped"].append(name)
+    print(f"[INDEXES] Ensured {report['created']}, failed: {list(report['failed'])}, dropped: {report['dropped']}")
+    return report
+
+def ensure_indexes_sync(col) -> dict:
+    """Same as ensure_indexes for a synchronous pymongo collection (scripts), plus the embedding_dim backfill"""
+    report = {"created": [], "failed": {}, "dropped": []}
+    report["backfilled_embedding_dim"] = col.update_many(BACKFILL_FILTER, BACKFILL_UPDATE).modified_count
+    for model in INDEX_MODELS:
+        name = model.document["name"]
+        try:
+            col.create_indexes([model])
+            report["created"].append(name)
+        except OperationFailure as e:
+            report["failed"][name] = e.details.get("errmsg", str(e)) if e.details else str(e)
+    existing = [index["name"] for index in col.list_indexes()]
+    for name in OBSOLETE_INDEXES:
+        if name in existing:
+            col.drop_index(name)
+            report["dropped"].append(name)
+    return report
+
+async def index_stats(col) -> List[dict]:
+    """Per-index usage counters and on-disk size"""
+    sizes = {}
+    async for stats in col.aggregate([{"$collStats": {"storageStats": {}}}]):
+        sizes = stats.get("storageStats", {}).get("indexSizes", {})
+    usage = []
+    async for stat in col.aggregate([{"$indexStats": {}}]):
+        usage.append({
+            "name": stat["name"],
+            "ops": int(stat.get("accesses", {}).get("ops", 0)),
+            "size_bytes": int(sizes.get(stat["name"], 0)),
+        })
+    return sorted(usage, key=lambda s: s["name"])
@@ -0,0 +1,201 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional
+import httpx
+from config import settings
+from app.services.storage import apply_set, storage
+from app.services.catalog_index import catalog_index
+from app.services.jina_embeddings import get_embeddings_batch, EmbeddingServiceUnavailable
+from app.services.resilience import AsyncRateLimiter
+from app.services.embedding_versions import EmbeddingVersion
+from app.services.image_hash import IMAGE_HASH_FIELD, fetch_image_hashes
+
+class IngestJob:
+    """Progress of one bulk ingestion request"""
+
+    def __init__(self, total: int):
+        self.job_id = uuid.uuid4().hex
+        self.status = "queued"
+        self.total = total
+        self.inserted = 0
+        self.skipped = 0
+        self.embedded = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def error(self, message: str):
+        # Keep the status payload small on large feeds
+        if len(self.errors) < 50:
+            self.errors.append(message)
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+class IngestWorker:
+    """
+    In-process background worker: persists bulk submissions, then embeds them
+    in multi-input Jina batches under a rate limit and pushes the vectors into
+    the product store and the live catalog index.
+    """
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.loop = None
+        self.jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self.limiter = AsyncRateLimiter(settings.ingest_requests_per_second, burst=1)
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self.task is not None and not self.task.done() and self.loop is loop:
+            return
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.task = None
+
+    def get_job(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def _remember(self, job: IngestJob):
+        self.jobs[job.job_id] = job
+        while len(self.jobs) > settings.ingest_job_history:
+            self.jobs.popitem(last=False)
+
+    async def submit(self, items: List[dict]) -> IngestJob:
+        """Bulk-insert new products (duplicate URLs are skipped) and queue them for embedding"""
+        self.start()
+        job = IngestJob(total=len(items))
+        self._remember(job)
+
+        now = datetime.now(timezone.utc)
+        seen = set()
+        docs = []
+        for item in items:
+            if item["url"] in seen:
+                job.skipped += 1
+                continue
+            seen.add(item["url"])
+            docs.append({
+                "name": item["name"],
+                "category": item["category"],
+                "url": item["url"],
+                "embedding": None,
+                "updated_at": now,
+            })
+
+        failed_rows = await storage.insert_products(docs)
+        for row, (duplicate, message) in failed_rows.items():
+            if duplicate:
+                job.skipped += 1
+            else:
+                job.failed += 1
+                job.error(f"insert {docs[row]['url']}: {message}")
+
+        # The backend assigns _id in place, so inserted rows already carry it
+        pending = [doc for row, doc in enumerate(docs) if row not in failed_rows]
+        job.inserted = len(pending)
+        print(f"[INGEST] Job {job.job_id}: inserted {job.inserted}, skipped {job.skipped}")
+        if pending:
+            self.queue.put_nowait((job, pending))
+        else:
+            job.status = "completed"
+            job.finished_at = time.time()
+        return job
+
+    async def _run(self):
+        while True:
+            job, pending = await self.queue.get()
+            job.status = "running"
+            try:
+                size = settings.ingest_batch_size
+                for start in range(0, len(pending), size):
+                    await self._embed_batch(job, pending[start:start + size])
+                job.status = "completed" if job.embedded else "failed"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error(f"{type(e).__name__}: {e}")
+                print(f"[INGEST] Job {job.job_id} failed: {type(e).__name__}: {e}")
+            finally:
+                job.finished_at = time.time()
+                self.queue.task_done()
+            print(f"[INGEST] Job {job.job_id} {job.status}: embedded {job.embedded}/{job.inserted}, failed {job.failed}")
+
+    async def _embed_urls(self, urls: List[str], version: EmbeddingVersion) -> List[Optional[list]]:
+        """One multi-input call; if Jina rejects the batch, fall back to per-item calls"""
+        for attempt in range(settings.ingest_outage_retries + 1):
+            try:
+                await self.limiter.acquire()
+                return await get_embeddings_batch(urls, version)
+            except EmbeddingServiceUnavailable as e:
+                if attempt == settings.ingest_outage_retries:
+                    raise
+                print(f"[INGEST] Jina unavailable ({e}); waiting {settings.jina_breaker_reset}s")
+                await asyncio.sleep(settings.jina_breaker_reset)
+            except httpx.HTTPStatusError:
+                if len(urls) == 1:
+                    return [None]
+                results = []
+                for url in urls:
+                    results.extend(await self._embed_urls([url], version))
+                return results
+        return [None] * len(urls)
+
+    async def _embed_batch(self, job: IngestJob, batch: List[dict]):
+        # Embed with every version in use, so a backfill in progress never falls behind
+        active, *others = await storage.write_versions()
+        urls = [doc["url"] for doc in batch]
+        fields = [{} for _ in batch]
+        # Image hashes let uploads of these very images skip the Jina call later
+        hashing = asyncio.create_task(fetch_image_hashes(urls)) if settings.image_hash_on_ingest else None
+        try:
+            for version in (active, *others):
+                embeddings = await self._embed_urls(urls, version)
+                for doc, doc_fields, embedding in zip(batch, fields, embeddings):
+                    if embedding:
+                        doc_fields.update(version.encode(embedding, settings.embedding_storage))
+                    elif version is not active:
+                        job.error(f"embed {doc['url']} ({version.key}): no embedding returned")
+        except BaseException:
+            if hashing is not None:
+                hashing.cancel()
+            raise
+
+        if hashing is not None:
+            for doc_fields, value in zip(fields, await hashing):
+                if value:
+                    doc_fields[IMAGE_HASH_FIELD] = value
+
+        now = datetime.now(timezone.utc)
+        updates, index_docs = [], []
+        for doc, doc_fields in zip(batch, fields):
+            if active.field("embedding") not in doc_fields:
+                job.failed += 1
+                job.error(f"embed {doc['url']}: no embedding returned")
+                continue
+            doc_fields["updated_at"] = now
+            updates.append((doc["_id"], doc_fields))
+            index_docs.append(apply_set(doc, doc_fields))
+
+        if updates:
+            await storage.update_products(updates)
+            job.embedded += len(updates)
+            # Make the products searchable now rather than on the next refresh
+            catalog_index.apply_changes(index_docs)
+
+ingest_worker = IngestWorker()
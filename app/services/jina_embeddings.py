@@ -1,32 +1,115 @@
+import asyncio
+import time
 import httpx
 import base64
 from config import settings
-from typing import Optional
-from PIL import Image
+from typing import BinaryIO, List, Optional, Union
 from io import BytesIO
+from app.services.resilience import ResilientCaller, CircuitOpenError, is_retryable
+from app.services.uploads import UploadRejected, open_image_guarded
+from app.services.embedding_versions import DEFAULT_VERSION, EmbeddingVersion
+from app.services.image_fetch import image_fetcher, image_fetch_stats
+from app.services.cache import TTLCache
+from app.services.profiling import record_stage
 
 headers = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {settings.jina_api_key}"
 }
 
-async def get_embedding(image_url: str) -> Optional[list]:
-    """Get embedding for image URL using Jina CLIP v2"""
-    payload = {
-        "model": "jina-clip-v2",
-        "input": [{"image": image_url}]
-    }
+jina_caller = ResilientCaller(
+    name="jina",
+    max_retries=settings.jina_max_retries,
+    backoff_base=settings.jina_backoff_base,
+    backoff_max=settings.jina_backoff_max,
+    deadline=settings.jina_deadline,
+    hedge_enabled=settings.jina_hedge_enabled,
+    hedge_quantile=settings.jina_hedge_quantile,
+    hedge_min_samples=settings.jina_hedge_min_samples,
+    breaker_threshold=settings.jina_breaker_threshold,
+    breaker_reset=settings.jina_breaker_reset,
+)
+
+# Multi-input batches are slower than the single-image calls the hedge delay is
+# learned from, so they use a separate caller with hedging disabled
+jina_batch_caller = ResilientCaller(
+    name="jina-batch",
+    max_retries=settings.jina_max_retries,
+    backoff_base=settings.jina_backoff_base,
+    backoff_max=settings.jina_backoff_max,
+    deadline=settings.jina_deadline,
+    hedge_enabled=False,
+    breaker_threshold=settings.jina_breaker_threshold,
+    breaker_reset=settings.jina_breaker_reset,
+)
+
+# Query embeddings by image content hash and model (URL searches)
+query_embedding_cache = TTLCache(settings.query_embedding_cache_max, settings.query_embedding_cache_ttl)
+
+class EmbeddingServiceUnavailable(Exception):
+    """Jina is down or timing out; callers should answer 503 instead of 400"""
+
+class JinaHTTP:
+    """Keep-alive connection pool to Jina, rebuilt if the event loop changes"""
+    client: Optional[httpx.AsyncClient] = None
+    loop = None
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if cls.client is None or cls.loop is not loop or cls.client.is_closed:
+            cls.client = httpx.AsyncClient(
+                timeout=settings.jina_timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.jina_max_connections,
+                    max_keepalive_connections=settings.jina_max_connections
+                )
+            )
+            cls.loop = loop
+        return cls.client
+
+    @classmethod
+    async def close(cls):
+        if cls.client is not None:
+            try:
+                await cls.client.aclose()
+            except Exception:
+                pass
+            cls.client = None
+
+async def _post_embeddings(payload: dict) -> dict:
+    """Single HTTP attempt against the Jina embeddings endpoint"""
+    client = JinaHTTP.get_client()
+    response = await client.post(
+        settings.jina_endpoint,
+        json=payload,
+        headers=headers
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def _request_embeddings(payload: dict, caller: ResilientCaller = jina_caller) -> dict:
+    """Run the request through retries/hedging/breaker and map outages to EmbeddingServiceUnavailable"""
+    start = time.perf_counter()
+    try:
+        return await caller.call(lambda: _post_embeddings(payload))
+    except CircuitOpenError as e:
+        print(f"[JINA] Failing fast: {e}")
+        raise EmbeddingServiceUnavailable(str(e))
+    except Exception as e:
+        if is_retryable(e):
+            print(f"[JINA] Giving up after retries: {type(e).__name__}: {e}")
+            raise EmbeddingServiceUnavailable(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        record_stage("jina", time.perf_counter() - start)
+
+async def get_embedding(image_url: str, version: Optional[EmbeddingVersion] = None) -> Optional[list]:
+    """Get embedding for image URL with the version's model (raises EmbeddingServiceUnavailable on outages)"""
+    payload = (version or DEFAULT_VERSION).payload([{"image": image_url}])
     
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                settings.jina_endpoint,
-                json=payload,
-                headers=headers
-            )
-        
-        response.raise_for_status()
-        data = response.json()
+        data = await _request_embeddings(payload)
         
         if 'data' in data and len(data['data']) > 0:
             embedding = data['data'][0]['embedding']
@@ -36,6 +119,8 @@ async def get_embedding(image_url: str) -> Optional[list]:
             print(f"[JINA] Unexpected response format: {data}")
             return None
             
+    except EmbeddingServiceUnavailable:
+        raise
     except httpx.HTTPStatusError as e:
         print(f"[JINA] HTTP {e.response.status_code}: {e.response.text[:500]}")
         return None
@@ -43,79 +128,98 @@ async def get_embedding(image_url: str) -> Optional[list]:
         print(f"[JINA] URL embedding error: {type(e).__name__}: {e}")
         return None
 
-async def get_embedding_from_file(file_path: str) -> Optional[list]:
-    """Get embedding from local image file"""
-    try:
-        # Open and process image
-        img = Image.open(file_path)
-        print(f"[JINA] Original image: {img.size}, mode: {img.mode}")
-        
-        # Convert to RGB if needed
-        if img.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            if img.mode in ('RGBA', 'LA'):
-                background.paste(img, mask=img.split()[-1])
-            else:
-                background.paste(img)
-            img = background
-            print(f"[JINA] Converted to RGB")
-        
-        # Resize if too large
-        max_size = 1024
-        if max(img.size) > max_size:
-            ratio = max_size / max(img.size)
-            new_size = tuple(int(dim * ratio) for dim in img.size)
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
-            print(f"[JINA] Resized to {new_size}")
-        
-        # Convert to base64
-        buffer = BytesIO()
-        img.save(buffer, format='JPEG', quality=90)
-        image_bytes = buffer.getvalue()
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-        
-        base64_size_kb = len(image_base64) / 1024
-        print(f"[JINA] Base64 size: {base64_size_kb:.1f} KB")
-        
-        # Use same model as database embeddings
-        payload = {
-            "model": "jina-clip-v2",  # Explicitly set to match database
-            "input": [{"image": image_base64}]
-        }
-        
-        async with httpx.AsyncClient(timeout=90.0) as client:
-            response = await client.post(
-                settings.jina_endpoint,
-                json=payload,
-                headers=headers
-            )
-        
-        print(f"[JINA] Response status: {response.status_code}")
-        
-        if response.status_code == 400:
-            error_text = response.text
-            print(f"[JINA] Bad Request Error: {error_text[:500]}")
-            # Try to extract specific error
-            try:
-                error_json = response.json()
-                print(f"[JINA] Error details: {error_json}")
-            except:
-                pass
-            return None
-        
-        response.raise_for_status()
-        data = response.json()
-        
-        if 'data' in data and len(data['data']) > 0:
-            embedding = data['data'][0]['embedding']
-            print(f"[JINA] File embedding: {len(embedding)} dimensions")
-            return embedding
+async def get_embeddings_batch(
+    image_urls: List[str],
+    version: Optional[EmbeddingVersion] = None
+) -> List[Optional[list]]:
+    """
+    Embed several image URLs in one multi-input request. Results are aligned
+    with the input; raises httpx.HTTPStatusError if Jina rejects the batch
+    (e.g. one unreachable image) and EmbeddingServiceUnavailable on outages.
+    """
+    payload = (version or DEFAULT_VERSION).payload([{"image": url} for url in image_urls])
+    data = await _request_embeddings(payload, caller=jina_batch_caller)
+    embeddings: List[Optional[list]] = [None] * len(image_urls)
+    for position, item in enumerate(data.get('data') or []):
+        index = item.get('index', position)
+        if 0 <= index < len(embeddings):
+            embeddings[index] = item.get('embedding')
+    return embeddings
+
+def prepare_image(source: Union[str, BinaryIO]) -> bytes:
+    """
+    Preprocess a query image the way uploads always were: guarded open, RGB on
+    white, at most 1024px on the long side, JPEG q90. Returns the JPEG bytes.
+    """
+    # PIL is only needed on the upload path; importing it here keeps cold starts lean
+    from PIL import Image
+    start = time.perf_counter()
+    # Open lazily and refuse decompression bombs before decoding pixels
+    img = open_image_guarded(source)
+    print(f"[JINA] Original image: {img.size}, mode: {img.mode}")
+    
+    # Let the JPEG decoder downscale by a power of two while decoding
+    max_size = 1024
+    if img.format == 'JPEG':
+        img.draft('RGB', (max_size, max_size))
+    
+    # Convert to RGB if needed
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        if img.mode in ('RGBA', 'LA'):
+            background.paste(img, mask=img.split()[-1])
         else:
-            print(f"[JINA] Unexpected response: {data}")
-            return None
-            
+            background.paste(img)
+        img = background
+        print(f"[JINA] Converted to RGB")
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    
+    # Resize if too large
+    if max(img.size) > max_size:
+        ratio = max_size / max(img.size)
+        new_size = tuple(int(dim * ratio) for dim in img.size)
+        img = img.resize(new_size, Image.Resampling.LANCZOS)
+        print(f"[JINA] Resized to {new_size}")
+    
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    record_stage("preprocess", time.perf_counter() - start)
+    return buffer.getvalue()
+
+async def _embed_jpeg(image_bytes: bytes, version: Optional[EmbeddingVersion]) -> Optional[list]:
+    """Embed preprocessed JPEG bytes sent inline as base64"""
+    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+    
+    base64_size_kb = len(image_base64) / 1024
+    print(f"[JINA] Base64 size: {base64_size_kb:.1f} KB")
+    
+    # Use the same model as the catalog vectors being searched
+    payload = (version or DEFAULT_VERSION).payload([{"image": image_base64}])
+    
+    data = await _request_embeddings(payload)
+    
+    if 'data' in data and len(data['data']) > 0:
+        embedding = data['data'][0]['embedding']
+        print(f"[JINA] File embedding: {len(embedding)} dimensions")
+        return embedding
+    else:
+        print(f"[JINA] Unexpected response: {data}")
+        return None
+
+async def get_embedding_from_file(
+    source: Union[str, BinaryIO],
+    version: Optional[EmbeddingVersion] = None
+) -> Optional[list]:
+    """Get embedding from a local image path or an open binary file object"""
+    try:
+        # PIL decoding is CPU-bound; keep it off the event loop
+        image_bytes = await asyncio.to_thread(prepare_image, source)
+        return await _embed_jpeg(image_bytes, version)
+    except (EmbeddingServiceUnavailable, UploadRejected):
+        raise
     except httpx.HTTPStatusError as e:
         print(f"[JINA] HTTP error {e.response.status_code}: {e.response.text[:500]}")
         return None
@@ -123,4 +227,49 @@ async def get_embedding_from_file(file_path: str) -> Optional[list]:
         print(f"[JINA] File embedding error: {type(e).__name__}: {e}")
         import traceback
         traceback.print_exc()
-        return None
\ No newline at end of file
+        return None
+
+def _cache_key(content_hash: str, version: Optional[EmbeddingVersion]) -> tuple:
+    version = version or DEFAULT_VERSION
+    return (content_hash, version.key, version.model, version.dimensions)
+
+async def get_embedding_for_url(image_url: str, version: Optional[EmbeddingVersion] = None) -> Optional[list]:
+    """
+    Embed the image at image_url, fetched by us rather than by Jina: the bytes
+    come from the conditional-GET cache, are preprocessed like uploads and
+    sent inline. Embeddings are cached by content hash, so any URL serving
+    the same bytes reuses one. Falls back to letting Jina fetch the URL when
+    our fetch fails (some hosts refuse server-side clients); UploadRejected is
+    raised for URLs we refuse outright (private hosts, oversized or non-image).
+    """
+    try:
+        fetched = await image_fetcher.fetch(image_url)
+    except UploadRejected:
+        raise
+    except (httpx.HTTPError, asyncio.TimeoutError, OSError) as e:
+        image_fetch_stats["fallback_to_jina"] += 1
+        print(f"[FETCH] {type(e).__name__}: {e}; letting Jina fetch {image_url[:80]}")
+        return await get_embedding(image_url, version)
+    
+    key = _cache_key(fetched.content_hash, version)
+    cached = query_embedding_cache.get(key)
+    if cached is not None:
+        print(f"[FETCH] Embedding cache hit ({fetched.source} image, sha256 {fetched.content_hash[:12]})")
+        return cached
+    
+    print(f"[FETCH] Got {len(fetched.content) / 1024:.1f} KB ({fetched.source})")
+    try:
+        # PIL decoding is CPU-bound; keep it off the event loop
+        image_bytes = await asyncio.to_thread(prepare_image, BytesIO(fetched.content))
+        embedding = await _embed_jpeg(image_bytes, version)
+    except (EmbeddingServiceUnavailable, UploadRejected):
+        raise
+    except httpx.HTTPStatusError as e:
+        print(f"[JINA] HTTP error {e.response.status_code}: {e.response.text[:500]}")
+        return None
+    except Exception as e:
+        print(f"[JINA] URL image embedding error: {type(e).__name__}: {e}")
+        return None
+    if embedding:
+        query_embedding_cache.set(key, embedding)
+    return embedding
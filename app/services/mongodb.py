@@ -1,10 +1,38 @@
+import asyncio
+from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import settings
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
 from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.services.indexes import EMBEDDED_FILTER, EMBEDDED_HINT, ensure_indexes, index_stats
+from app.services.embedding_versions import (
+    DEFAULT_VERSION,
+    EmbeddingVersion,
+    coverage_report,
+    get_active_version,
+    write_versions,
+)
+from app.services.storage_base import StorageBackend, timed
+
+DUPLICATE_KEY = 11000
+
+# Catalog loads read raw BSON: packed vectors come back as one bytes object
+# each, ready for np.frombuffer, instead of hundreds of Python floats
+RAW_CODEC = CodecOptions(document_class=RawBSONDocument)
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
 
 class MongoDB:
     client: AsyncIOMotorClient = None
+    loop = None
     
     @classmethod
     def connect(cls):
@@ -22,68 +50,230 @@ class MongoDB:
             tlsAllowInvalidCertificates=True,
             serverSelectionTimeoutMS=5000
         )
+        cls.loop = _running_loop()
         
     @classmethod
     def close(cls):
         if cls.client:
             cls.client.close()
+            cls.client = None
     
     @classmethod
-    def get_collection(cls):
+    def get_collection(cls, name: Optional[str] = None):
         # In some serverless environments (e.g., Vercel), lifespan events may not run reliably.
         # Ensure the client is connected lazily on first use.
-        # Always ensure we have a fresh client per request to avoid 'Event loop is closed'
+        # Reuse the pooled client while we stay on the same event loop; only a new
+        # loop (as some serverless runtimes create per request) needs a fresh client
+        # to avoid 'Event loop is closed'.
         try:
-            cls.connect()
+            if cls.client is None or cls.loop is not _running_loop():
+                cls.connect()
         except Exception as e:
             # Re-raise with clearer context
             raise RuntimeError(f"Failed to initialize MongoDB client: {e}")
 
         db = cls.client[settings.mongo_db]
-        return db[settings.mongo_col]
-
-async def get_products(
-    category: Optional[str] = None,
-    limit: int = 20,
-    skip: int = 0,
-    require_embedding: bool = False
-) -> List[dict]:
-    col = MongoDB.get_collection()
-    filter_query = {}
-    
-    if category:
-        filter_query["category"] = category
-    
-    if require_embedding:
-        filter_query["embedding"] = {"$exists": True, "$ne": None}
-    
-    cursor = col.find(filter_query).skip(skip).limit(limit)
-    products = []
-    
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        products.append(doc)
-    
-    return products
+        return db[name or settings.mongo_col]
 
-async def get_product_by_id(product_id: str) -> Optional[dict]:
-    col = MongoDB.get_collection()
-    try:
-        doc = await col.find_one({"_id": ObjectId(product_id)})
-        if doc:
+class MongoBackend(StorageBackend):
+    """MongoDB (Atlas) through the shared Motor client"""
+
+    name = "mongo"
+    supports_change_stream = True
+
+    def connect(self):
+        MongoDB.connect()
+
+    def close(self):
+        MongoDB.close()
+
+    def _versions(self):
+        return MongoDB.get_collection(settings.embedding_versions_col)
+
+    @timed
+    async def ping(self):
+        # A ping opens the first pooled connection (DNS + TLS + auth) ahead of traffic
+        await MongoDB.get_collection().database.command("ping")
+
+    async def ensure_indexes(self) -> dict:
+        return await ensure_indexes(MongoDB.get_collection())
+
+    @timed
+    async def get_products(
+        self,
+        category: Optional[str] = None,
+        limit: int = 20,
+        skip: int = 0,
+        require_embedding: bool = False,
+        include_embedding: bool = True
+    ) -> List[dict]:
+        col = MongoDB.get_collection()
+        filter_query = {}
+        
+        if category:
+            filter_query["category"] = category
+        
+        if require_embedding:
+            filter_query.update(EMBEDDED_FILTER)
+        
+        # Browsing never needs the vector; leaving it out saves ~768 doubles per document
+        projection = None if include_embedding else {"embedding": 0}
+        cursor = col.find(filter_query, projection).skip(skip).limit(limit)
+        products = []
+        
+        async for doc in cursor:
             doc["_id"] = str(doc["_id"])
-        return doc
-    except:
-        return None
+            products.append(doc)
+        
+        return products
 
-async def get_all_embeddings() -> List[dict]:
-    """Get all products that have embeddings for similarity search"""
-    col = MongoDB.get_collection()
-    cursor = col.find({"embedding": {"$exists": True, "$ne": None}})
-    
-    products = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        products.append(doc)
-    
-    return products
+    @timed
+    async def get_products_page(self, category: Optional[str], limit: int, after: Optional[str] = None) -> List[dict]:
+        filter_query = {}
+        if category:
+            filter_query["category"] = category
+        if after:
+            filter_query["_id"] = {"$gt": _object_id(after)}
+        # Served by the category_id index (or _id alone) without a sort stage
+        cursor = MongoDB.get_collection().find(filter_query, {"embedding": 0, "vectors": 0}).sort("_id", 1).limit(limit)
+        products = []
+        async for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            products.append(doc)
+        return products
+
+    async def iter_products(
+        self,
+        category: Optional[str] = None,
+        batch_size: int = 500,
+        version: Optional[EmbeddingVersion] = None
+    ) -> AsyncIterator[List[dict]]:
+        filter_query = {"category": category} if category else {}
+        projection = version.projection() if version is not None else {"embedding": 0, "vectors": 0}
+        # The driver's batch size bounds how many documents are held at once
+        cursor = MongoDB.get_collection().find(filter_query, projection, batch_size=batch_size).sort("_id", 1)
+        try:
+            batch = []
+            async for doc in cursor:
+                if version is not None:
+                    doc = version.view(doc)
+                doc["_id"] = str(doc["_id"])
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            # Also reached when the consumer stops early (client disconnect): free the server cursor
+            await cursor.close()
+
+    @timed
+    async def get_product_by_id(self, product_id: str) -> Optional[dict]:
+        col = MongoDB.get_collection()
+        try:
+            doc = await col.find_one({"_id": ObjectId(product_id)})
+            if doc:
+                doc["_id"] = str(doc["_id"])
+            return doc
+        except:
+            return None
+
+    @timed
+    async def get_all_embeddings(self, version: Optional[EmbeddingVersion] = None) -> List[dict]:
+        """
+        Get all products that have embeddings of `version` (default v1) for
+        similarity search, with that version's vector in the top-level fields. The
+        embedding is a list for array storage and bytes for Binary storage; decode
+        it with vector_codec.as_vector(doc["embedding"], doc.get("embedding_dtype")).
+        """
+        version = version or DEFAULT_VERSION
+        col = MongoDB.get_collection().with_options(codec_options=RAW_CODEC)
+        cursor = col.find(version.embedded_filter(), version.projection(), batch_size=1000)
+        
+        products = []
+        async for raw in cursor:
+            doc = version.view(dict(raw.items()))
+            doc["_id"] = str(doc["_id"])
+            products.append(doc)
+        
+        return products
+
+    @timed
+    async def changed_since(self, watermark: datetime, limit: int, after: Optional[str] = None) -> List[dict]:
+        col = MongoDB.get_collection()
+        if after is None:
+            query = {"updated_at": {"$gte": watermark}}
+        else:
+            query = {"$or": [
+                {"updated_at": {"$gt": watermark}},
+                {"updated_at": watermark, "_id": {"$gt": _object_id(after)}},
+            ]}
+        cursor = col.find(query).sort([("updated_at", 1), ("_id", 1)]).limit(limit)
+        docs = []
+        async for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            docs.append(doc)
+        return docs
+
+    @timed
+    async def embedded_ids(self, version: EmbeddingVersion) -> Set[str]:
+        col = MongoDB.get_collection()
+        return {str(doc["_id"]) async for doc in col.find(version.embedded_filter(), {"_id": 1})}
+
+    @timed
+    async def insert_products(self, docs: List[dict]) -> Dict[int, Tuple[bool, str]]:
+        failed = {}
+        if not docs:
+            return failed
+        try:
+            # insert_many assigns _id client-side, so inserted rows already carry it
+            await MongoDB.get_collection().insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                failed[err["index"]] = (err.get("code") == DUPLICATE_KEY, err.get("errmsg"))
+        return failed
+
+    @timed
+    async def update_products(self, updates: List[Tuple[str, dict]]):
+        if not updates:
+            return
+        ops = [UpdateOne({"_id": _object_id(pid)}, {"$set": fields}) for pid, fields in updates]
+        await MongoDB.get_collection().bulk_write(ops, ordered=False)
+
+    async def get_active_version(self) -> EmbeddingVersion:
+        return await get_active_version(self._versions())
+
+    async def write_versions(self) -> List[EmbeddingVersion]:
+        return await write_versions(self._versions())
+
+    async def coverage_report(self) -> dict:
+        return await coverage_report(MongoDB.get_collection(), self._versions())
+
+    async def diagnostics(self) -> dict:
+        col = MongoDB.get_collection()
+        # server_info forces a round-trip
+        await col.database.client.server_info()
+        # Metadata count, no collection scan
+        total = await col.estimated_document_count()
+        try:
+            with_embeddings = await col.count_documents(EMBEDDED_FILTER, hint=EMBEDDED_HINT)
+        except Exception:
+            with_embeddings = None
+        sample = await col.find_one({}, projection={"_id": 1, "category": 1})
+        info = {
+            "mongo": "connected",
+            "counts": {"total": int(total), "with_embeddings": with_embeddings},
+            "sample": {"_id": str(sample["_id"]) if sample and "_id" in sample else None, "category": sample.get("category") if sample else None}
+        }
+        try:
+            info["indexes"] = await index_stats(col)
+        except Exception as e:
+            info["indexes"] = {"error": str(e)}
+        return info
+
+def _object_id(product_id):
+    # Ids travel as strings through the index; documents are keyed by ObjectId
+    if isinstance(product_id, str) and ObjectId.is_valid(product_id):
+        return ObjectId(product_id)
+    return product_id
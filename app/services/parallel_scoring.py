@@ -0,0 +1,121 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+from config import settings
+from app.services.similarity import top_k_similar
+
+def _chunk_top_k(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    top_k: int,
+    min_similarity: float,
+    start: int,
+    stop: int,
+    rows: Optional[np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Best top_k (rows, scores) of one chunk, unordered; matmul and argpartition release the GIL"""
+    if rows is None:
+        scores = matrix[start:stop] @ query
+        chunk_rows = None
+    else:
+        chunk_rows = rows[start:stop]
+        scores = matrix[chunk_rows] @ query
+    keep = np.flatnonzero(scores >= min_similarity)
+    if len(keep) > top_k:
+        keep = keep[np.argpartition(-scores[keep], top_k - 1)[:top_k]]
+    found = keep + start if chunk_rows is None else chunk_rows[keep]
+    return found, scores[keep]
+
+class ParallelScorer:
+    """
+    Exact top-k over the catalog matrix split into row chunks scored on a
+    thread pool: each chunk keeps its own top_k with argpartition, and the
+    partial results are merged into one ranking. Results are the same as a
+    serial scan; ties are broken by catalog order.
+
+    BLAS gets one thread per worker (through threadpoolctl) so
+    SEARCH_THREADS workers do not each spawn a full set of BLAS threads;
+    the app applies that limit at startup with limit_blas_threads().
+    """
+
+    def __init__(self):
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.blas_limited: Optional[bool] = None
+
+    @property
+    def threads(self) -> int:
+        return settings.search_threads if settings.search_threads > 0 else (os.cpu_count() or 1)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # The calling thread scores a chunk too
+                self._pool = ThreadPoolExecutor(max_workers=max(self.threads - 1, 1), thread_name_prefix="score")
+        return self._pool
+
+    def limit_blas_threads(self):
+        """
+        Limit BLAS to one thread for the whole process (SEARCH_LIMIT_BLAS_THREADS).
+        Process-wide on purpose: the serial path and scripts run single-threaded
+        BLAS matvecs too, which for one query vector are memory-bound anyway.
+        """
+        if not settings.search_limit_blas_threads:
+            self.blas_limited = False
+            return
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            print("[SCORING] threadpoolctl missing (see requirements.txt); BLAS threads are not limited")
+            self.blas_limited = False
+            return
+        threadpool_limits(limits=1, user_api="blas")
+        self.blas_limited = True
+        print("[SCORING] BLAS limited to one thread per scoring worker")
+
+    def top_k(
+        self,
+        matrix: np.ndarray,
+        query: np.ndarray,
+        top_k: int = 10,
+        min_similarity: float = 0.0,
+        rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Same contract as similarity.top_k_similar; small scans stay serial"""
+        n = len(matrix) if rows is None else len(rows)
+        if self.threads <= 1 or n < settings.search_parallel_min_rows:
+            return top_k_similar(matrix, query, top_k, min_similarity, rows)
+        if n == 0:
+            return []
+
+        # At least one chunk per thread, never more rows per chunk than configured
+        chunk = max(min(settings.search_chunk_rows, -(-n // self.threads)), 1)
+        bounds = [(start, min(start + chunk, n)) for start in range(0, n, chunk)]
+        pool = self._get_pool()
+        futures = [
+            pool.submit(_chunk_top_k, matrix, query, top_k, min_similarity, start, stop, rows)
+            for start, stop in bounds[1:]
+        ]
+        parts = [_chunk_top_k(matrix, query, top_k, min_similarity, *bounds[0], rows)]
+        parts.extend(future.result() for future in futures)
+
+        found = np.concatenate([part[0] for part in parts])
+        scores = np.concatenate([part[1] for part in parts])
+        if len(found) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            found, scores = found[best], scores[best]
+        # Best first, catalog order among equal scores
+        order = np.lexsort((found, -scores))
+        return [(int(found[i]), float(scores[i])) for i in order]
+
+    def snapshot(self) -> dict:
+        return {
+            "threads": self.threads,
+            "chunk_rows": settings.search_chunk_rows,
+            "parallel_min_rows": settings.search_parallel_min_rows,
+            "blas_limited": self.blas_limited,
+        }
+
+scorer = ParallelScorer()
@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from config import settings
+from app.services.cache import TTLCache
+
+# Leaf frames in these files mean a worker thread is idle, not working for anyone
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+class RequestTimer:
+    """Seconds spent per stage of one request; shared with its to_thread workers via the context"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+_current_timer: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+def record_stage(stage: str, seconds: float):
+    """Add time to a stage of the current request (a no-op outside requests)"""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(stage, seconds)
+
+def token_matches(supplied: Optional[str], token: str) -> bool:
+    """Constant-time check of a client-supplied profiling token (any characters)"""
+    if not token or not supplied:
+        return False
+    # compare_digest refuses non-ASCII str; bytes work for every value
+    return secrets.compare_digest(supplied.encode("utf-8"), token.encode("utf-8"))
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """
+    Samples the Python stacks of every thread at a fixed interval from a
+    background thread and aggregates them as folded stacks ("a;b;c count"),
+    the input format of flamegraph.pl, inferno and speedscope.
+
+    The event loop thread is sampled whatever it runs, so requests overlapping
+    the profiled one show up too; idle pool threads are left out.
+    """
+
+    def __init__(self, interval: float, loop_thread: int):
+        self.interval = interval
+        self.loop_thread = loop_thread
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.profile_id: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident != self.loop_thread and os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if ident == self.loop_thread:
+                    root = "event-loop"
+                else:
+                    if ident not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    root = names.get(ident, f"thread-{ident}")
+                stack.append(root)
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class Profiler:
+    """
+    Opt-in profiling of single requests (one at a time, since the sampler
+    sees the whole process) and an always-on record of the slowest requests
+    with their stage breakdown.
+    """
+
+    def __init__(self):
+        self.reports = TTLCache(settings.profiling_reports_max, settings.profiling_report_ttl)
+        self._slowest: List[tuple] = []
+        self._seq = itertools.count()
+        self._busy = threading.Lock()
+
+    def start_timer(self):
+        timer = RequestTimer()
+        return timer, _current_timer.set(timer)
+
+    def stop_timer(self, token):
+        _current_timer.reset(token)
+
+    def try_begin(self) -> Optional[StackSampler]:
+        """A running sampler, or None when another request is being profiled"""
+        if not self._busy.acquire(blocking=False):
+            return None
+        sampler = StackSampler(settings.profiling_interval_ms / 1000, threading.get_ident())
+        sampler.profile_id = f"{int(time.time())}-{next(self._seq)}"
+        sampler.start()
+        return sampler
+
+    def finish(self, sampler: StackSampler, request: dict):
+        """Stop sampling and store the report under the sampler's profile_id"""
+        sampler.stop()
+        self._busy.release()
+        self.reports.set(sampler.profile_id, {
+            **request,
+            "interval_ms": settings.profiling_interval_ms,
+            "samples": sampler.samples,
+            "folded": sampler.folded(),
+        })
+
+    def get_report(self, profile_id: str) -> Optional[dict]:
+        return self.reports.get(profile_id)
+
+    def _expire(self):
+        cutoff = time.time() - settings.profiling_slowest_window
+        if self._slowest and min(e[2]["at"] for e in self._slowest) < cutoff:
+            self._slowest = [e for e in self._slowest if e[2]["at"] >= cutoff]
+            heapq.heapify(self._slowest)
+
+    def record(self, request: dict):
+        """Keep the request if it is among the slowest N of the rolling window"""
+        if settings.profiling_slowest <= 0:
+            return
+        self._expire()
+        entry = (request["duration_ms"], next(self._seq), request)
+        if len(self._slowest) < settings.profiling_slowest:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self) -> List[dict]:
+        self._expire()
+        return [request for _, _, request in sorted(self._slowest, key=lambda e: (-e[0], e[1]))]
+
+    def reset(self):
+        self._slowest = []
+
+profiler = Profiler()
@@ -0,0 +1,238 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+# Status codes worth retrying: the request is idempotent and the failure is transient
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is open and calls fail fast"""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transport errors, timeouts and transient HTTP statuses are retryable"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies used to derive the hedge delay"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._sorted: Optional[list] = None
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        idx = min(len(self._sorted) - 1, int(q * len(self._sorted)))
+        return self._sorted[idx]
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open probe -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # Half-open: let exactly one probe through
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def release_probe(self):
+        """The probe ended without a verdict (cancelled); the next call probes instead"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"[RESILIENCE] Circuit opened after {self.failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class AsyncRateLimiter:
+    """Token bucket: at most `rate` acquisitions per second, bursting up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ResilientCaller:
+    """
+    Wraps an idempotent async call with jittered retries, p95-based hedging
+    and a circuit breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        deadline: float = 90.0,
+        hedge_enabled: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30.0,
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "short_circuited": 0}
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge_enabled or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.quantile(self.hedge_quantile)
+
+    async def _hedged(self, fn: Callable[[], Awaitable[T]]) -> T:
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(fn())
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.stats["hedges"] += 1
+        backup = asyncio.ensure_future(fn())
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        self.stats["calls"] += 1
+        if not self.breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        probing = self.breaker.state == CircuitBreaker.HALF_OPEN
+        started = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                remaining = self.deadline - (time.monotonic() - started)
+                attempt_start = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(self._hedged(fn), timeout=max(remaining, 0.001))
+                except Exception as e:
+                    probing = False
+                    if not is_retryable(e):
+                        # The service answered (e.g. 4xx for a bad image); that is not an outage
+                        self.breaker.record_success()
+                        raise
+                    self.breaker.record_failure()
+                    pause = self._backoff(attempt)
+                    remaining = self.deadline - (time.monotonic() - started)
+                    if attempt >= self.max_retries or pause >= remaining or not self.breaker.allow():
+                        raise
+                    probing = self.breaker.state == CircuitBreaker.HALF_OPEN
+                    attempt += 1
+                    self.stats["retries"] += 1
+                    print(f"[RESILIENCE] {self.name} attempt {attempt} failed ({type(e).__name__}), retrying in {pause:.2f}s")
+                    await asyncio.sleep(pause)
+                    continue
+
+                probing = False
+                self.latency.observe(time.monotonic() - attempt_start)
+                self.breaker.record_success()
+                return result
+        finally:
+            # Cancelled mid-probe (client gone, lost hedge, shutdown): that says nothing
+            # about the service, but a probe left claimed would keep the breaker open for good
+            if probing:
+                self.breaker.release_probe()
+
+    def snapshot(self) -> dict:
+        p95 = self.latency.quantile(0.95)
+        return {
+            "breaker": self.breaker.snapshot(),
+            "latency_p95_s": round(p95, 3) if p95 is not None else None,
+            "samples": len(self.latency),
+            **self.stats,
+        }
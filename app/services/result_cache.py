@@ -0,0 +1,71 @@
+import hashlib
+from typing import List, Optional, Tuple
+import numpy as np
+from config import settings
+from app.models.product import FilterExpr
+from app.services.cache import TTLCache
+
+def query_fingerprint(query_embedding: list) -> bytes:
+    """Digest of the query vector as float32; equal vectors give equal fingerprints"""
+    vector = np.asarray(query_embedding, dtype=np.float32)
+    return hashlib.blake2b(vector.tobytes(), digest_size=16).digest()
+
+class CachedResult:
+    """
+    A ranked first page: (fragment, score) hits and total matches, plus the
+    session candidates (product ids and scores, best first; None with
+    sessions disabled). Sessions themselves are never shared: each request
+    served from here opens its own session over the candidates.
+    """
+
+    __slots__ = ("hits", "total", "ids", "scores")
+
+    def __init__(
+        self,
+        hits: List[Tuple[bytes, float]],
+        total: int,
+        ids: Optional[List[str]] = None,
+        scores: Optional[np.ndarray] = None
+    ):
+        self.hits = hits
+        self.total = total
+        self.ids = ids
+        self.scores = scores
+
+class ResultCache:
+    """
+    First pages of recent searches. Keys include the snapshot's version and
+    generation, so any index change (ingest, refresh, cutover) makes older
+    entries unreachable; they age out of the LRU without explicit invalidation.
+    The query URL is not part of the key: any URL or upload with the same
+    vector is served, under a session and query_url of its own.
+    """
+
+    def __init__(self):
+        self.cache = TTLCache(settings.result_cache_max, settings.result_cache_ttl)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.result_cache_max > 0
+
+    def key(self, snapshot, query_embedding: list, top_k: int, min_similarity: float, expr: Optional[FilterExpr]) -> tuple:
+        filter_key = expr.model_dump_json(exclude_none=True) if expr is not None else None
+        return (
+            query_fingerprint(query_embedding),
+            top_k,
+            float(min_similarity),
+            filter_key,
+            snapshot.version.key,
+            snapshot.generation,
+        )
+
+    def get(self, key: tuple) -> Optional[CachedResult]:
+        return self.cache.get(key)
+
+    def set(self, key: tuple, result: CachedResult):
+        self.cache.set(key, result)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+result_cache = ResultCache()
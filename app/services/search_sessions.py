@@ -0,0 +1,72 @@
+import secrets
+from typing import List, Optional, Tuple
+import numpy as np
+from config import settings
+from app.models.product import FilterExpr
+from app.services.cache import TTLCache
+from app.services.filters import CompiledFilter
+
+class SearchSession:
+    """
+    Ranked candidates of one search (product ids and scores, best first).
+    Paging, re-thresholding and narrower filters are answered from this list
+    without re-embedding the query or re-scoring the catalog.
+    """
+
+    def __init__(self, query_url: str, ids: List[str], scores: np.ndarray, version_key: str):
+        self.token = secrets.token_urlsafe(16)
+        self.query_url = query_url
+        self.ids = ids
+        self.scores = scores
+        self.version_key = version_key
+        self._rows: Optional[np.ndarray] = None
+        self._rows_generation = None
+
+    def rows(self, snapshot) -> np.ndarray:
+        """Candidate rows in `snapshot`, -1 for products that left the index"""
+        if self._rows is None or self._rows_generation != snapshot.generation:
+            self._rows = np.fromiter((snapshot.position.get(pid, -1) for pid in self.ids), dtype=np.int64, count=len(self.ids))
+            self._rows_generation = snapshot.generation
+        return self._rows
+
+    def page(
+        self,
+        snapshot,
+        offset: int,
+        limit: int,
+        min_similarity: float,
+        filter: Optional[FilterExpr] = None
+    ) -> Tuple[List[Tuple[bytes, float]], int]:
+        """(fragment, score) hits for the page, and how many candidates match overall"""
+        rows = self.rows(snapshot)
+        keep = (rows >= 0) & (self.scores >= min_similarity)
+        if filter is not None and keep.any():
+            # Raises FilterError like a full search would
+            compiled = CompiledFilter(filter, snapshot.column, len(snapshot.products))
+            keep[keep] = compiled.mask(rows[keep])
+        matches = np.flatnonzero(keep)
+        page = matches[offset:offset + limit]
+        return [(snapshot.fragments[rows[i]], float(self.scores[i])) for i in page], len(matches)
+
+class SearchSessionStore:
+    def __init__(self):
+        self.cache = TTLCache(settings.search_session_max, settings.search_session_ttl)
+
+    def create(self, query_url: str, snapshot, hits: List[Tuple[int, float]]) -> SearchSession:
+        return self.open(
+            query_url,
+            [snapshot.ids[row] for row, _ in hits],
+            np.fromiter((score for _, score in hits), dtype=np.float32, count=len(hits)),
+            snapshot.version.key,
+        )
+
+    def open(self, query_url: str, ids: List[str], scores: np.ndarray, version_key: str) -> SearchSession:
+        """New session over already ranked candidates (e.g. from the result cache)"""
+        session = SearchSession(query_url, ids, scores, version_key)
+        self.cache.set(session.token, session)
+        return session
+
+    def get(self, token: str) -> Optional[SearchSession]:
+        return self.cache.get(token)
+
+search_sessions = SearchSessionStore()
@@ -0,0 +1,63 @@
+import base64
+import orjson
+from typing import Iterable, List, Optional, Tuple
+from app.services.vector_codec import as_vector
+from app.services.thumbnails import thumbnail_urls
+
+def product_fields(doc: dict) -> dict:
+    """Public product view matching ProductResponse's JSON output"""
+    dim = doc.get("embedding_dim")
+    url = str(doc.get("url", ""))
+    return {
+        "_id": str(doc["_id"]),
+        "name": str(doc.get("name", "")),
+        "category": str(doc.get("category", "")),
+        "url": url,
+        "embedding_dim": int(dim) if dim is not None else None,
+        "thumbnails": thumbnail_urls(str(doc["_id"]), url),
+    }
+
+def product_fragment(doc: dict) -> bytes:
+    """Pre-rendered JSON for one product; cached per product in the catalog index"""
+    return orjson.dumps(product_fields(doc))
+
+def search_response_bytes(query_url: str, hits: Iterable[Tuple[bytes, float]], **extra) -> bytes:
+    """
+    Assemble a SearchResponse body from cached product fragments. The results
+    were built by us, so they are not re-validated through Pydantic. `extra`
+    adds further top-level SearchResponse fields (session token, offset...).
+    """
+    items: List[bytes] = [
+        b'{"product":' + fragment + b',"similarity_score":' + orjson.dumps(round(score, 4)) + b"}"
+        for fragment, score in hits
+    ]
+    return (
+        b'{"query_url":' + orjson.dumps(query_url)
+        + b',"results":[' + b",".join(items)
+        + b'],"total_results":' + str(len(items)).encode()
+        + b"".join(b',"' + key.encode() + b'":' + orjson.dumps(value) for key, value in extra.items())
+        + b"}"
+    )
+
+def products_list_bytes(docs: Iterable[dict]) -> bytes:
+    """JSON array of products in ProductResponse shape"""
+    return orjson.dumps([product_fields(doc) for doc in docs])
+
+def product_page_bytes(docs: List[dict], next_cursor: Optional[str]) -> bytes:
+    """ProductPage body"""
+    return orjson.dumps({"products": [product_fields(doc) for doc in docs], "next_cursor": next_cursor})
+
+def products_ndjson_bytes(docs: Iterable[dict], include_embedding: bool = False) -> bytes:
+    """
+    One ProductResponse object per line. With include_embedding, each line also
+    carries `embedding` as base64 of little-endian float32 (null when absent).
+    """
+    lines = []
+    for doc in docs:
+        fields = product_fields(doc)
+        if include_embedding:
+            vector = as_vector(doc.get("embedding"), doc.get("embedding_dtype"))
+            fields["embedding"] = base64.b64encode(vector.astype("<f4").tobytes()).decode() if vector is not None else None
+            fields["embedding_dtype"] = "float32" if vector is not None else None
+        lines.append(orjson.dumps(fields))
+    return b"\n".join(lines) + b"\n" if lines else b""
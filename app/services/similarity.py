@@ -1,46 +1,39 @@
 import numpy as np
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
-def cosine_similarity(vec1: list, vec2: list) -> float:
-    """Calculate cosine similarity between two vectors"""
-    a = np.array(vec1, dtype=float)
-    b = np.array(vec2, dtype=float)
-    
-    dot_product = np.dot(a, b)
-    norm_a = np.linalg.norm(a)
-    norm_b = np.linalg.norm(b)
-    
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    
-    return float(dot_product / (norm_a * norm_b))
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows in place (float32); zero rows stay zero so they score 0"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
 
-def find_similar_products(
-    query_embedding: list,
-    products: List[dict],
+def top_k_similar(
+    matrix: np.ndarray,
+    query: np.ndarray,
     top_k: int = 10,
-    min_similarity: float = 0.0
-) -> List[Tuple[dict, float]]:
+    min_similarity: float = 0.0,
+    rows: Optional[np.ndarray] = None
+) -> List[Tuple[int, float]]:
+    """
+    Vectorized cosine top-k over a row-normalized matrix. `rows` restricts
+    scoring to a subset of row indices. Returns (row, score) best first.
+    """
+    if rows is not None:
+        if len(rows) == 0:
+            return []
+        scores = matrix[rows] @ query
+    else:
+        scores = matrix @ query
 
-    similarities = []
-    q_len = len(query_embedding) if isinstance(query_embedding, (list, tuple)) else 0
-    
-    for product in products:
-        emb = product.get('embedding')
-        if not emb:
-            continue
-        # Skip if embedding dimensions don't match
-        if q_len and len(emb) != q_len:
-            # Optional: attach a marker for diagnostics
-            # product['_dim_mismatch'] = True
-            continue
-        
-        similarity = cosine_similarity(query_embedding, emb)
-        
-        if similarity >= min_similarity:
-            similarities.append((product, similarity))
-    
-    # Sort by similarity score (descending)
-    similarities.sort(key=lambda x: x[1], reverse=True)
-    
-    return similarities[:top_k]
+    keep = np.flatnonzero(scores >= min_similarity)
+    if len(keep) > top_k:
+        part = np.argpartition(-scores[keep], top_k - 1)[:top_k]
+        keep = keep[part]
+    # Stable sort on descending score keeps catalog order for ties
+    keep = keep[np.argsort(-scores[keep], kind="stable")]
+
+    if rows is not None:
+        return [(int(rows[i]), float(scores[i])) for i in keep]
+    return [(int(i), float(scores[i])) for i in keep]
@@ -0,0 +1,369 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+import orjson
+from bson import ObjectId
+from app.services.embedding_versions import DEFAULT_VERSION, TOP_LEVEL_VERSION, EmbeddingVersion
+from app.services.storage_base import StorageBackend, apply_set, timed
+from app.services.vector_codec import encode_embedding
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    url TEXT UNIQUE,
+    category TEXT,
+    embedding_dim INTEGER,
+    updated_at REAL,
+    doc BLOB NOT NULL,
+    embedding BLOB,
+    embedding_dtype TEXT
+);
+DROP INDEX IF EXISTS products_category;
+CREATE INDEX IF NOT EXISTS products_category_id ON products (category, id);
+CREATE INDEX IF NOT EXISTS products_embedded ON products (embedding_dim) WHERE embedding_dim > 0;
+DROP INDEX IF EXISTS products_updated_at;
+CREATE INDEX IF NOT EXISTS products_updated_at_id ON products (updated_at, id);
+"""
+
+ROW_FIELDS = "id, url, category, embedding_dim, updated_at, doc, embedding, embedding_dtype"
+
+# Kept in their own columns rather than in the JSON document
+COLUMNS = ("_id", "url", "category", "embedding_dim", "updated_at", "embedding", "embedding_dtype")
+
+def _epoch(value) -> Optional[float]:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        # Whole microseconds, so the datetime read back compares equal (poll cursors)
+        return datetime.fromtimestamp(value, tz=timezone.utc).timestamp()
+    return value
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return list(value)
+    if isinstance(value, (ObjectId, datetime)):
+        return str(value)
+    raise TypeError(f"Cannot store {type(value).__name__} in a SQLite product document")
+
+class SQLiteStore:
+    """
+    Synchronous product store in one SQLite file. Vectors are always kept as
+    packed little-endian blobs (float32 unless float16 was asked for), so a
+    catalog load is one sequential read with no per-float decoding.
+
+    Only the top-level embedding version is supported: blue/green versions
+    need the MongoDB registry.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # One connection shared by the worker threads; SQLite serialises writers anyway
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _row(doc: dict) -> tuple:
+        embedding = doc.get("embedding")
+        dtype = doc.get("embedding_dtype")
+        if embedding is not None and not isinstance(embedding, (bytes, bytearray)):
+            packed = encode_embedding(embedding, "float32")
+            embedding, dtype = packed["embedding"], packed["embedding_dtype"]
+        rest = {k: v for k, v in doc.items() if k not in COLUMNS}
+        return (
+            str(doc["_id"]),
+            doc.get("url"),
+            doc.get("category"),
+            doc.get("embedding_dim"),
+            _epoch(doc.get("updated_at")),
+            orjson.dumps(rest, default=_json_default),
+            bytes(embedding) if embedding is not None else None,
+            dtype,
+        )
+
+    @staticmethod
+    def _doc(row: tuple, include_embedding: bool = True) -> dict:
+        pid, url, category, dim, updated_at, payload, embedding, dtype = row
+        doc = orjson.loads(payload)
+        doc.update({"_id": pid, "url": url, "category": category, "embedding_dim": dim})
+        if updated_at is not None:
+            doc["updated_at"] = datetime.fromtimestamp(updated_at, tz=timezone.utc)
+        if include_embedding:
+            doc["embedding"] = embedding
+            doc["embedding_dtype"] = dtype
+        return doc
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def query(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute(sql, tuple(params)).fetchall()
+
+    def find(
+        self,
+        category: Optional[str] = None,
+        limit: int = 20,
+        skip: int = 0,
+        require_embedding: bool = False,
+        include_embedding: bool = True
+    ) -> List[dict]:
+        where, params = [], []
+        if category:
+            where.append("category = ?")
+            params.append(category)
+        if require_embedding:
+            where.append("embedding_dim > 0")
+        columns = "id, url, category, embedding_dim, updated_at, doc, " + (
+            "embedding, embedding_dtype" if include_embedding else "NULL, NULL"
+        )
+        sql = f"SELECT {columns} FROM products"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY rowid LIMIT ? OFFSET ?"
+        rows = self.query(sql, [*params, limit, skip])
+        return [self._doc(row, include_embedding) for row in rows]
+
+    def page(
+        self,
+        category: Optional[str],
+        limit: int,
+        after: Optional[str] = None,
+        include_embedding: bool = False
+    ) -> List[dict]:
+        where, params = [], []
+        if category:
+            where.append("category = ?")
+            params.append(category)
+        if after:
+            where.append("id > ?")
+            params.append(after)
+        columns = "id, url, category, embedding_dim, updated_at, doc, " + (
+            "embedding, embedding_dtype" if include_embedding else "NULL, NULL"
+        )
+        sql = f"SELECT {columns} FROM products"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id LIMIT ?"
+        rows = self.query(sql, [*params, limit])
+        return [self._doc(row, include_embedding) for row in rows]
+
+    def get(self, product_id: str) -> Optional[dict]:
+        rows = self.query(f"SELECT {ROW_FIELDS} FROM products WHERE id = ?", [product_id])
+        return self._doc(rows[0]) if rows else None
+
+    def embedded(self) -> List[dict]:
+        rows = self.query(
+            f"SELECT {ROW_FIELDS} "
+            "FROM products WHERE embedding_dim > 0 ORDER BY rowid"
+        )
+        return [self._doc(row) for row in rows]
+
+    def changed_since(self, watermark: datetime, limit: int, after: Optional[str] = None) -> List[dict]:
+        if after is None:
+            where, params = "updated_at >= ?", [_epoch(watermark)]
+        else:
+            where, params = "updated_at > ? OR (updated_at = ? AND id > ?)", [_epoch(watermark), _epoch(watermark), after]
+        rows = self.query(
+            f"SELECT {ROW_FIELDS} "
+            f"FROM products WHERE {where} ORDER BY updated_at, id LIMIT ?",
+            [*params, limit]
+        )
+        return [self._doc(row) for row in rows]
+
+    def embedded_ids(self) -> Set[str]:
+        return {row[0] for row in self.query("SELECT id FROM products WHERE embedding_dim > 0")}
+
+    def insert(self, docs: List[dict]) -> Dict[int, Tuple[bool, str]]:
+        """Insert rows one by one in a single transaction; failures are reported per position"""
+        failed = {}
+        with self.transaction() as conn:
+            for position, doc in enumerate(docs):
+                # Assigned in place like pymongo's insert_many does
+                doc.setdefault("_id", ObjectId())
+                try:
+                    conn.execute("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._row(doc))
+                except sqlite3.IntegrityError as e:
+                    failed[position] = ("url" in str(e), str(e))
+        return failed
+
+    def upsert(self, docs: List[dict]):
+        """Replace whole documents (imports and copies from another backend)"""
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [self._row(d) for d in docs])
+
+    def update(self, updates: List[Tuple[str, dict]]):
+        """Read-modify-write each document under one transaction; rows keep their browse position"""
+        with self.transaction() as conn:
+            for pid, fields in updates:
+                row = conn.execute(f"SELECT {ROW_FIELDS} FROM products WHERE id = ?", (str(pid),)).fetchone()
+                if row is None:
+                    continue
+                pid, *values = self._row(apply_set(self._doc(row), fields))
+                conn.execute(
+                    "UPDATE products SET url = ?, category = ?, embedding_dim = ?, updated_at = ?, doc = ?, "
+                    "embedding = ?, embedding_dtype = ? WHERE id = ?",
+                    (*values, pid)
+                )
+
+    def counts(self) -> dict:
+        total, embedded = self.query("SELECT COUNT(*), COALESCE(SUM(embedding_dim > 0), 0) FROM products")[0]
+        return {"total": total, "with_embeddings": embedded}
+
+    def embedding_dims(self) -> List[int]:
+        return [row[0] for row in self.query("SELECT DISTINCT embedding_dim FROM products WHERE embedding_dim > 0 ORDER BY 1")]
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded single-node backend: no network round-trips. Calls run on worker
+    threads so the event loop never blocks on disk.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.store: Optional[SQLiteStore] = None
+
+    def connect(self):
+        if self.store is None:
+            self.store = SQLiteStore(self.path)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def _check(self, version: Optional[EmbeddingVersion]):
+        if version is not None and version.key != TOP_LEVEL_VERSION:
+            raise ValueError(f"The SQLite backend only stores embedding version {TOP_LEVEL_VERSION}")
+
+    @timed
+    async def ping(self):
+        self.connect()
+        await asyncio.to_thread(self.store.query, "SELECT 1")
+
+    @timed
+    async def get_products(
+        self,
+        category: Optional[str] = None,
+        limit: int = 20,
+        skip: int = 0,
+        require_embedding: bool = False,
+        include_embedding: bool = True
+    ) -> List[dict]:
+        self.connect()
+        return await asyncio.to_thread(self.store.find, category, limit, skip, require_embedding, include_embedding)
+
+    @timed
+    async def get_products_page(self, category: Optional[str], limit: int, after: Optional[str] = None) -> List[dict]:
+        self.connect()
+        return await asyncio.to_thread(self.store.page, category, limit, after)
+
+    async def iter_products(
+        self,
+        category: Optional[str] = None,
+        batch_size: int = 500,
+        version: Optional[EmbeddingVersion] = None
+    ) -> AsyncIterator[List[dict]]:
+        self._check(version)
+        self.connect()
+        after = None
+        # Keyset pages: each batch is one indexed range read, whatever the offset
+        while True:
+            batch = await asyncio.to_thread(self.store.page, category, batch_size, after, version is not None)
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1]["_id"]
+
+    @timed
+    async def get_product_by_id(self, product_id: str) -> Optional[dict]:
+        self.connect()
+        return await asyncio.to_thread(self.store.get, product_id)
+
+    @timed
+    async def get_all_embeddings(self, version: Optional[EmbeddingVersion] = None) -> List[dict]:
+        self._check(version)
+        self.connect()
+        return await asyncio.to_thread(self.store.embedded)
+
+    @timed
+    async def changed_since(self, watermark: datetime, limit: int, after: Optional[str] = None) -> List[dict]:
+        self.connect()
+        return await asyncio.to_thread(self.store.changed_since, watermark, limit, after)
+
+    @timed
+    async def embedded_ids(self, version: EmbeddingVersion) -> Set[str]:
+        self._check(version)
+        self.connect()
+        return await asyncio.to_thread(self.store.embedded_ids)
+
+    @timed
+    async def insert_products(self, docs: List[dict]) -> Dict[int, Tuple[bool, str]]:
+        self.connect()
+        return await asyncio.to_thread(self.store.insert, docs)
+
+    @timed
+    async def update_products(self, updates: List[Tuple[str, dict]]):
+        self.connect()
+        await asyncio.to_thread(self.store.update, updates)
+
+    async def get_active_version(self) -> EmbeddingVersion:
+        return DEFAULT_VERSION
+
+    async def write_versions(self) -> List[EmbeddingVersion]:
+        return [DEFAULT_VERSION]
+
+    async def coverage_report(self) -> dict:
+        self.connect()
+        counts = await asyncio.to_thread(self.store.counts)
+        dims = await asyncio.to_thread(self.store.embedding_dims)
+        total, embedded = counts["total"], counts["with_embeddings"]
+        version = DEFAULT_VERSION
+        return {
+            "active": version.key,
+            "total": total,
+            "versions": [{
+                "key": version.key,
+                "model": version.model,
+                "dimensions": version.dimensions,
+                "state": "active",
+                "embedded": embedded,
+                "coverage": round(embedded / total, 4) if total else 0.0,
+                "dims": dims,
+            }],
+        }
+
+    async def diagnostics(self) -> dict:
+        self.connect()
+        counts = await asyncio.to_thread(self.store.counts)
+        return {
+            "sqlite": self.path,
+            "counts": counts,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else None,
+        }
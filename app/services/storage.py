@@ -0,0 +1,15 @@
+from config import settings
+from app.services.storage_base import StorageBackend, apply_set
+
+BACKENDS = ("mongo", "sqlite")
+
+def create_backend(name: str) -> StorageBackend:
+    if name == "mongo":
+        from app.services.mongodb import MongoBackend
+        return MongoBackend()
+    if name == "sqlite":
+        from app.services.sqlite_store import SQLiteBackend
+        return SQLiteBackend(settings.sqlite_path)
+    raise ValueError(f"Unknown storage backend '{name}', expected one of {BACKENDS}")
+
+storage = create_backend(settings.storage_backend)
@@ -0,0 +1,166 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import wraps
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from app.services.embedding_versions import EmbeddingVersion
+from app.services.profiling import record_stage
+
+def timed(method):
+    """Record the latency of a backend call under its name, for /api/diagnostics and request stages"""
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.latency.record(method.__name__, elapsed)
+            record_stage(f"storage.{method.__name__}", elapsed)
+    return wrapper
+
+class LatencyStats:
+    """Call count, mean and max per storage operation"""
+
+    def __init__(self):
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.total: Dict[str, float] = defaultdict(float)
+        self.max: Dict[str, float] = defaultdict(float)
+
+    def record(self, op: str, seconds: float):
+        self.calls[op] += 1
+        self.total[op] += seconds
+        self.max[op] = max(self.max[op], seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            op: {
+                "calls": calls,
+                "mean_ms": round(self.total[op] / calls * 1000, 3),
+                "max_ms": round(self.max[op] * 1000, 3),
+            }
+            for op, calls in sorted(self.calls.items())
+        }
+
+class StorageBackend:
+    """
+    Everything the API reads from or writes to the product store. Products
+    are plain dicts with a string `_id`; vectors use the vector_codec shapes
+    (a list, or packed bytes tagged with embedding_dtype).
+
+    Implementations: MongoBackend (Motor, the default) and SQLiteBackend
+    (embedded, single node); app.services.storage picks one from
+    STORAGE_BACKEND.
+    """
+
+    name = "abstract"
+    # Whether the index refresher can tail a change stream instead of polling
+    supports_change_stream = False
+
+    def __init__(self):
+        self.latency = LatencyStats()
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def ping(self):
+        raise NotImplementedError
+
+    async def ensure_indexes(self) -> dict:
+        return {}
+
+    # Reads
+    async def get_products(
+        self,
+        category: Optional[str] = None,
+        limit: int = 20,
+        skip: int = 0,
+        require_embedding: bool = False,
+        include_embedding: bool = True
+    ) -> List[dict]:
+        raise NotImplementedError
+
+    async def get_products_page(self, category: Optional[str], limit: int, after: Optional[str] = None) -> List[dict]:
+        """
+        Browse page in id order, starting after product id `after` (keyset
+        paging: every page costs the same, unlike a growing skip). No vectors.
+        """
+        raise NotImplementedError
+
+    def iter_products(
+        self,
+        category: Optional[str] = None,
+        batch_size: int = 500,
+        version: Optional[EmbeddingVersion] = None
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Every product (optionally of one category) in batches of batch_size,
+        read incrementally so memory stays at one batch. With `version`, each
+        product carries that version's vector in the top-level fields (None
+        when it has none); without, no vectors are read.
+        """
+        raise NotImplementedError
+
+    async def get_product_by_id(self, product_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def get_all_embeddings(self, version: Optional[EmbeddingVersion] = None) -> List[dict]:
+        """Every product embedded with `version`, that version's vector in the top-level fields"""
+        raise NotImplementedError
+
+    async def changed_since(self, watermark: datetime, limit: int, after: Optional[str] = None) -> List[dict]:
+        """
+        Products with updated_at at or after watermark in (updated_at, _id)
+        order (polling refresh). Pass the last row's updated_at and _id as
+        watermark and `after` to read the next page: rows sharing a timestamp
+        are never skipped, however many there are.
+        """
+        raise NotImplementedError
+
+    async def embedded_ids(self, version: EmbeddingVersion) -> Set[str]:
+        raise NotImplementedError
+
+    # Writes
+    async def insert_products(self, docs: List[dict]) -> Dict[int, Tuple[bool, str]]:
+        """
+        Insert new products, assigning `_id` in place. Returns the rows that
+        failed as {position: (is_duplicate_url, message)}; the others are stored.
+        """
+        raise NotImplementedError
+
+    async def update_products(self, updates: List[Tuple[str, dict]]):
+        """Apply {field: value} sets (dotted paths allowed) to products by id"""
+        raise NotImplementedError
+
+    # Embedding versions
+    async def get_active_version(self) -> EmbeddingVersion:
+        raise NotImplementedError
+
+    async def write_versions(self) -> List[EmbeddingVersion]:
+        """Active version first, then the other versions new products are embedded with"""
+        raise NotImplementedError
+
+    async def coverage_report(self) -> dict:
+        raise NotImplementedError
+
+    async def diagnostics(self) -> dict:
+        """Connectivity and counts for /api/diagnostics"""
+        raise NotImplementedError
+
+def apply_set(doc: dict, fields: dict) -> dict:
+    """Apply dotted $set paths to a copy of doc, as MongoDB would"""
+    merged = dict(doc)
+    for path, value in fields.items():
+        head, _, rest = path.partition(".")
+        if not rest:
+            merged[head] = value
+            continue
+        target = merged[head] = dict(merged.get(head) or {})
+        *parents, leaf = rest.split(".")
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    return merged
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import os
+from io import BytesIO
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from config import settings
+from app.services.cache import DiskBudget, write_atomic
+from app.services.image_fetch import image_fetcher
+
+CLOUDINARY_UPLOAD = "/image/upload/"
+
+thumbnail_budget = DiskBudget(".webp")
+
+def cloudinary_thumbnail(url: str, width: int) -> Optional[str]:
+    """
+    The same Cloudinary asset resized on Cloudinary's CDN (never upscaled,
+    automatic quality and format), or None for other hosts.
+    """
+    parts = urlsplit(url)
+    if not parts.netloc.endswith("res.cloudinary.com") or CLOUDINARY_UPLOAD not in parts.path:
+        return None
+    head, _, tail = url.partition(CLOUDINARY_UPLOAD)
+    return f"{head}{CLOUDINARY_UPLOAD}c_limit,w_{width},q_auto,f_auto/{tail}"
+
+def thumbnail_urls(product_id: str, url: str) -> Dict[str, str]:
+    """
+    Thumbnail URL per width (as string keys, for srcset). Cloudinary images are
+    resized by Cloudinary; anything else goes through the API's resize cache.
+    """
+    if not url or not settings.thumbnail_widths:
+        return {}
+    thumbnails = {}
+    for width in settings.thumbnail_widths:
+        thumbnails[str(width)] = (
+            cloudinary_thumbnail(url, width)
+            or f"{settings.thumbnail_base_path}/products/{product_id}/thumbnail?w={width}"
+        )
+    return thumbnails
+
+def _cache_path(url: str, width: int) -> str:
+    # Keyed by the source URL, so a product whose image changes gets a new entry
+    digest = hashlib.sha256(url.encode()).hexdigest()[:32]
+    return os.path.join(settings.thumbnail_cache_dir, digest[:2], f"{digest}-{width}.webp")
+
+def _resize(data: bytes, width: int) -> bytes:
+    from app.services.uploads import open_image_guarded
+    img = open_image_guarded(BytesIO(data))
+    if img.format == "JPEG":
+        # Decode straight at a reduced scale; far cheaper than a full decode plus resize
+        img.draft("RGB", (width, width))
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "P") else "RGB")
+    # Width-bound; a tall image may use up to 4x its width in height
+    img.thumbnail((width, width * 4))
+    buffer = BytesIO()
+    img.save(buffer, format="WEBP", quality=settings.thumbnail_quality, method=4)
+    return buffer.getvalue()
+
+def _read_cached(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    # mtime marks recent use for LRU eviction
+    thumbnail_budget.touch(path)
+    return data
+
+def _store(path: str, thumbnail: bytes):
+    write_atomic(path, thumbnail)
+    thumbnail_budget.account(settings.thumbnail_cache_dir, settings.thumbnail_cache_max_bytes, len(thumbnail))
+
+async def local_thumbnail(url: str, width: int) -> bytes:
+    """
+    WEBP thumbnail of a non-Cloudinary image, generated once and kept on disk.
+    The source goes through the shared image fetcher (pooled, size-capped,
+    private hosts refused); disk access runs off the event loop.
+    """
+    path = _cache_path(url, width)
+    cached = await asyncio.to_thread(_read_cached, path)
+    if cached is not None:
+        return cached
+
+    data = await image_fetcher.download(url, settings.thumbnail_fetch_timeout)
+    thumbnail = await asyncio.to_thread(_resize, data, width)
+    await asyncio.to_thread(_store, path, thumbnail)
+    return thumbnail
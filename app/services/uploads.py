@@ -0,0 +1,76 @@
+from typing import BinaryIO, Optional, Tuple
+from fastapi import UploadFile
+from config import settings
+
+# (signature, offset, content type) sniffed from the first chunk of the upload
+MAGIC_SIGNATURES = [
+    (b"\xff\xd8\xff", 0, "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", 0, "image/png"),
+    (b"WEBP", 8, "image/webp"),
+]
+
+class UploadRejected(Exception):
+    """Upload failed validation; carries the HTTP status the route should answer with"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Identify the image format from magic bytes, ignoring filename and client content-type"""
+    for signature, offset, content_type in MAGIC_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if content_type == "image/webp" and head[:4] != b"RIFF":
+                continue
+            return content_type
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return None
+
+async def ingest_upload(file: UploadFile) -> Tuple[BinaryIO, str, int]:
+    """
+    Stream the upload in chunks, enforcing the size cap and sniffing the format
+    from the first chunk. Returns the rewound underlying file object (no extra
+    copy is made), the sniffed content type and the size in bytes.
+    """
+    max_bytes = settings.upload_max_bytes
+    chunk_size = settings.upload_chunk_size
+
+    await file.seek(0)
+    first = await file.read(chunk_size)
+    if not first:
+        raise UploadRejected(400, "Uploaded file is empty")
+
+    kind = sniff_image_type(first)
+    if kind == "image/avif":
+        raise UploadRejected(415, "AVIF images are not supported. Please upload PNG/JPG/JPEG/WEBP.")
+    if kind is None:
+        raise UploadRejected(415, "Unsupported or unrecognised image data. Please upload PNG/JPG/JPEG/WEBP.")
+
+    size = len(first)
+    while size <= max_bytes:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+    if size > max_bytes:
+        raise UploadRejected(413, f"Upload exceeds the {max_bytes / (1024 * 1024):.1f} MB limit")
+
+    await file.seek(0)
+    return file.file, kind, size
+
+def open_image_guarded(source):
+    """
+    Open an image lazily (header only) and refuse decompression bombs before
+    any pixel data is decoded. Returns a PIL Image.
+    """
+    from PIL import Image
+    img = Image.open(source)
+    width, height = img.size
+    if width * height > settings.upload_max_pixels:
+        raise UploadRejected(
+            413,
+            f"Image dimensions {width}x{height} exceed the {settings.upload_max_pixels} pixel limit"
+        )
+    return img
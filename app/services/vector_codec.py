@@ -0,0 +1,37 @@
+from typing import Optional
+import numpy as np
+from bson.binary import Binary
+
+# embedding_dtype values for Binary-packed vectors; explicit little-endian so
+# the stored bytes do not depend on the writer's platform
+DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+}
+
+STORAGE_FORMATS = ("array", *DTYPES)
+
+def encode_embedding(embedding, storage: str = "array") -> dict:
+    """
+    Fields to $set for a vector in the requested storage format: a BSON array
+    of doubles, or a packed Binary tagged with embedding_dtype.
+    """
+    if storage == "array":
+        values = embedding.tolist() if isinstance(embedding, np.ndarray) else list(embedding)
+        return {"embedding": values, "embedding_dtype": None, "embedding_dim": len(values)}
+    if storage not in DTYPES:
+        raise ValueError(f"Unknown embedding storage '{storage}', expected one of {STORAGE_FORMATS}")
+    packed = np.asarray(embedding, dtype=DTYPES[storage])
+    return {"embedding": Binary(packed.tobytes()), "embedding_dtype": storage, "embedding_dim": int(packed.shape[0])}
+
+def as_vector(value, dtype: Optional[str] = None) -> Optional[np.ndarray]:
+    """
+    Decode a stored embedding into a float32 vector. Packed bytes are read with
+    np.frombuffer (no per-float Python objects); arrays go through np.asarray.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        vector = np.frombuffer(value, dtype=DTYPES[dtype or "float32"])
+        return vector if vector.dtype == np.float32 else vector.astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
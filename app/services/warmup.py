@@ -0,0 +1,52 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+from config import settings
+from app.services.storage import storage
+from app.services.catalog_index import catalog_index
+from app.services.jina_embeddings import JinaHTTP
+
+async def _prime_db():
+    await storage.ping()
+
+async def _prime_index():
+    snapshot = await catalog_index.get_snapshot()
+    # First-touch the matrix and the BLAS path with a throwaway query
+    if len(snapshot):
+        await asyncio.to_thread(snapshot.search, [1.0] * snapshot.dim, top_k=1)
+    return len(snapshot)
+
+async def _prime_http():
+    # Any response will do: the point is the TLS handshake and a kept-alive connection
+    parts = urlsplit(settings.jina_endpoint)
+    await JinaHTTP.get_client().head(f"{parts.scheme}://{parts.netloc}/")
+
+def _import_upload_path():
+    from PIL import Image
+    Image.init()
+
+async def warm_up(include_upload_path: bool = False) -> dict:
+    """
+    Prime the DB pool, catalog index and Jina connection concurrently.
+    Each step is timed and failures are reported rather than raised.
+    """
+    steps = {
+        storage.name: _prime_db(),
+        "index": _prime_index(),
+        "jina_http": _prime_http(),
+    }
+    if include_upload_path:
+        steps["upload_path"] = asyncio.to_thread(_import_upload_path)
+
+    async def timed(name, coro):
+        start = time.perf_counter()
+        try:
+            result = await coro
+            return name, {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 1), "result": result}
+        except Exception as e:
+            return name, {"ok": False, "ms": round((time.perf_counter() - start) * 1000, 1), "error": f"{type(e).__name__}: {e}"}
+
+    results = dict(await asyncio.gather(*(timed(n, c) for n, c in steps.items())))
+    summary = ", ".join(f"{n}={r['ms']}ms{'' if r['ok'] else ' (failed)'}" for n, r in results.items())
+    print(f"[WARMUP] {summary}")
+    return results
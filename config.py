@@ -1,10 +1,14 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 class Settings(BaseSettings):
-    # MongoDB
-    mongo_uri: str
+    # Storage backend: "mongo" (Motor/Atlas) or "sqlite" (embedded file, single node)
+    storage_backend: str = "mongo"
+    sqlite_path: str = "data/catalog.sqlite3"
+    
+    # MongoDB (required with the mongo backend)
+    mongo_uri: str = ""
     mongo_db: str = "visual_product_matcher"
     mongo_col: str = "products"
     
@@ -12,6 +16,116 @@ class Settings(BaseSettings):
     jina_api_key: str = ""
     jina_endpoint: str = "https://api.jina.ai/v1/embeddings"
     
+    # Jina resilience (timeouts in seconds)
+    jina_timeout: float = 30.0
+    jina_deadline: float = 90.0
+    jina_max_retries: int = 2
+    jina_backoff_base: float = 0.25
+    jina_backoff_max: float = 4.0
+    jina_hedge_enabled: bool = True
+    jina_hedge_quantile: float = 0.95
+    jina_hedge_min_samples: int = 20
+    jina_breaker_threshold: int = 5
+    jina_breaker_reset: float = 30.0
+    jina_max_connections: int = 20
+    
+    # Upload ingestion
+    upload_max_bytes: int = 10 * 1024 * 1024
+    upload_chunk_size: int = 64 * 1024
+    upload_max_pixels: int = 40_000_000
+    
+    # URL searches: the API fetches the image itself (pooled, size/time capped), keeps it in a
+    # bounded on-disk cache revalidated with ETag/Last-Modified, and sends it to Jina downscaled
+    image_fetch_enabled: bool = True
+    image_fetch_timeout: float = 10.0
+    image_fetch_max_bytes: int = 10 * 1024 * 1024
+    image_fetch_max_connections: int = 20
+    image_fetch_cache_dir: str = "data/image_cache"
+    image_fetch_cache_max_bytes: int = 256 * 1024 * 1024
+    image_fetch_revalidate_after: float = 300.0
+    image_fetch_block_private: bool = True
+    # Query embeddings by image content hash, shared by every URL serving the same bytes
+    query_embedding_cache_max: int = 5000
+    query_embedding_cache_ttl: float = 24 * 3600.0
+    
+    # Vector storage for new writes: "array" (BSON doubles), "float32" or "float16" (packed Binary)
+    embedding_storage: str = "array"
+    
+    # In-memory catalog index (seconds before a full reload when not refreshed live)
+    index_max_age: float = 60.0
+    # Live refresh: "auto" (change stream, else polling), "change_stream", "poll" or "off".
+    # Run scripts/ensure_indexes.py first on older catalogs: products without embedding_dim are not indexed
+    index_refresh_mode: str = "auto"
+    index_poll_interval: float = 2.0
+    index_reconcile_every: int = 30
+    index_refresh_batch: int = 500
+    
+    # Bulk ingestion worker
+    ingest_batch_size: int = 32
+    ingest_requests_per_second: float = 1.0
+    ingest_outage_retries: int = 3
+    ingest_job_history: int = 200
+    
+    # Metadata filters: score everything and check candidates (post-filter) when at least
+    # this share of rows is estimated to match, otherwise score only matching rows
+    filter_postfilter_selectivity: float = 0.5
+    filter_sample_size: int = 1024
+    # Attribute columns kept per index snapshot (least recently filtered on are dropped)
+    filter_column_cache_max: int = 32
+    
+    # Exact scoring: catalogs of at least SEARCH_PARALLEL_MIN_ROWS candidate rows are scored in chunks
+    # on SEARCH_THREADS threads (0 = one per core, 1 = serial), with BLAS limited to one thread each
+    search_threads: int = 0
+    search_chunk_rows: int = 16384
+    search_parallel_min_rows: int = 50000
+    search_limit_blas_threads: bool = True
+    
+    # Search sessions: ranked candidates kept per search for paging/refinement (0 disables)
+    search_session_candidates: int = 500
+    search_session_ttl: float = 900.0
+    search_session_max: int = 2000
+    
+    # First pages of recent searches, keyed by query vector, parameters and index generation (0 disables);
+    # each hit opens a fresh search session over the cached candidates
+    result_cache_max: int = 2000
+    result_cache_ttl: float = 300.0
+    
+    # Perceptual hashes of catalog images: uploads within this many bits (of 64) of one
+    # reuse its stored vector instead of calling Jina (-1 disables)
+    image_hash_max_distance: int = 4
+    image_hash_on_ingest: bool = True
+    image_hash_fetch_timeout: float = 10.0
+    image_hash_fetch_concurrency: int = 8
+    
+    # Thumbnails: widths offered per product (srcset candidates). Cloudinary images are
+    # resized by Cloudinary; others are fetched like URL searches, resized once by the API
+    # and kept in a bounded on-disk cache (least recently served evicted first)
+    thumbnail_widths: List[int] = [160, 320, 640]
+    thumbnail_quality: int = 75
+    thumbnail_fetch_timeout: float = 10.0
+    thumbnail_cache_dir: str = "data/thumbnails"
+    thumbnail_cache_max_bytes: int = 128 * 1024 * 1024
+    thumbnail_max_age: int = 7 * 24 * 3600
+    # Prefix of the API's own thumbnail route in product JSON; clients resolve it against the API origin
+    thumbnail_base_path: str = "/api"
+    
+    # Embedding versions (blue/green model upgrades); the active one is chosen in this collection
+    embedding_versions_col: str = "embedding_versions"
+    embedding_version_check_interval: float = 10.0
+    
+    # Profiling: requests with PROFILING_TOKEN in an X-Profile header or `profile` query parameter
+    # run under a sampling profiler (empty token disables); the slowest requests are always kept
+    profiling_token: str = ""
+    profiling_interval_ms: float = 5.0
+    profiling_reports_max: int = 50
+    profiling_report_ttl: float = 3600.0
+    profiling_slowest: int = 20
+    profiling_slowest_window: float = 3600.0
+    
+    # Cold start
+    warmup_on_startup: bool = True
+    ensure_indexes_on_startup: bool = True
+    
     # App settings
     app_host: str = "127.0.0.1"
     app_port: int = 8000
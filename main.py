@@ -3,20 +3,45 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.api.product import router as product_router
-from app.services.mongodb import MongoDB
+from app.api.profiling import router as profiling_router
+from app.api.middleware import ProfilingMiddleware, UploadSizeLimitMiddleware
+from app.services.storage import storage
+from app.services.jina_embeddings import jina_caller, JinaHTTP, query_embedding_cache
+from app.services.image_fetch import image_fetcher, image_fetch_stats
+from app.services.warmup import warm_up
+from app.services.catalog_index import catalog_index
+from app.services.index_refresh import index_refresher
+from app.services.ingest import ingest_worker
+from app.services.filters import filter_stats
+from app.services.image_hash import image_hash_stats
+from app.services.result_cache import result_cache
+from app.services.parallel_scoring import scorer
 from config import settings
-from bson import ObjectId
-import asyncio
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    MongoDB.connect()
-    print("Connected to MongoDB Atlas")
+    storage.connect()
+    print(f"Connected to {storage.name} storage")
+    if settings.ensure_indexes_on_startup:
+        try:
+            await storage.ensure_indexes()
+        except Exception as e:
+            print(f"[INDEXES] Could not ensure indexes: {type(e).__name__}: {e}")
+    # Before any scoring: workers share the cores instead of each running a BLAS pool
+    scorer.limit_blas_threads()
+    if settings.warmup_on_startup:
+        await warm_up()
+    index_refresher.start()
+    ingest_worker.start()
     yield
     # Shutdown
-    MongoDB.close()
-    print("Closed MongoDB connection")
+    await ingest_worker.stop()
+    await index_refresher.stop()
+    await JinaHTTP.close()
+    await image_fetcher.close()
+    storage.close()
+    print(f"Closed {storage.name} storage")
 
 app = FastAPI(
     title="Visual Product Matcher API",
@@ -34,8 +59,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized uploads while the body is still streaming in
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.upload_max_bytes,
+    paths=("/api/search-upload",)
+)
+
+# Stage timings for every API request; sampling profiles on request (PROFILING_TOKEN)
+app.add_middleware(ProfilingMiddleware, token=settings.profiling_token)
+
 # Include routers
 app.include_router(product_router)
+app.include_router(profiling_router)
 
 @app.get("/")
 def read_root():
@@ -49,24 +85,42 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/warmup")
+async def warmup():
+    """Prime DB pool, catalog index, Jina connection and upload-path imports; safe for schedulers to ping"""
+    steps = await warm_up(include_upload_path=True)
+    return {"status": "ok" if all(s["ok"] for s in steps.values()) else "degraded", "steps": steps}
+
+@app.get("/api/embedding-versions")
+async def embedding_versions():
+    """Per-version embedding coverage, plus the version the in-memory index is serving"""
+    report = await storage.coverage_report()
+    report["serving"] = catalog_index.version.key
+    return report
+
 @app.get("/api/diagnostics")
 async def diagnostics():
     """Basic diagnostics for DB connectivity and collection stats"""
-    info = {"status": "ok"}
+    info = {"status": "ok", "storage": storage.name}
     try:
-        col = MongoDB.get_collection()
-        # server_info forces a round-trip
-        await col.database.client.server_info()
-        total = await col.count_documents({})
-        with_embeddings = await col.count_documents({"embedding": {"$exists": True, "$ne": None}})
-        sample = await col.find_one({}, projection={"_id": 1, "category": 1})
-        info.update({
-            "mongo": "connected",
-            "counts": {"total": int(total), "with_embeddings": int(with_embeddings)},
-            "sample": {"_id": str(sample["_id"]) if sample and "_id" in sample else None, "category": sample.get("category") if sample else None}
-        })
+        info.update(await storage.diagnostics())
+        # Stored and indexed side by side: a gap means the live index missed changes
+        # (search-excluded or wrong-dimension products account for a fixed difference)
+        counts = info["counts"]
+        counts["stored_with_embeddings"] = counts.pop("with_embeddings")
+        snapshot = catalog_index.snapshot
+        counts["indexed"] = len(snapshot) if snapshot is not None else None
     except Exception as e:
-        info.update({"mongo": "error", "error": str(e)})
+        info.update({storage.name: "error", "error": str(e)})
+    info["storage_latency"] = storage.latency.snapshot()
+    info["jina"] = jina_caller.snapshot()
+    info["index"] = index_refresher.snapshot()
+    info["filters"] = dict(filter_stats)
+    info["upload_hash_matches"] = dict(image_hash_stats)
+    info["image_fetch"] = dict(image_fetch_stats)
+    info["query_embedding_cache"] = query_embedding_cache.stats()
+    info["result_cache"] = result_cache.stats()
+    info["scoring"] = scorer.snapshot()
     return info
 
 if __name__ == "__main__":
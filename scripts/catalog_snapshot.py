@@ -0,0 +1,290 @@
+# scripts/catalog_snapshot.py
+"""
+Bulk export/import of the products collection, embeddings included.
+
+    python scripts/catalog_snapshot.py export catalog.parquet
+    python scripts/catalog_snapshot.py export catalog.arrow
+    python scripts/catalog_snapshot.py export catalog.npz
+    python scripts/catalog_snapshot.py import catalog.parquet [--mode upsert|insert] [--drop]
+
+Parquet/Arrow files hold one row per product: metadata columns, a dense
+fixed_size_list<float32>[dim] `embedding` column and a `has_embedding` flag
+(zeros + False for products without a vector of the catalog's dimension).
+They are written and read in record batches, so memory stays bounded by
+--batch. NPZ holds the same columns as plain arrays and is built in memory.
+Every other field (image_phash, vectors.<key>, search_excluded, filter
+attributes...) travels in an `attributes` column as MongoDB extended JSON.
+Parquet/Arrow need `pip install pyarrow`; the API itself does not.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient, InsertOne, UpdateOne
+from bson import ObjectId, json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.services.vector_codec import STORAGE_FORMATS, as_vector, encode_embedding
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "visual_product_matcher")
+MONGO_COL = os.getenv("MONGO_COL", "products")
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "array")
+
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+col = db[MONGO_COL]
+
+META_COLUMNS = ["_id", "name", "category", "url", "embedding_source", "embedding_dim"]
+
+# Written from the vector columns or stamped on import rather than kept as attributes
+VECTOR_FIELDS = ("embedding", "embedding_dtype")
+NOT_ATTRIBUTES = {*META_COLUMNS, *VECTOR_FIELDS, "updated_at"}
+
+def _attributes_json(doc: dict) -> str:
+    """Remaining fields as relaxed extended JSON, so Binary vectors and dates survive"""
+    rest = {k: v for k, v in doc.items() if k not in NOT_ATTRIBUTES}
+    return json_util.dumps(rest, json_options=json_util.RELAXED_JSON_OPTIONS)
+
+def _attributes(text) -> dict:
+    return json_util.loads(text) if text else {}
+
+def _format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        return "parquet"
+    if ext in (".arrow", ".feather", ".ipc"):
+        return "arrow"
+    if ext == ".npz":
+        return "npz"
+    raise SystemExit(f"Unknown snapshot format for '{path}' (use .parquet, .arrow or .npz)")
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise SystemExit("Parquet/Arrow snapshots need pyarrow: pip install pyarrow")
+
+def _iter_batches(batch: int):
+    """Yield (metadata rows, vectors) batches straight from a raw-BSON cursor"""
+    raw_col = col.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+    rows, vectors = [], []
+    for raw in raw_col.find({}, batch_size=batch):
+        doc = dict(raw.items())
+        rows.append({
+            "_id": str(doc["_id"]),
+            "name": doc.get("name"),
+            "category": doc.get("category"),
+            "url": doc.get("url"),
+            "embedding_source": doc.get("embedding_source"),
+            "embedding_dim": doc.get("embedding_dim"),
+            "attributes": _attributes_json(doc),
+        })
+        vectors.append(as_vector(doc.get("embedding"), doc.get("embedding_dtype")))
+        if len(rows) >= batch:
+            yield rows, vectors
+            rows, vectors = [], []
+    if rows:
+        yield rows, vectors
+
+def _detect_dim() -> int:
+    sample = col.find_one({"embedding_dim": {"$gt": 0}}, {"embedding_dim": 1})
+    return int(sample["embedding_dim"]) if sample else 0
+
+def _dense_block(vectors, dim: int):
+    """Stack vectors into a (n, dim) float32 block; returns (block, has_embedding, wrong-dim count)"""
+    block = np.zeros((len(vectors), dim), dtype=np.float32)
+    valid = np.zeros(len(vectors), dtype=bool)
+    wrong_dim = 0
+    for i, v in enumerate(vectors):
+        if v is not None and len(v) == dim and dim:
+            block[i] = v
+            valid[i] = True
+        elif v is not None:
+            wrong_dim += 1
+    return block, valid, wrong_dim
+
+# ---------------------------------------------------------------- export
+
+def export_arrow(path: str, fmt: str, batch: int):
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    dim = _detect_dim()
+    schema = pa.schema([
+        ("_id", pa.string()),
+        ("name", pa.string()),
+        ("category", pa.string()),
+        ("url", pa.string()),
+        ("embedding_source", pa.string()),
+        ("embedding_dim", pa.int32()),
+        ("attributes", pa.large_string()),
+        ("has_embedding", pa.bool_()),
+        ("embedding", pa.list_(pa.float32(), dim)),
+    ], metadata={b"embedding_dim": str(dim).encode()})
+
+    writer = pq.ParquetWriter(path, schema, compression="zstd") if fmt == "parquet" else pa.ipc.new_file(path, schema)
+    total = skipped = 0
+    try:
+        for rows, vectors in _iter_batches(batch):
+            columns = {name: [r[name] for r in rows] for name in [*META_COLUMNS, "attributes"]}
+            block, valid, bad = _dense_block(vectors, dim)
+            skipped += bad
+            # Dense rows instead of null slots: Parquet cannot write null fixed-size lists
+            embedding = pa.FixedSizeListArray.from_arrays(pa.array(block.ravel(), pa.float32()), dim)
+            table = pa.table({**columns, "has_embedding": valid, "embedding": embedding}, schema=schema)
+            writer.write_table(table)
+            total += len(rows)
+            print(f"  exported {total}")
+    finally:
+        writer.close()
+    return total, skipped
+
+def export_npz(path: str, batch: int):
+    dim = _detect_dim()
+    columns = {name: [] for name in META_COLUMNS}
+    # Attributes vary wildly in length: one byte blob plus offsets rather than a fixed-width string array
+    attributes, offsets = bytearray(), [0]
+    chunks, valid_chunks = [], []
+    total = skipped = 0
+    for rows, vectors in _iter_batches(batch):
+        for name in META_COLUMNS:
+            columns[name].extend(r[name] for r in rows)
+        for r in rows:
+            attributes += r["attributes"].encode()
+            offsets.append(len(attributes))
+        block, valid, bad = _dense_block(vectors, dim)
+        skipped += bad
+        chunks.append(block)
+        valid_chunks.append(valid)
+        total += len(rows)
+        print(f"  exported {total}")
+
+    np.savez(
+        path,
+        **{name: np.array(["" if x is None else str(x) for x in values]) for name, values in columns.items() if name != "embedding_dim"},
+        embedding_dim=np.array([x or 0 for x in columns["embedding_dim"]], dtype=np.int32),
+        attributes=np.frombuffer(bytes(attributes), dtype=np.uint8),
+        attributes_offsets=np.array(offsets, dtype=np.int64),
+        embedding=np.concatenate(chunks) if chunks else np.zeros((0, dim), dtype=np.float32),
+        has_embedding=np.concatenate(valid_chunks) if valid_chunks else np.zeros(0, dtype=bool),
+    )
+    return total, skipped
+
+# ---------------------------------------------------------------- import
+
+def _read_batches(path: str, fmt: str, batch: int):
+    """Yield lists of (metadata dict, vector or None)"""
+    if fmt == "npz":
+        data = np.load(path)
+        n = len(data["_id"])
+        # Snapshots written before attributes were exported lack these arrays
+        attributes = data["attributes"].tobytes() if "attributes" in data else None
+        offsets = data["attributes_offsets"] if attributes is not None else None
+        for start in range(0, n, batch):
+            end = min(n, start + batch)
+            out = []
+            for i in range(start, end):
+                meta = {name: (str(data[name][i]) or None) for name in META_COLUMNS if name != "embedding_dim"}
+                meta["embedding_dim"] = int(data["embedding_dim"][i]) or None
+                if attributes is not None:
+                    meta["attributes"] = attributes[offsets[i]:offsets[i + 1]].decode()
+                out.append((meta, data["embedding"][i] if data["has_embedding"][i] else None))
+            yield out
+        return
+
+    pa = _require_pyarrow()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch)
+    else:
+        reader = pa.ipc.open_file(path)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+    for record_batch in batches:
+        names = [*META_COLUMNS, "attributes"] if "attributes" in record_batch.schema.names else META_COLUMNS
+        metas = record_batch.select(names).to_pylist()
+        emb = record_batch.column("embedding")
+        dim = emb.type.list_size
+        matrix = emb.flatten().to_numpy(zero_copy_only=False).reshape(-1, dim) if dim else None
+        valid = record_batch.column("has_embedding").to_numpy(zero_copy_only=False)
+        yield [(m, matrix[i] if valid[i] else None) for i, m in enumerate(metas)]
+
+def import_snapshot(path: str, fmt: str, batch: int, mode: str, storage: str):
+    total = 0
+    for records in _read_batches(path, fmt, batch):
+        # Each batch gets its own stamp, like any other writer
+        now = datetime.now(timezone.utc)
+        ops = []
+        for meta, vector in records:
+            doc = _attributes(meta.get("attributes"))
+            doc.update({k: v for k, v in meta.items() if k not in ("_id", "attributes") and v is not None})
+            doc["_id"] = ObjectId(meta["_id"]) if ObjectId.is_valid(meta["_id"] or "") else meta["_id"]
+            doc["updated_at"] = now
+            if vector is not None:
+                doc.update(encode_embedding(vector, storage))
+            else:
+                # No vector of the snapshot's dimension: never mark the product as embedded
+                doc.pop("embedding_dim", None)
+            if mode == "insert":
+                ops.append(InsertOne({**doc, "embedding": doc.get("embedding")}))
+            else:
+                # $set keeps fields the snapshot does not carry, and an existing vector it has no value for
+                fields = {k: v for k, v in doc.items() if k != "_id"}
+                update = {"$set": fields}
+                if vector is None:
+                    update["$setOnInsert"] = {"embedding": None}
+                ops.append(UpdateOne({"_id": doc["_id"]}, update, upsert=True))
+        if ops:
+            col.bulk_write(ops, ordered=False)
+        total += len(ops)
+        print(f"  imported {total}")
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Export/import catalog snapshots (Parquet, Arrow IPC, NPZ)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="Stream the collection into a snapshot file")
+    exp.add_argument("path")
+    exp.add_argument("--batch", type=int, default=2000)
+
+    imp = sub.add_parser("import", help="Bulk-load a snapshot file into the collection")
+    imp.add_argument("path")
+    imp.add_argument("--batch", type=int, default=2000)
+    imp.add_argument("--mode", choices=["upsert", "insert"], default="upsert",
+                     help="insert is fastest on an empty collection; upsert updates by _id, keeping fields the snapshot lacks")
+    imp.add_argument("--drop", action="store_true", help="Delete all documents before importing")
+    imp.add_argument("--storage", choices=STORAGE_FORMATS, default=EMBEDDING_STORAGE)
+
+    args = parser.parse_args()
+    fmt = _format(args.path)
+    start = time.time()
+
+    if args.command == "export":
+        if fmt == "npz":
+            total, skipped = export_npz(args.path, args.batch)
+        else:
+            total, skipped = export_arrow(args.path, fmt, args.batch)
+        print("=" * 50)
+        print(f"Exported {total} products to {args.path} in {time.time() - start:.1f}s")
+        if skipped:
+            print(f"{skipped} vectors had a different dimension and were exported as null")
+    else:
+        if args.drop:
+            deleted = col.delete_many({}).deleted_count
+            print(f"Deleted {deleted} existing documents")
+        total = import_snapshot(args.path, fmt, args.batch, args.mode, args.storage)
+        print("=" * 50)
+        print(f"Imported {total} products from {args.path} in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,8 @@ col = db[os.getenv("MONGO_COL", "products")]
 
 sample = col.find_one({"embedding": {"$exists": True, "$ne": None}})
 if sample:
-    print(f"Database embedding dimensions: {len(sample['embedding'])}")
+    # Binary-packed vectors report their dimension in embedding_dim, not len()
+    dim = sample.get("embedding_dim") or len(sample["embedding"])
+    print(f"Database embedding dimensions: {dim} (storage: {sample.get('embedding_dtype') or 'array'})")
 else:
     print("No embeddings found")
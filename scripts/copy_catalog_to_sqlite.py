@@ -0,0 +1,65 @@
+# scripts/copy_catalog_to_sqlite.py
+"""
+Copy the MongoDB product catalog into an embedded SQLite store, for
+single-node deployments and network-free benchmarks:
+
+    python scripts/copy_catalog_to_sqlite.py --path data/catalog.sqlite3
+    STORAGE_BACKEND=sqlite SQLITE_PATH=data/catalog.sqlite3 uvicorn main:app
+
+Ids are kept, so links to /api/products/{id} stay valid. Vectors are stored
+as packed float32 blobs (float16 ones stay float16). Only the top-level
+embedding version is copied; the SQLite backend does not keep others.
+"""
+import argparse
+import os
+import sys
+import time
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.services.sqlite_store import SQLiteStore
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "visual_product_matcher")
+MONGO_COL = os.getenv("MONGO_COL", "products")
+
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+col = db[MONGO_COL]
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy MongoDB products into a SQLite store")
+    parser.add_argument("--path", default=os.getenv("SQLITE_PATH", "data/catalog.sqlite3"))
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--replace", action="store_true", help="Empty the SQLite store first")
+    args = parser.parse_args()
+
+    start = time.time()
+    store = SQLiteStore(args.path)
+    if args.replace:
+        store.query("DELETE FROM products")
+
+    copied = 0
+    batch = []
+    for doc in col.find({}, {"vectors": 0}, batch_size=args.batch):
+        batch.append(doc)
+        if len(batch) >= args.batch:
+            store.upsert(batch)
+            copied += len(batch)
+            batch = []
+            print(f"  {copied} products copied")
+    if batch:
+        store.upsert(batch)
+        copied += len(batch)
+
+    counts = store.counts()
+    store.close()
+    print("=" * 50)
+    print(f"Copied {copied} products to {args.path} in {time.time() - start:.1f}s "
+          f"({counts['with_embeddings']} with embeddings, {counts['total']} total)")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
 import os
+import sys
 import time
+from datetime import datetime, timezone
+from io import BytesIO
 from dotenv import load_dotenv
 from pymongo import MongoClient
 import httpx
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.services.vector_codec import encode_embedding
+from app.services.image_hash import IMAGE_HASH_FIELD, hash_hex, hash_image
+
 # Load environment variables
 load_dotenv()
 
@@ -12,6 +19,7 @@ MONGO_DB = os.getenv("MONGO_DB", "visual_product_matcher")
 MONGO_COL = os.getenv("MONGO_COL", "products")
 JINA_API_KEY = os.getenv("JINA_API_KEY", "")
 JINA_ENDPOINT = "https://api.jina.ai/v1/embeddings"
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "array")
 
 client = MongoClient(MONGO_URI)
 db = client[MONGO_DB]
@@ -55,6 +63,19 @@ def get_embedding(image_url):
         print(f"Error: {e}")
         return None
 
+def get_image_hash(image_url):
+    """
+    Perceptual hash of the image, so uploads of it can skip Jina later
+    """
+    try:
+        with httpx.Client(timeout=30.0, follow_redirects=True) as http_client:
+            response = http_client.get(image_url)
+        response.raise_for_status()
+        return hash_hex(hash_image(BytesIO(response.content)))
+    except Exception as e:
+        print(f"  Image hash failed: {e}")
+        return None
+
 def main():
     # Find all products without embeddings
     to_embed = list(col.find({"embedding": None}))
@@ -83,15 +104,16 @@ def main():
         embedding = get_embedding(url)
         
         if embedding:
+            fields = {
+                **encode_embedding(embedding, EMBEDDING_STORAGE),
+                "embedding_source": "jina-clip-v2",
+                "updated_at": datetime.now(timezone.utc)
+            }
+            image_hash = get_image_hash(url)
+            if image_hash:
+                fields[IMAGE_HASH_FIELD] = image_hash
             # Update MongoDB with the embedding
-            col.update_one(
-                {"_id": prod["_id"]}, 
-                {"$set": {
-                    "embedding": embedding,
-                    "embedding_source": "jina-clip-v2",
-                    "embedding_dim": len(embedding)
-                }}
-            )
+            col.update_one({"_id": prod["_id"]}, {"$set": fields})
             success_count += 1
             print(f"  ✓ Success (dim: {len(embedding)})\n")
         else:
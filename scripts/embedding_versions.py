@@ -0,0 +1,253 @@
+# scripts/embedding_versions.py
+"""
+Blue/green embedding model upgrades.
+
+    python scripts/embedding_versions.py coverage
+    python scripts/embedding_versions.py register v2 --model jina-clip-v2 --dimensions 512
+    python scripts/embedding_versions.py backfill v2 --batch 16
+    python scripts/embedding_versions.py activate v2 --min-coverage 0.99
+    python scripts/embedding_versions.py rollback
+    python scripts/embedding_versions.py retire v1x
+
+v1 is the original model in the top-level embedding fields; other versions are
+stored under vectors.<key>. While a version is "building" or "ready", the API
+embeds new products with it too, so backfill coverage does not erode. `activate`
+flips one control document; each API process then builds the new index in the
+background while the old one keeps serving, and swaps vectors and query model
+together. The previous version stays dual-written, so rollback is instant.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.services.embedding_versions import (
+    ACTIVE_POINTER_ID,
+    DEFAULT_VERSION,
+    TOP_LEVEL_VERSION,
+    EmbeddingVersion,
+)
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "visual_product_matcher")
+MONGO_COL = os.getenv("MONGO_COL", "products")
+VERSIONS_COL = os.getenv("EMBEDDING_VERSIONS_COL", "embedding_versions")
+JINA_API_KEY = os.getenv("JINA_API_KEY", "")
+JINA_ENDPOINT = os.getenv("JINA_ENDPOINT", "https://api.jina.ai/v1/embeddings")
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "array")
+
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+col = db[MONGO_COL]
+versions_col = db[VERSIONS_COL]
+
+headers = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {JINA_API_KEY}"
+}
+
+def load_version(key: str) -> EmbeddingVersion:
+    doc = versions_col.find_one({"_id": key})
+    if doc:
+        return EmbeddingVersion.from_doc(doc)
+    if key == TOP_LEVEL_VERSION:
+        return DEFAULT_VERSION
+    raise SystemExit(f"Unknown version '{key}'; register it first")
+
+def active_key() -> str:
+    pointer = versions_col.find_one({"_id": ACTIVE_POINTER_ID})
+    return pointer["version"] if pointer else TOP_LEVEL_VERSION
+
+def all_versions() -> list:
+    versions = {d["_id"]: EmbeddingVersion.from_doc(d) for d in versions_col.find({"_id": {"$ne": ACTIVE_POINTER_ID}})}
+    versions.setdefault(TOP_LEVEL_VERSION, DEFAULT_VERSION)
+    return sorted(versions.values(), key=lambda v: v.key)
+
+def coverage(version: EmbeddingVersion) -> float:
+    total = col.count_documents({"url": {"$exists": True}})
+    return col.count_documents(version.embedded_filter()) / total if total else 0.0
+
+def cmd_coverage(args):
+    total = col.count_documents({})
+    active = active_key()
+    print(f"{total} products, active version: {active}\n")
+    print(f"{'version':<10} {'model':<22} {'dims':>6} {'state':<9} {'embedded':>9} {'coverage':>9}  found dims")
+    for version in all_versions():
+        embedded = col.count_documents(version.embedded_filter())
+        dims = sorted(col.distinct(version.field("embedding_dim"), version.embedded_filter()))
+        state = "active" if version.key == active else version.state
+        print(f"{version.key:<10} {version.model:<22} {version.dimensions or '-':>6} {state:<9} "
+              f"{embedded:>9} {embedded / total if total else 0:>8.1%}  {dims}")
+
+def cmd_register(args):
+    if args.key == TOP_LEVEL_VERSION:
+        raise SystemExit(f"'{TOP_LEVEL_VERSION}' is the built-in version of the top-level fields")
+    version = EmbeddingVersion(args.key, args.model, args.dimensions, state="building")
+    result = versions_col.update_one(
+        {"_id": version.key},
+        {"$setOnInsert": {**version.to_doc(), "created_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    if result.upserted_id is None:
+        raise SystemExit(f"Version '{args.key}' already exists")
+    print(f"Registered {version}; new products are now embedded with it as well")
+
+def embed_batch(version: EmbeddingVersion, urls: list, http_client: httpx.Client) -> list:
+    """Multi-input Jina call aligned with urls; None for failures"""
+    try:
+        response = http_client.post(JINA_ENDPOINT, json=version.payload([{"image": u} for u in urls]), headers=headers)
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        if len(urls) == 1:
+            print(f"  HTTP {e.response.status_code} for {urls[0]}: {e.response.text[:200]}")
+            return [None]
+        # One bad image fails the whole batch; retry item by item
+        return [embed_batch(version, [u], http_client)[0] for u in urls]
+    except httpx.HTTPError as e:
+        print(f"  Request failed: {type(e).__name__}: {e}")
+        return [None] * len(urls)
+    embeddings = [None] * len(urls)
+    for position, item in enumerate(response.json().get("data") or []):
+        embeddings[item.get("index", position)] = item.get("embedding")
+    return embeddings
+
+def cmd_backfill(args):
+    version = load_version(args.key)
+    missing = {version.field("embedding_dim"): {"$not": {"$gt": 0}}, "url": {"$exists": True, "$ne": None}}
+    total = col.count_documents(missing)
+    if args.limit:
+        total = min(total, args.limit)
+    print(f"{total} products missing {version}")
+
+    done = failed = 0
+    last_id = None
+    # Backfill writes leave updated_at alone: the serving index does not change
+    with httpx.Client(timeout=60.0) as http_client:
+        while done + failed < total:
+            query = missing if last_id is None else {**missing, "_id": {"$gt": last_id}}
+            batch = list(col.find(query, {"url": 1}).sort("_id", 1).limit(min(args.batch, total - done - failed)))
+            if not batch:
+                break
+            # Walk forward by _id so failures are not picked up again in this run
+            last_id = batch[-1]["_id"]
+            embeddings = embed_batch(version, [d["url"] for d in batch], http_client)
+            ops = [
+                UpdateOne({"_id": doc["_id"]}, {"$set": version.encode(embedding, args.storage)})
+                for doc, embedding in zip(batch, embeddings) if embedding
+            ]
+            if ops:
+                col.bulk_write(ops, ordered=False)
+            done += len(ops)
+            failed += len(batch) - len(ops)
+            print(f"  {done}/{total} embedded, {failed} failed")
+            time.sleep(1 / args.rps)
+
+    share = coverage(version)
+    print("=" * 50)
+    print(f"Backfill of {version.key}: {done} embedded, {failed} failed, coverage {share:.1%}")
+    if version.key != TOP_LEVEL_VERSION and share >= args.ready_at and version.state == "building":
+        versions_col.update_one({"_id": version.key}, {"$set": {"state": "ready"}})
+        print(f"{version.key} is ready for activation")
+
+def activate(key: str, min_coverage: float, force: bool = False):
+    version = load_version(key)
+    current = active_key()
+    if key == current:
+        print(f"{key} is already active")
+        return
+    share = coverage(version)
+    if share < min_coverage and not force:
+        raise SystemExit(f"{key} covers {share:.1%} of products (< {min_coverage:.1%}); backfill first or pass --force")
+
+    now = datetime.now(timezone.utc)
+    # v1 gets a registry entry on its first cutover, so its state can be tracked too
+    previous = load_version(current)
+    versions_col.update_one(
+        {"_id": key},
+        {"$set": {"state": "active", "activated_at": now},
+         "$setOnInsert": {"model": version.model, "dimensions": version.dimensions}},
+        upsert=True
+    )
+    # Keep dual-writing the old version so a rollback needs no backfill
+    versions_col.update_one(
+        {"_id": current},
+        {"$set": {"state": "ready"},
+         "$setOnInsert": {"model": previous.model, "dimensions": previous.dimensions}},
+        upsert=True
+    )
+    # The single write API processes watch for
+    versions_col.update_one(
+        {"_id": ACTIVE_POINTER_ID},
+        {"$set": {"version": key, "previous": current, "switched_at": now}},
+        upsert=True
+    )
+    print(f"Active version {current} -> {key} (coverage {share:.1%}); API processes swap within "
+          f"EMBEDDING_VERSION_CHECK_INTERVAL once the new index is built")
+
+def cmd_activate(args):
+    activate(args.key, args.min_coverage, args.force)
+
+def cmd_rollback(args):
+    pointer = versions_col.find_one({"_id": ACTIVE_POINTER_ID})
+    if not pointer or not pointer.get("previous"):
+        raise SystemExit("No previous version to roll back to")
+    activate(pointer["previous"], 0.0, force=True)
+
+def cmd_retire(args):
+    if args.key == TOP_LEVEL_VERSION:
+        raise SystemExit(f"'{TOP_LEVEL_VERSION}' lives in the top-level fields and cannot be retired")
+    if args.key == active_key():
+        raise SystemExit(f"{args.key} is active; activate another version first")
+    version = load_version(args.key)
+    result = col.update_many({f"vectors.{version.key}": {"$exists": True}}, {"$unset": {f"vectors.{version.key}": ""}})
+    versions_col.update_one({"_id": version.key}, {"$set": {"state": "retired"}})
+    print(f"Retired {version.key}: removed vectors from {result.modified_count} products")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage embedding model versions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("coverage", help="Per-version coverage report")
+
+    reg = sub.add_parser("register", help="Add a new version (starts dual-writing)")
+    reg.add_argument("key")
+    reg.add_argument("--model", default="jina-clip-v2")
+    reg.add_argument("--dimensions", type=int, default=None, help="Truncated output dimensions, if supported")
+
+    back = sub.add_parser("backfill", help="Embed products that lack the version")
+    back.add_argument("key")
+    back.add_argument("--batch", type=int, default=16)
+    back.add_argument("--rps", type=float, default=1.0, help="Jina requests per second")
+    back.add_argument("--limit", type=int, default=None)
+    back.add_argument("--storage", default=EMBEDDING_STORAGE, choices=["array", "float32", "float16"])
+    back.add_argument("--ready-at", type=float, default=0.99, help="Coverage at which the version is marked ready")
+
+    act = sub.add_parser("activate", help="Atomically switch search to the version")
+    act.add_argument("key")
+    act.add_argument("--min-coverage", type=float, default=0.99)
+    act.add_argument("--force", action="store_true")
+
+    sub.add_parser("rollback", help="Switch back to the previously active version")
+
+    ret = sub.add_parser("retire", help="Stop dual-writing a version and delete its vectors")
+    ret.add_argument("key")
+
+    args = parser.parse_args()
+    {
+        "coverage": cmd_coverage,
+        "register": cmd_register,
+        "backfill": cmd_backfill,
+        "activate": cmd_activate,
+        "rollback": cmd_rollback,
+        "retire": cmd_retire,
+    }[args.command](args)
+
+if __name__ == "__main__":
+    main()
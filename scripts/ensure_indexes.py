@@ -0,0 +1,79 @@
+# scripts/ensure_indexes.py
+import os
+import sys
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.services.indexes import EMBEDDED_FILTER, ensure_indexes_sync
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "visual_product_matcher")
+MONGO_COL = os.getenv("MONGO_COL", "products")
+
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+col = db[MONGO_COL]
+
+def report_duplicate_urls():
+    """The unique url index cannot be built while duplicates exist; list them"""
+    pipeline = [
+        {"$group": {"_id": "$url", "count": {"$sum": 1}, "ids": {"$push": "$_id"}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    dups = list(col.aggregate(pipeline, allowDiskUse=True))
+    for dup in dups:
+        print(f"  duplicate url ({dup['count']}x): {dup['_id']}")
+        print(f"    ids: {', '.join(str(i) for i in dup['ids'])}")
+    return len(dups)
+
+def plan_stages(explain: dict) -> str:
+    """Winning plan as e.g. FETCH <- IXSCAN(embedded_dim)"""
+    stages = []
+    plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    while plan:
+        # Newer servers wrap the classic plan in queryPlan
+        plan = plan.get("queryPlan", plan)
+        stage = plan.get("stage", "?")
+        stages.append(f"{stage}({plan['indexName']})" if "indexName" in plan else stage)
+        plan = plan.get("inputStage")
+    return " <- ".join(stages)
+
+def report_plans():
+    """The plans of the embedded-product queries, to confirm they use embedded_dim"""
+    full_load = col.find(EMBEDDED_FILTER, {"vectors": 0}).explain()
+    print(f"  full index load: {plan_stages(full_load)}")
+    count = db.command("explain", {"count": MONGO_COL, "query": EMBEDDED_FILTER}, verbosity="queryPlanner")
+    print(f"  embedded count:  {plan_stages(count)}")
+
+def main():
+    report = ensure_indexes_sync(col)
+    print(f"Backfilled embedding_dim on {report['backfilled_embedding_dim']} documents")
+    for name in report["created"]:
+        print(f"✓ {name}")
+    for name, error in report["failed"].items():
+        print(f"✗ {name}: {error}")
+    for name in report["dropped"]:
+        print(f"- dropped obsolete {name}")
+
+    if "url_unique" in report["failed"]:
+        print("\nDuplicate URLs blocking the unique index:")
+        if report_duplicate_urls() == 0:
+            print("  none found")
+
+    print("\nCurrent indexes:")
+    for index in col.list_indexes():
+        extra = ""
+        if index.get("unique"):
+            extra += " unique"
+        if index.get("partialFilterExpression"):
+            extra += f" partial={index['partialFilterExpression']}"
+        print(f"  {index['name']}: {dict(index['key'])}{extra}")
+
+    print("\nQuery plans:")
+    report_plans()
+
+if __name__ == "__main__":
+    main()
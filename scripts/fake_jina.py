@@ -0,0 +1,89 @@
+# scripts/fake_jina.py
+"""
+Local stand-in for the Jina embeddings API, for load tests.
+
+    python scripts/fake_jina.py --port 8100 --latency-ms 120 --p99-ms 800 --error-rate 0.02
+
+Point the API at it with JINA_ENDPOINT=http://127.0.0.1:8100/v1/embeddings.
+Latency is log-normal (median --latency-ms, 99th percentile --p99-ms) and a
+--error-rate share of requests fail with a status drawn from --error-status.
+Vectors are deterministic: every input string (URL or base64 image) seeds its
+own unit vector, so a catalog seeded with fake_vector(url) finds itself.
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# z-score of the 99th percentile of a standard normal
+Z_P99 = 2.326
+
+def fake_vector(text: str, dim: int = 768) -> np.ndarray:
+    """Deterministic unit vector for an input string"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def create_app(
+    dim: int = 768,
+    latency_ms: float = 100.0,
+    p99_ms: float = 400.0,
+    error_rate: float = 0.0,
+    error_status: tuple = (503,)
+) -> FastAPI:
+    app = FastAPI(title="Fake Jina embeddings")
+    sigma = math.log(max(p99_ms, latency_ms) / latency_ms) / Z_P99 if latency_ms > 0 else 0.0
+    stats = {"requests": 0, "errors": 0, "inputs": 0}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if latency_ms > 0:
+            await asyncio.sleep(random.lognormvariate(math.log(latency_ms), sigma) / 1000)
+        if error_rate and random.random() < error_rate:
+            stats["errors"] += 1
+            status = random.choice(error_status)
+            return JSONResponse({"detail": f"fake error {status}"}, status_code=status)
+
+        inputs = body.get("input") or []
+        stats["inputs"] += len(inputs)
+        data = []
+        for index, item in enumerate(inputs):
+            text = (item.get("image") or item.get("text") or "") if isinstance(item, dict) else str(item)
+            data.append({"object": "embedding", "index": index, "embedding": fake_vector(text, dim).tolist()})
+        return {"model": body.get("model"), "object": "list", "data": data, "usage": {"total_tokens": len(inputs)}}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Jina embeddings server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Median response latency")
+    parser.add_argument("--p99-ms", type=float, default=400.0, help="99th percentile response latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail (0-1)")
+    parser.add_argument("--error-status", default="503", help="Comma-separated statuses to fail with, e.g. 429,503")
+    args = parser.parse_args()
+
+    app = create_app(
+        dim=args.dim,
+        latency_ms=args.latency_ms,
+        p99_ms=args.p99_ms,
+        error_rate=args.error_rate,
+        error_status=tuple(int(s) for s in args.error_status.split(",")),
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# scripts/find_duplicates.py
+"""
+Find near-duplicate catalog images (the same product re-uploaded under
+another name or URL) by an all-pairs cosine similarity join over the stored
+embeddings of the active version:
+
+    python scripts/find_duplicates.py --threshold 0.97 --output duplicates.json
+    python scripts/find_duplicates.py --threshold 0.97 --mark-excluded
+
+The join is exact: the normalized float32 matrix is multiplied tile by tile
+(--block rows x --block columns, upper triangle only), tiles run on --workers
+threads, and only pairs at or above --threshold are kept. Memory stays at the
+matrix plus one block x block tile per worker, whatever the catalog size.
+
+Pairs are merged into clusters (single linkage: A~B and B~C put A, B and C
+together). Each cluster keeps its oldest product; with --mark-excluded the
+others get `search_excluded` and `duplicate_of` set, which drops them from
+the search index but not from browsing. Marks mirror the latest run: products
+marked earlier that are no longer duplicates are unmarked.
+
+Works against whichever STORAGE_BACKEND the API is configured with.
+"""
+import os
+
+# The join parallelises over tiles itself; one BLAS thread per tile avoids oversubscription
+for var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(var, "1")
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+load_dotenv()
+
+from app.services.storage import storage
+from app.services.catalog_index import SEARCH_EXCLUDED_FIELD
+from app.services.embedding_versions import EmbeddingVersion
+from app.services.similarity import normalize_rows
+from app.services.vector_codec import as_vector
+
+def load_matrix(docs: List[dict]) -> Tuple[List[dict], np.ndarray]:
+    """Products with a vector of the catalog's (most common) dimension, and their normalized rows"""
+    vectors = [(d, as_vector(d.get("embedding"), d.get("embedding_dtype"))) for d in docs]
+    vectors = [(d, v) for d, v in vectors if v is not None and len(v)]
+    if not vectors:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    dim, _ = Counter(len(v) for _, v in vectors).most_common(1)[0]
+    kept = [(d, v) for d, v in vectors if len(v) == dim]
+    matrix = normalize_rows(np.stack([v for _, v in kept]).astype(np.float32, copy=False))
+    return [d for d, _ in kept], matrix
+
+def tile_pairs(matrix: np.ndarray, i0: int, j0: int, block: int, threshold: float):
+    """Pairs (i, j, score) with i < j inside one tile that reach the threshold"""
+    rows = matrix[i0:i0 + block]
+    scores = rows @ matrix[j0:j0 + block].T
+    if i0 == j0:
+        # Diagonal tile: the pair (i, j) and (j, i) are the same; i == j is the product itself
+        scores = np.triu(scores, k=1)
+    i, j = np.nonzero(scores >= threshold)
+    return i + i0, j + j0, scores[i, j]
+
+def similarity_join(matrix: np.ndarray, threshold: float, block: int, workers: int):
+    """All pairs i < j with cosine similarity >= threshold, as three arrays"""
+    n = len(matrix)
+    tiles = [(i0, j0) for i0 in range(0, n, block) for j0 in range(i0, n, block)]
+    found_i, found_j, found_s = [], [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # numpy releases the GIL inside matmul, so tiles really run in parallel
+        for done, (i, j, s) in enumerate(pool.map(lambda t: tile_pairs(matrix, t[0], t[1], block, threshold), tiles), 1):
+            found_i.append(i)
+            found_j.append(j)
+            found_s.append(s)
+            if done % 100 == 0 or done == len(tiles):
+                print(f"  {done}/{len(tiles)} tiles")
+    if not tiles:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    return np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_s)
+
+def clusters_from_pairs(n: int, left: np.ndarray, right: np.ndarray) -> List[List[int]]:
+    """Connected components of the pair graph (union-find), each sorted, singletons left out"""
+    parent = list(range(n))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(left.tolist(), right.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    groups: Dict[int, List[int]] = {}
+    for row in set(left.tolist()) | set(right.tolist()):
+        groups.setdefault(find(row), []).append(row)
+    return sorted((sorted(rows) for rows in groups.values()), key=lambda rows: rows[0])
+
+def describe(products: List[dict], matrix: np.ndarray, rows: List[int]) -> dict:
+    # Oldest first: ObjectId strings sort by creation time
+    rows = sorted(rows, key=lambda r: str(products[r]["_id"]))
+    keep, rest = rows[0], rows[1:]
+    scores = matrix[rest] @ matrix[keep]
+
+    def entry(row: int) -> dict:
+        doc = products[row]
+        return {"_id": str(doc["_id"]), "name": doc.get("name"), "category": doc.get("category"), "url": doc.get("url")}
+
+    return {
+        "keep": entry(keep),
+        "duplicates": [{**entry(row), "similarity": round(float(score), 4)} for row, score in zip(rest, scores)],
+    }
+
+async def mark_excluded(products: List[dict], clusters: List[dict]) -> Tuple[int, int]:
+    """Flag every non-kept duplicate and unflag earlier marks that no longer apply"""
+    now = datetime.now(timezone.utc)
+    duplicate_of = {d["_id"]: c["keep"]["_id"] for c in clusters for d in c["duplicates"]}
+    updates = []
+    for doc in products:
+        pid = str(doc["_id"])
+        if pid in duplicate_of:
+            if not doc.get(SEARCH_EXCLUDED_FIELD) or doc.get("duplicate_of") != duplicate_of[pid]:
+                updates.append((pid, {SEARCH_EXCLUDED_FIELD: True, "duplicate_of": duplicate_of[pid], "updated_at": now}))
+        elif doc.get(SEARCH_EXCLUDED_FIELD):
+            updates.append((pid, {SEARCH_EXCLUDED_FIELD: False, "duplicate_of": None, "updated_at": now}))
+    # updated_at moves so polling index refreshers pick the change up too
+    for start in range(0, len(updates), 500):
+        await storage.update_products(updates[start:start + 500])
+    marked = sum(1 for _, fields in updates if fields[SEARCH_EXCLUDED_FIELD])
+    return marked, len(updates) - marked
+
+async def run(args):
+    storage.connect()
+    try:
+        version = EmbeddingVersion(args.version) if args.version else await storage.get_active_version()
+        start = time.time()
+        docs = await storage.get_all_embeddings(version)
+        products, matrix = load_matrix(docs)
+        print(f"Loaded {len(products)} embedded products (version {version.key}, dim {matrix.shape[1] if len(products) else 0}) in {time.time() - start:.1f}s")
+
+        start = time.time()
+        left, right, _ = similarity_join(matrix, args.threshold, args.block, args.workers)
+        print(f"Found {len(left)} pairs >= {args.threshold} in {time.time() - start:.1f}s with {args.workers} workers")
+
+        clusters = [describe(products, matrix, rows) for rows in clusters_from_pairs(len(products), left, right)]
+        redundant = sum(len(c["duplicates"]) for c in clusters)
+        for cluster in clusters[:args.show]:
+            keep = cluster["keep"]
+            print(f"  {keep['_id']} {keep['name']!r}")
+            for dup in cluster["duplicates"]:
+                print(f"    ~ {dup['_id']} {dup['name']!r} ({dup['similarity']:.3f})")
+        if len(clusters) > args.show:
+            print(f"  ... {len(clusters) - args.show} more clusters")
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"version": version.key, "threshold": args.threshold, "clusters": clusters}, f, indent=2)
+            print(f"Wrote {len(clusters)} clusters to {args.output}")
+
+        if args.mark_excluded:
+            marked, unmarked = await mark_excluded(products, clusters)
+            print(f"Marked {marked} products excluded from search, unmarked {unmarked}")
+
+        print("=" * 50)
+        print(f"{len(clusters)} duplicate clusters, {redundant} redundant products of {len(products)}")
+    finally:
+        storage.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate catalog images by embedding similarity")
+    parser.add_argument("--threshold", type=float, default=0.97, help="Cosine similarity for a duplicate pair")
+    parser.add_argument("--block", type=int, default=2048, help="Tile size in rows; memory per worker is block^2 floats")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--version", default=None, help="Embedding version key (default: the active one)")
+    parser.add_argument("--output", default=None, help="Write the clusters to this JSON file")
+    parser.add_argument("--show", type=int, default=20, help="Clusters to print")
+    parser.add_argument("--mark-excluded", action="store_true", help="Exclude all but the oldest product of each cluster from search")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
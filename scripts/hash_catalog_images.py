@@ -0,0 +1,79 @@
+# scripts/hash_catalog_images.py
+"""
+Store a perceptual hash (pHash) of every catalog image, so uploads of an
+image that is already in the catalog reuse its stored vector instead of
+calling Jina.
+
+    python scripts/hash_catalog_images.py            # products without a hash
+    python scripts/hash_catalog_images.py --all      # recompute everything
+
+New products get their hash from the ingest worker; this backfills the rest.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.services.image_hash import IMAGE_HASH_FIELD, hash_hex, hash_image
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "visual_product_matcher")
+MONGO_COL = os.getenv("MONGO_COL", "products")
+
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+col = db[MONGO_COL]
+
+def hash_url(http_client: httpx.Client, url: str):
+    """Hex pHash of the image at url, or None if it cannot be fetched or decoded"""
+    try:
+        response = http_client.get(url)
+        response.raise_for_status()
+        return hash_hex(hash_image(BytesIO(response.content)))
+    except Exception as e:
+        print(f"  ✗ {url}: {type(e).__name__}: {e}")
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill perceptual hashes of catalog images")
+    parser.add_argument("--all", action="store_true", help="Recompute hashes that already exist")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent image downloads")
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+
+    query = {"url": {"$exists": True, "$ne": None}}
+    if not args.all:
+        query[IMAGE_HASH_FIELD] = {"$exists": False}
+    products = list(col.find(query, {"url": 1}))
+    total = len(products)
+    print(f"Hashing {total} product images with {args.workers} workers")
+
+    done = failed = 0
+    with httpx.Client(timeout=30.0, follow_redirects=True) as http_client, ThreadPoolExecutor(args.workers) as pool:
+        for start in range(0, total, args.batch):
+            batch = products[start:start + args.batch]
+            hashes = list(pool.map(lambda doc: hash_url(http_client, doc["url"]), batch))
+            # Hashes describe the image, not the vectors: updated_at is left alone
+            ops = [
+                UpdateOne({"_id": doc["_id"]}, {"$set": {IMAGE_HASH_FIELD: value}})
+                for doc, value in zip(batch, hashes) if value
+            ]
+            if ops:
+                col.bulk_write(ops, ordered=False)
+            done += len(ops)
+            failed += len(batch) - len(ops)
+            print(f"  {done + failed}/{total} processed, {failed} failed")
+
+    print("=" * 50)
+    print(f"Hashed {done} images, {failed} failed")
+    print("API processes tailing a change stream pick the hashes up live; polling ones on their next full index load")
+
+if __name__ == "__main__":
+    main()
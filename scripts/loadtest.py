@@ -0,0 +1,196 @@
+# scripts/loadtest.py
+"""
+Open-loop asyncio load generator for the API.
+
+    python scripts/loadtest.py --rps 50 --duration 60
+    python scripts/loadtest.py --rps 10,20,40,80,160 --duration 30 --slo-p95-ms 1000
+
+Requests start on a fixed (or --poisson) schedule regardless of how fast the
+server answers, so an overloaded server shows up as rising latency and errors
+rather than as a politely slower client. --rps takes a comma-separated list of
+steps; the run stops at the first step that breaks --slo-p95-ms or
+--max-error-rate, which is the service's practical capacity.
+
+The mix defaults to search=6,products=3,upload=1. Search queries use catalog
+URLs of the loadtest_server synthetic products (--products must not exceed
+what was seeded), so every query exercises the full ranking path.
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+from collections import Counter, defaultdict
+import httpx
+import numpy as np
+
+from loadtest_server import CATEGORIES, product_url
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"search", "upload", "products"}
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+def make_upload_images(count: int = 8, size: int = 640) -> list:
+    """A few random JPEGs, so uploads are not byte-identical"""
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.dropped = 0
+
+    def record(self, endpoint: str, status: str, seconds: float):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+
+    def report(self, elapsed: float) -> dict:
+        rows = {}
+        for endpoint in sorted(self.latencies):
+            ms = np.array(self.latencies[endpoint]) * 1000
+            statuses = self.statuses[endpoint]
+            ok = statuses.get("200", 0)
+            total = sum(statuses.values())
+            rows[endpoint] = {
+                "requests": total,
+                "throughput_rps": round(total / elapsed, 2),
+                "error_rate": round(1 - ok / total, 4) if total else 0.0,
+                "p50_ms": round(float(np.percentile(ms, 50)), 1),
+                "p90_ms": round(float(np.percentile(ms, 90)), 1),
+                "p95_ms": round(float(np.percentile(ms, 95)), 1),
+                "p99_ms": round(float(np.percentile(ms, 99)), 1),
+                "max_ms": round(float(ms.max()), 1),
+                "statuses": dict(statuses),
+            }
+        all_ms = np.concatenate([np.array(v) for v in self.latencies.values()]) * 1000 if self.latencies else np.zeros(1)
+        total = sum(r["requests"] for r in rows.values())
+        errors = sum(r["requests"] - r["statuses"].get("200", 0) for r in rows.values())
+        rows["all"] = {
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2),
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "p50_ms": round(float(np.percentile(all_ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(all_ms, 95)), 1),
+            "p99_ms": round(float(np.percentile(all_ms, 99)), 1),
+            "dropped": self.dropped,
+        }
+        return rows
+
+async def run_step(client: httpx.AsyncClient, args, rps: float, mix: dict, images: list) -> dict:
+    recorder = Recorder()
+    names, weights = list(mix), list(mix.values())
+    in_flight = set()
+
+    async def one(endpoint: str):
+        start = time.perf_counter()
+        try:
+            if endpoint == "search":
+                body = {"image_url": product_url(random.randrange(args.products)), "top_k": args.top_k}
+                if random.random() < args.category_share:
+                    body["category"] = random.choice(CATEGORIES)
+                response = await client.post("/api/search", json=body)
+            elif endpoint == "upload":
+                files = {"file": ("query.jpg", random.choice(images), "image/jpeg")}
+                response = await client.post("/api/search-upload", files=files, params={"top_k": args.top_k})
+            else:
+                params = {"limit": 20, "skip": random.randrange(max(1, args.products - 20))}
+                response = await client.get("/api/products", params=params)
+            status = str(response.status_code)
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        recorder.record(endpoint, status, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    next_at = start
+    while next_at - start < args.duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= args.max_in_flight:
+            # The client is saturated; count it instead of queueing silently
+            recorder.dropped += 1
+        else:
+            task = asyncio.create_task(one(random.choices(names, weights)[0]))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_at += random.expovariate(rps) if args.poisson else 1 / rps
+
+    if in_flight:
+        await asyncio.wait(in_flight)
+    return recorder.report(time.perf_counter() - start)
+
+def print_step(rps: float, report: dict):
+    print(f"\n=== target {rps:g} rps ===")
+    print(f"{'endpoint':<10} {'reqs':>6} {'rps':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, row in report.items():
+        print(f"{endpoint:<10} {row['requests']:>6} {row['throughput_rps']:>7.1f} {row['error_rate'] * 100:>5.1f}% "
+              f"{row['p50_ms']:>7.0f}ms {row['p95_ms']:>6.0f}ms {row['p99_ms']:>6.0f}ms")
+        if endpoint != "all" and set(row["statuses"]) - {"200"}:
+            print(f"{'':<10} statuses: {row['statuses']}")
+    if report["all"]["dropped"]:
+        print(f"dropped at the client (max in-flight reached): {report['all']['dropped']}")
+
+async def run(args):
+    mix = parse_mix(args.mix)
+    images = make_upload_images() if "upload" in mix else []
+    steps = [float(x) for x in args.rps.split(",")]
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    results = []
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for rps in steps:
+            report = await run_step(client, args, rps, mix, images)
+            print_step(rps, report)
+            results.append({"target_rps": rps, "endpoints": report})
+            overall = report["all"]
+            if overall["p95_ms"] > args.slo_p95_ms or overall["error_rate"] > args.max_error_rate:
+                print(f"\nStopping: p95 {overall['p95_ms']:.0f}ms / error rate {overall['error_rate']:.1%} "
+                      f"breaks the SLO (p95 <= {args.slo_p95_ms:g}ms, errors <= {args.max_error_rate:.1%})")
+                break
+
+    passing = [r["target_rps"] for r in results
+               if r["endpoints"]["all"]["p95_ms"] <= args.slo_p95_ms
+               and r["endpoints"]["all"]["error_rate"] <= args.max_error_rate]
+    print("=" * 50)
+    print(f"Highest step within SLO: {max(passing):g} rps" if passing else "No step met the SLO")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /api/search, /api/search-upload and /api/products")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", default="20", help="Target rate, or comma-separated steps (e.g. 10,20,40)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per step")
+    parser.add_argument("--mix", default="search=6,products=3,upload=1")
+    parser.add_argument("--products", type=int, default=5000, help="Synthetic catalog size seeded on the server")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--category-share", type=float, default=0.2, help="Share of searches with a category filter")
+    parser.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of a fixed interval")
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--slo-p95-ms", type=float, default=1000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--json", default=None, help="Write per-step results to this file")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
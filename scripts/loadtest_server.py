@@ -0,0 +1,130 @@
+# scripts/loadtest_server.py
+"""
+Run the API against local stand-ins so it can be load-tested without Atlas
+or api.jina.ai:
+
+    python scripts/fake_jina.py --port 8100 --latency-ms 120 --p99-ms 800 &
+    python scripts/loadtest_server.py --products 20000 --port 8000
+    python scripts/loadtest.py --base-url http://127.0.0.1:8000 --rps 50 --duration 60
+
+By default MongoDB is replaced in-process by mongomock-motor
+(`pip install mongomock-motor`) seeded with --products synthetic products whose
+vectors match what fake_jina returns for their URLs. Pass --mongo-uri to use a
+real mongod instead (e.g. `docker run -p 27017:27017 mongo:7`); it is seeded
+the same way unless --no-seed is given. --backend sqlite serves from an
+embedded SQLite file instead, to compare DB-layer latency (reported under
+storage_latency in /api/diagnostics) with no network round-trips at all.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from fake_jina import fake_vector
+
+CATEGORIES = ["shoes", "bags", "watches", "shirts", "jackets", "hats", "sunglasses", "jewelry"]
+
+def product_url(i: int) -> str:
+    return f"https://loadtest.invalid/products/{i}.jpg"
+
+def synthetic_products(count: int, dim: int, storage: str) -> list:
+    from app.services.vector_codec import encode_embedding
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for i in range(count):
+        url = product_url(i)
+        docs.append({
+            "name": f"Load test product {i}",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "url": url,
+            **encode_embedding(fake_vector(url, dim), storage),
+            "embedding_source": "fake-jina",
+            "updated_at": now,
+        })
+    return docs
+
+def use_mongomock():
+    """Route the app's Motor client to one shared in-memory mongomock-motor client"""
+    try:
+        from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockCollection
+    except ImportError:
+        raise SystemExit("The in-memory Mongo stand-in needs mongomock-motor: pip install mongomock-motor")
+
+    # mongomock refuses RawBSONDocument codecs (and mongomock-motor would hand
+    # back a sync collection); plain dicts read the same way via .items()
+    AsyncMongoMockCollection.with_options = lambda self, **kwargs: self
+
+    import app.services.mongodb as mongodb
+    shared = AsyncMongoMockClient()
+    shared.close = lambda: None
+    mongodb.AsyncIOMotorClient = lambda *args, **kwargs: shared
+    return shared
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API against fake Jina and a local Mongo")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Only with --mongo-uri; mongomock is per process")
+    parser.add_argument("--jina-endpoint", default="http://127.0.0.1:8100/v1/embeddings")
+    parser.add_argument("--backend", default="mongo", choices=["mongo", "sqlite"])
+    parser.add_argument("--sqlite-path", default="data/loadtest.sqlite3")
+    parser.add_argument("--mongo-uri", default=None, help="Use a real mongod instead of mongomock-motor")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--storage", default="array", choices=["array", "float32", "float16"])
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    # Settings are read at import time, so configure the environment first
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["SQLITE_PATH"] = args.sqlite_path
+    os.environ["MONGO_URI"] = args.mongo_uri or "mongodb://mongomock.invalid"
+    os.environ["MONGO_DB"] = os.environ.get("LOADTEST_DB", "loadtest")
+    os.environ["JINA_ENDPOINT"] = args.jina_endpoint
+    os.environ["JINA_API_KEY"] = "loadtest"
+    # fake_jina embeds by URL and the synthetic product URLs do not resolve
+    os.environ["IMAGE_FETCH_ENABLED"] = "false"
+    os.environ["EMBEDDING_STORAGE"] = args.storage
+    os.environ["DEBUG"] = "false"
+    if not args.mongo_uri:
+        # mongomock has no change streams
+        os.environ["INDEX_REFRESH_MODE"] = "poll"
+
+    import asyncio
+    import uvicorn
+    from app.services.mongodb import MongoDB
+
+    if args.backend == "sqlite":
+        if not args.no_seed:
+            from app.services.sqlite_store import SQLiteStore
+            store = SQLiteStore(args.sqlite_path)
+            store.query("DELETE FROM products")
+            docs = synthetic_products(args.products, args.dim, args.storage)
+            store.insert(docs)
+            store.close()
+            print(f"[LOADTEST] Seeded {len(docs)} products into {args.sqlite_path} (dim {args.dim})")
+    elif not args.mongo_uri:
+        use_mongomock()
+        if args.workers != 1:
+            raise SystemExit("--workers needs --mongo-uri: each process would get its own in-memory catalog")
+
+    if not args.no_seed and args.backend == "mongo":
+        async def seed():
+            col = MongoDB.get_collection()
+            await col.delete_many({})
+            docs = synthetic_products(args.products, args.dim, args.storage)
+            for start in range(0, len(docs), 1000):
+                await col.insert_many(docs[start:start + 1000])
+            print(f"[LOADTEST] Seeded {len(docs)} products (dim {args.dim}, {args.storage})")
+        asyncio.run(seed())
+
+    from main import app
+    if args.workers > 1:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# scripts/migrate_vectors_binary.py
+"""
+Convert stored embeddings between BSON arrays of doubles and packed Binary.
+
+    python scripts/migrate_vectors_binary.py --to float32
+    python scripts/migrate_vectors_binary.py --to float16
+    python scripts/migrate_vectors_binary.py --to array      # revert
+
+Vectors are read as RawBSONDocument and decoded with np.frombuffer, so the
+conversion itself never materialises per-float Python objects for Binary input.
+"""
+import argparse
+import os
+import sys
+import time
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.services.vector_codec import STORAGE_FORMATS, as_vector, encode_embedding
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "visual_product_matcher")
+MONGO_COL = os.getenv("MONGO_COL", "products")
+
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+col = db[MONGO_COL]
+
+def needs_conversion_filter(target: str) -> dict:
+    if target == "array":
+        return {"embedding": {"$type": "binData"}}
+    return {
+        "embedding": {"$ne": None},
+        "$or": [{"embedding": {"$type": "array"}}, {"embedding_dtype": {"$ne": target}}],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate embedding storage format")
+    parser.add_argument("--to", dest="target", choices=STORAGE_FORMATS, required=True)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    query = needs_conversion_filter(args.target)
+    total = col.count_documents(query)
+    print(f"{total} documents to convert to '{args.target}'")
+    if total == 0 or args.dry_run:
+        return
+
+    raw_col = col.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+    cursor = raw_col.find(query, {"embedding": 1, "embedding_dtype": 1}, batch_size=args.batch)
+
+    start = time.time()
+    bytes_before = bytes_after = converted = 0
+    ops = []
+    for raw in cursor:
+        vector = as_vector(raw["embedding"], raw.get("embedding_dtype"))
+        if vector is None or not len(vector):
+            continue
+        fields = encode_embedding(vector, args.target)
+        bytes_before += len(raw.raw)
+        bytes_after += len(raw.raw) - _embedding_size(raw["embedding"]) + _embedding_size(fields["embedding"])
+        ops.append(UpdateOne({"_id": raw["_id"]}, {"$set": fields}))
+        if len(ops) >= args.batch:
+            converted += col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+            print(f"  converted {converted}/{total}")
+    if ops:
+        converted += col.bulk_write(ops, ordered=False).modified_count
+
+    print("=" * 50)
+    print(f"Converted {converted} documents in {time.time() - start:.1f}s")
+    if bytes_before:
+        print(f"Approx. document bytes: {bytes_before / 1024:.0f} KB -> {bytes_after / 1024:.0f} KB "
+              f"({bytes_after / bytes_before:.0%})")
+
+def _embedding_size(value) -> int:
+    """Approximate BSON size of the embedding value"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value) + 5
+    # array element: type byte + index key + NUL + 8-byte double
+    return sum(1 + len(str(i)) + 1 + 8 for i in range(len(value))) + 5
+
+if __name__ == "__main__":
+    main()
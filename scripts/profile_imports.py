@@ -0,0 +1,70 @@
+# scripts/profile_imports.py
+"""
+Import-time profile of the FastAPI entrypoint.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and reports
+the slowest top-level imports by cumulative time, plus any module that should
+only load lazily on the upload path. Use --budget-ms to fail CI on regressions.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+# Modules that must not be imported at startup (they load on first upload)
+LAZY_MODULES = ["PIL"]
+
+def profile(entry: str):
+    env = dict(os.environ)
+    env.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        raise SystemExit(f"Importing {entry} failed")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        # Nesting is encoded as two spaces per level after the leading space
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import-time cost of the app entrypoint")
+    parser.add_argument("--entry", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if total import time exceeds this")
+    args = parser.parse_args()
+
+    rows = profile(args.entry)
+    entry_row = next((r for r in rows if r[0] == args.entry), None)
+    total_ms = entry_row[2] / 1000 if entry_row else sum(r[1] for r in rows) / 1000
+
+    print(f"Total import time for '{args.entry}': {total_ms:.1f} ms ({len(rows)} modules)\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    top_level = sorted((r for r in rows if r[3] <= 1), key=lambda r: r[2], reverse=True)
+    for name, self_us, cumulative_us, _ in top_level[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    eager = sorted({r[0].split(".")[0] for r in rows if r[0].split(".")[0] in LAZY_MODULES})
+    print()
+    if eager:
+        print(f"WARNING: lazy-only modules imported at startup: {', '.join(eager)}")
+    else:
+        print(f"OK: lazy-only modules not imported at startup ({', '.join(LAZY_MODULES)})")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        raise SystemExit(f"Import time {total_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+    if eager:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
  
 import os
 import json
+from datetime import datetime, timezone
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 from pymongo import MongoClient
@@ -48,7 +49,8 @@ def main():
             "name": name,
             "category": category,
             "url": url,
-            "embedding": None   
+            "embedding": None,
+            "updated_at": datetime.now(timezone.utc)
         }
 
        
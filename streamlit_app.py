@@ -1,18 +1,12 @@
 import streamlit as st
-import requests
-import base64
-from io import BytesIO
-import os
-import requests
-import streamlit as st
+import api_client as api
+from api_client import API_BASE, BackendError
+from html import escape
 
-# API Base URL (configurable)
-# Prefer Streamlit secrets, then environment variable, then default to deployed /api base
-API_BASE = (
-    st.secrets.get("API_BASE")
-    if hasattr(st, "secrets") and "API_BASE" in st.secrets
-    else os.getenv("API_BASE", "https://visualise-product-matcher-jina-ai.vercel.app/api")
-).rstrip("/")
+BROWSE_PAGE_SIZE = 40
+# Rendered width of one card: Streamlit stacks columns on narrow screens
+BROWSE_IMAGE_SIZES = "(max-width: 640px) 100vw, 18vw"  # 5 columns
+RESULT_IMAGE_SIZES = "(max-width: 640px) 100vw, 30vw"  # 3 columns
 
 # Page config
 st.set_page_config(
@@ -44,6 +38,8 @@ st.markdown("""
     .product-card img.product-image {
         width: 100%;
         height: auto;
+        aspect-ratio: 1 / 1; /* reserve space while lazy images load */
+        background: #f1f5f9;
         display: block;
         object-fit: cover;
     }
@@ -67,111 +63,150 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# API functions
-@st.cache_data(ttl=300)
+# API functions (pooled and cached in api_client; errors are shown here, never cached)
 def get_categories():
     try:
-        response = requests.get(f"{API_BASE}/categories", timeout=5)
-        if response.status_code == 200:
-            return response.json().get("categories", [])
+        return api.get_categories()
+    except BackendError as e:
+        if e.status:
+            st.error(f"Categories fetch failed: {e.status} {e.detail}")
         else:
-            try:
-                detail = response.json().get('detail')
-            except Exception:
-                detail = response.text
-            st.error(f"Categories fetch failed: {response.status_code} {detail}")
-            return []
-    except Exception as e:
-        st.error(f"Cannot reach backend at {API_BASE}. Error: {e}")
+            st.error(f"Cannot reach backend at {API_BASE}. Error: {e.detail}")
         return []
 
-def get_products(category=None, limit=20, skip=0):
+def get_products_page(category=None, limit=BROWSE_PAGE_SIZE, cursor=None):
     try:
-        params = {"limit": limit, "skip": skip}
-        if category:
-            params["category"] = category
-        response = requests.get(f"{API_BASE}/products", params=params, timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            try:
-                detail = response.json().get('detail')
-            except Exception:
-                detail = response.text
-            st.warning(f"Products fetch failed: {response.status_code} {detail}")
-            return []
-    except Exception as e:
-        st.warning(f"Products fetch error: {e}")
-        return []
+        return api.get_products_page(category, limit, cursor)
+    except BackendError as e:
+        st.warning(f"Products fetch failed: {e}")
+        return {"products": [], "next_cursor": None}
+
+def product_image(product, sizes):
+    """
+    Card image: the browser picks the smallest thumbnail that fills the column
+    (srcset/sizes) and only loads it once it is near the viewport.
+    """
+    thumbnails = product.get("thumbnails") or {}
+    src = thumbnails.get(min(thumbnails, key=int, default=""), product['url'])
+    srcset = ", ".join(f"{escape(url)} {width}w" for width, url in thumbnails.items())
+    responsive = f' srcset="{srcset}" sizes="{sizes}"' if srcset else ""
+    return (
+        f'<img src="{escape(src)}"{responsive} alt="{escape(product["name"])}" '
+        'class="product-image" loading="lazy" decoding="async" />'
+    )
 
 def search_similar_url(image_url, top_k=10, min_similarity=0.25, category=None):
     try:
-        payload = {
-            "image_url": image_url,
-            "top_k": top_k,
-            "min_similarity": min_similarity
-        }
-        if category:
-            payload["category"] = category
-        response = requests.post(f"{API_BASE}/search", json=payload, timeout=30)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            try:
-                detail = response.json().get('detail')
-            except Exception:
-                detail = response.text
-            st.error(f"Search failed: {response.status_code} {detail}")
-            return None
-    except Exception as e:
-        st.error(f"Search failed: {str(e)}")
+        return api.search_url(image_url, top_k, min_similarity, category)
+    except BackendError as e:
+        st.error(f"Search failed: {e}")
         return None
 
 def search_similar_upload(image_file, top_k=10, min_similarity=0.25, category=None):
+    # Ensure we're at the start and read bytes
     try:
-        # Ensure we're at the start and read bytes
-        try:
-            image_file.seek(0)
-        except Exception:
-            pass
-        file_bytes = image_file.getvalue() if hasattr(image_file, "getvalue") else image_file.read()
-        filename = getattr(image_file, "name", "upload.jpg")
-        content_type = getattr(image_file, "type", None) or "application/octet-stream"
+        image_file.seek(0)
+    except Exception:
+        pass
+    file_bytes = image_file.getvalue() if hasattr(image_file, "getvalue") else image_file.read()
+    filename = getattr(image_file, "name", "upload.jpg")
+    content_type = getattr(image_file, "type", None) or "application/octet-stream"
+    try:
+        # The same file with the same settings is answered from the cache
+        return api.search_upload(api.upload_digest(file_bytes), file_bytes, filename, content_type, top_k, min_similarity, category)
+    except BackendError as e:
+        st.error(f"Upload search failed: {e}")
+        return None
 
-        files = {
-            "file": (filename, file_bytes, content_type)
-        }
-        params = {
-            "top_k": top_k,
-            "min_similarity": min_similarity
-        }
-        if category:
-            params["category"] = category
-        response = requests.post(
-            f"{API_BASE}/search-upload",
-            files=files,
-            params=params,
-            timeout=30
-        )
-        if response.status_code == 200:
-            return response.json()
-        else:
-            try:
-                detail = response.json().get('detail')
-            except Exception:
-                detail = response.text
-            st.error(f"Upload search failed: {response.status_code} {detail}")
-            return None
-    except Exception as e:
-        st.error(f"Upload search failed: {str(e)}")
+def refine_session(token, top_k=10, min_similarity=0.25, category=None, offset=0):
+    """Page or re-threshold an earlier search; None when the session is gone or the call failed"""
+    try:
+        return api.refine_session(token, top_k, min_similarity, category, offset)
+    except BackendError as e:
+        if e.status != 404:
+            st.warning(f"Could not refine the last search ({e}); run the search again")
+        return None
+
+def remember_search(key, query, category, results):
+    """Keep the session token so slider changes and paging reuse the ranked candidates"""
+    if results and results.get("session_token"):
+        st.session_state[key] = {"query": query, "category": category, "token": results["session_token"]}
+    else:
+        st.session_state.pop(key, None)
+
+def refined_results(key, query, top_k, min_similarity, category):
+    """Results for the current sidebar settings from the stored session, if it still matches"""
+    saved = st.session_state.get(key)
+    if not saved or saved["query"] != query or saved["category"] != category:
         return None
+    page = st.session_state.get(f"{key}_page", 0)
+    results = refine_session(saved["token"], top_k, min_similarity, category, page * top_k)
+    if results is None:
+        st.session_state.pop(key, None)
+    elif (results.get("total_matches") or 0) > (page + 1) * top_k:
+        # The next page is the likely next click
+        api.prefetch(api.refine_session, saved["token"], top_k, min_similarity, category, (page + 1) * top_k)
+    return results
+
+def render_results(results, key, top_k):
+    st.success(f"Found {results.get('total_matches') or results['total_results']} similar products!")
+    
+    st.markdown("---")
+    st.subheader("Search Results")
+    
+    cols = st.columns(3)
+    for idx, result in enumerate(results['results']):
+        product = result['product']
+        score = result['similarity_score']
+
+        if score >= 0.8:
+            badge_class = "high-similarity"
+        elif score >= 0.5:
+            badge_class = "med-similarity"
+        else:
+            badge_class = "low-similarity"
+
+        with cols[idx % 3]:
+            st.markdown(f"""
+            <div class="product-card">
+                {product_image(product, RESULT_IMAGE_SIZES)}
+                <div class="product-content">
+                    <h4 class="product-title">{product['name']}</h4>
+                    <p><strong>Category:</strong> {product['category'].title()}</p>
+                    <span class="similarity-badge {badge_class}">{score:.1%} Match</span>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+
+    # Paging is served from the search session, without a new search
+    total = results.get("total_matches") or 0
+    if results.get("session_token") and total > top_k:
+        pages = (total + top_k - 1) // top_k
+        st.number_input(
+            f"Page (of {pages})",
+            min_value=1,
+            max_value=pages,
+            value=min(st.session_state.get(f"{key}_page", 0) + 1, pages),
+            key=f"{key}_page_input",
+            on_change=lambda: st.session_state.update({f"{key}_page": st.session_state[f"{key}_page_input"] - 1})
+        )
 
 # Main App
 st.markdown('<h1 class="main-header">Visual Product Matcher</h1>', unsafe_allow_html=True)
 st.markdown("**Find visually similar products using AI-powered image embeddings**")
 
+# Categories and the browse grid do not depend on each other: fetch both at once.
+# The category picked on the previous run is the one the sidebar will show.
+previous_category = st.session_state.get("category_select", "All")
+browse_category = None if previous_category == "All" else previous_category
+categories, browse_first_page = api.run_concurrently(
+    (api.get_categories,),
+    (api.get_products_page, browse_category, BROWSE_PAGE_SIZE, None)
+)
+if isinstance(categories, Exception):
+    categories = get_categories()
+
 # Check backend
-categories = get_categories()
 if not categories:
     st.warning(
         "Cannot connect to backend. Verify your API is reachable at: "
@@ -187,7 +222,8 @@ selected_category = st.sidebar.selectbox(
     "Filter by Category",
     options=["All"] + categories,
     index=0,
-    format_func=lambda x: x.capitalize() if x != "All" else "All Categories"
+    format_func=lambda x: x.capitalize() if x != "All" else "All Categories",
+    key="category_select"
 )
 category_filter = None if selected_category == "All" else selected_category
 
@@ -226,7 +262,10 @@ with tab1:
         with col_info:
             st.info(f"**File:** {uploaded_file.name}\n\n**Size:** {uploaded_file.size / 1024:.1f} KB\n\n**Type:** {uploaded_file.type}")
             
-            if st.button("Find Similar Products", type="primary", key="upload_search"):
+            upload_query = api.upload_digest(uploaded_file.getvalue())
+            searched = st.button("Find Similar Products", type="primary", key="upload_search")
+            if searched:
+                st.session_state["upload_session_page"] = 0
                 with st.spinner("Processing image and searching..."):
                     # Reset file pointer to beginning
                     uploaded_file.seek(0)
@@ -238,45 +277,22 @@ with tab1:
                         min_similarity,
                         category_filter
                     )
-                    
-                    if results and results.get('results'):
-                        st.success(f"Found {results['total_results']} similar products!")
-                        
-                        st.markdown("---")
-                        st.subheader("Search Results")
-                        
-                        cols = st.columns(3)
-                        for idx, result in enumerate(results['results']):
-                            product = result['product']
-                            score = result['similarity_score']
-
-                            if score >= 0.8:
-                                badge_class = "high-similarity"
-                            elif score >= 0.5:
-                                badge_class = "med-similarity"
-                            else:
-                                badge_class = "low-similarity"
-
-                            with cols[idx % 3]:
-                                st.markdown(f"""
-                                <div class="product-card">
-                                    <img src="{product['url']}" alt="{product['name']}" class="product-image" />
-                                    <div class="product-content">
-                                        <h4 class="product-title">{product['name']}</h4>
-                                        <p><strong>Category:</strong> {product['category'].title()}</p>
-                                        <span class="similarity-badge {badge_class}">{score:.1%} Match</span>
-                                    </div>
-                                </div>
-                                """, unsafe_allow_html=True)
-                    elif results is not None:
-                        st.warning(
-                            "No similar products found. Try:\n"
-                            "- Lowering the similarity threshold\n"
-                            "- Uploading a different image\n"
-                            "- Checking if the image category matches your filter"
-                        )
-                    else:
-                        st.error("Search failed. If you uploaded an AVIF image, please convert it to PNG/JPG/WEBP and try again.")
+                    remember_search("upload_session", upload_query, category_filter, results)
+            else:
+                # Slider changes and paging after a search reuse its session
+                results = refined_results("upload_session", upload_query, top_k, min_similarity, category_filter)
+            
+            if results and results.get('results'):
+                render_results(results, "upload_session", top_k)
+            elif results is not None:
+                st.warning(
+                    "No similar products found. Try:\n"
+                    "- Lowering the similarity threshold\n"
+                    "- Uploading a different image\n"
+                    "- Checking if the image category matches your filter"
+                )
+            elif searched:
+                st.error("Search failed. If you uploaded an AVIF image, please convert it to PNG/JPG/WEBP and try again.")
 
 with tab2:
     st.header("Search by Image URL")
@@ -303,40 +319,22 @@ with tab2:
         if not image_url:
             st.warning("Please enter an image URL")
         else:
+            st.session_state["url_session_page"] = 0
             with st.spinner("Generating embedding and searching..."):
                 results = search_similar_url(image_url, top_k, min_similarity, category_filter)
+                remember_search("url_session", image_url, category_filter, results)
                 
                 if results and results.get('results'):
-                    st.success(f"Found {results['total_results']} similar products!")
-                    
-                    st.markdown("---")
-                    st.subheader("Search Results")
-                    
-                    cols = st.columns(3)
-                    for idx, result in enumerate(results['results']):
-                        product = result['product']
-                        score = result['similarity_score']
-
-                        if score >= 0.8:
-                            badge_class = "high-similarity"
-                        elif score >= 0.5:
-                            badge_class = "med-similarity"
-                        else:
-                            badge_class = "low-similarity"
-
-                        with cols[idx % 3]:
-                            st.markdown(f"""
-                            <div class="product-card">
-                                <img src="{product['url']}" alt="{product['name']}" class="product-image" />
-                                <div class="product-content">
-                                    <h4 class="product-title">{product['name']}</h4>
-                                    <p><strong>Category:</strong> {product['category'].title()}</p>
-                                    <span class="similarity-badge {badge_class}">{score:.1%} Match</span>
-                                </div>
-                            </div>
-                            """, unsafe_allow_html=True)
+                    render_results(results, "url_session", top_k)
                 else:
                     st.error("No similar products found.")
+    elif image_url:
+        # Slider changes and paging after a search reuse its session
+        results = refined_results("url_session", image_url, top_k, min_similarity, category_filter)
+        if results and results.get('results'):
+            render_results(results, "url_session", top_k)
+        elif results is not None:
+            st.warning("No products above the similarity threshold.")
 
 with tab3:
     st.header("Browse All Products")
@@ -344,12 +342,24 @@ with tab3:
     if category_filter:
         st.info(f"Showing: **{category_filter.title()}**")
     
-    # Fetch ALL products (no limit)
-    with st.spinner("Loading products..."):
-        products = get_products(category_filter, 100, 0)  # Increase limit to 100
+    # Cursors of the pages loaded so far ("Load more" appends one); reset per category
+    if st.session_state.get("browse_category") != category_filter:
+        st.session_state["browse_category"] = category_filter
+        st.session_state["browse_cursors"] = [None]
+    
+    products, next_cursor = [], None
+    for cursor in st.session_state["browse_cursors"]:
+        # The first page is usually fetched alongside the categories above; all pages are cached
+        if cursor is None and category_filter == browse_category and not isinstance(browse_first_page, Exception):
+            page = browse_first_page
+        else:
+            with st.spinner("Loading products..."):
+                page = get_products_page(category_filter, BROWSE_PAGE_SIZE, cursor)
+        products.extend(page["products"])
+        next_cursor = page["next_cursor"]
     
     if products:
-        st.write(f"**Total: {len(products)} products**")
+        st.write(f"**Showing {len(products)} products**")
         
         # Display in grid (5 columns)
         cols = st.columns(5)
@@ -357,13 +367,21 @@ with tab3:
             with cols[idx % 5]:
                 st.markdown(f"""
                 <div class="product-card">
-                    <img src="{product['url']}" alt="{product['name']}" class="product-image" />
+                    {product_image(product, BROWSE_IMAGE_SIZES)}
                     <div class="product-content">
                         <h4 class="product-title">{product['name']}</h4>
                         <p><strong>Category:</strong> {product['category'].title()}</p>
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
+        
+        if next_cursor:
+            api.prefetch(api.get_products_page, category_filter, BROWSE_PAGE_SIZE, next_cursor)
+            st.button(
+                "Load more",
+                key="browse_more",
+                on_click=lambda: st.session_state["browse_cursors"].append(next_cursor)
+            )
     else:
         st.info("No products available.")
 
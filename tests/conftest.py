@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+# Settings are read once at import: point the app at a throwaway SQLite file and
+# keep startup side effects off before anything under app/ is imported
+os.environ.update({
+    "STORAGE_BACKEND": "sqlite",
+    "SQLITE_PATH": os.path.join(tempfile.mkdtemp(prefix="vpm-tests-"), "catalog.sqlite3"),
+    "JINA_API_KEY": "test",
+    "IMAGE_FETCH_CACHE_DIR": tempfile.mkdtemp(prefix="vpm-image-cache-"),
+    "THUMBNAIL_CACHE_DIR": tempfile.mkdtemp(prefix="vpm-thumbnails-"),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app.services.storage import storage
+
+@pytest.fixture
+def sqlite_storage(tmp_path, monkeypatch):
+    """The app's storage singleton on a fresh SQLite file"""
+    monkeypatch.setattr(storage, "path", str(tmp_path / "catalog.sqlite3"))
+    storage.connect()
+    yield storage
+    storage.close()
+
+def product(i: int, updated_at, dim: int = 4) -> dict:
+    return {
+        "name": f"Product {i}",
+        "category": "shoes" if i % 2 else "bags",
+        "url": f"https://images.example.com/{i}.jpg",
+        "embedding": [1.0, i / 100, 0.5, 0.25][:dim],
+        "embedding_dim": dim,
+        "updated_at": updated_at,
+    }
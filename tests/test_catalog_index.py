@@ -0,0 +1,111 @@
+import asyncio
+from app.services import catalog_index as catalog_index_module
+from app.services.catalog_index import CatalogIndex, is_embedded
+from app.services.embedding_versions import DEFAULT_VERSION, EmbeddingVersion
+
+V2 = EmbeddingVersion("v2", "model-2", 3, "active")
+
+def versioned(i: int, v2: bool = True) -> dict:
+    doc = {"_id": f"p{i}", "name": f"Product {i}", "embedding": [1.0, i, 0.5, 0.1], "embedding_dim": 4, "vectors": {}}
+    if v2:
+        doc["vectors"]["v2"] = {"embedding": [i, 1.0, 2.0], "embedding_dim": 3}
+    return doc
+
+class GatedStorage:
+    """Catalog loads wait on `gate`, so changes can land while a cutover is reading"""
+
+    def __init__(self, docs: dict):
+        self.docs = docs
+        self.active = DEFAULT_VERSION
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def get_active_version(self):
+        return self.active
+
+    async def get_all_embeddings(self, version):
+        docs = [version.view(d) for d in self.docs.values() if is_embedded(d, version)]
+        await self.gate.wait()
+        return docs
+
+def test_changes_during_cutover_reach_the_new_snapshot(monkeypatch):
+    docs = {f"p{i}": versioned(i) for i in range(5)}
+    fake = GatedStorage(docs)
+    monkeypatch.setattr(catalog_index_module, "storage", fake)
+    index = CatalogIndex()
+
+    async def run():
+        await index.reload()
+        assert index.version.key == DEFAULT_VERSION.key
+
+        fake.active = V2
+        fake.gate.clear()
+        cutover = asyncio.create_task(index.sync_version())
+        await asyncio.sleep(0)
+        assert {v.key for v in index.versions_in_use()} == {DEFAULT_VERSION.key, V2.key}
+
+        docs["p9"] = versioned(9)
+        index.apply_changes([docs["p9"]])
+        del docs["p1"]
+        index.apply_changes([], ["p1"])
+        # Re-embedded without a v2 vector: leaves the v2 index
+        docs["p2"] = versioned(2, v2=False)
+        index.apply_changes([docs["p2"]])
+        # The snapshot still being served sees them straight away
+        assert sorted(index.snapshot.position) == ["p0", "p2", "p3", "p4", "p9"]
+
+        fake.gate.set()
+        await cutover
+        assert index.version.key == V2.key
+        assert index.snapshot.dim == 3
+        assert sorted(index.snapshot.position) == ["p0", "p3", "p4", "p9"]
+        assert [v.key for v in index.versions_in_use()] == [V2.key]
+
+    asyncio.run(run())
+
+def test_changes_during_a_reload_are_replayed(monkeypatch):
+    docs = {f"p{i}": versioned(i) for i in range(3)}
+    fake = GatedStorage(docs)
+    monkeypatch.setattr(catalog_index_module, "storage", fake)
+    index = CatalogIndex()
+
+    async def run():
+        await index.reload()
+        fake.gate.clear()
+        reload = asyncio.create_task(index.reload())
+        await asyncio.sleep(0)
+        # Landed after the load read the catalog, before it finished
+        docs["p7"] = versioned(7)
+        index.apply_changes([docs["p7"]], ["p0"])
+        fake.gate.set()
+        snapshot = await reload
+        assert sorted(snapshot.position) == ["p1", "p2", "p7"]
+        assert index._loading == []
+
+    asyncio.run(run())
+
+def test_superseded_load_never_replaces_a_newer_one(monkeypatch):
+    docs = {f"p{i}": versioned(i) for i in range(3)}
+    fake = GatedStorage(docs)
+    monkeypatch.setattr(catalog_index_module, "storage", fake)
+    index = CatalogIndex()
+
+    async def run():
+        await index.reload()
+        fake.gate.clear()
+        slow = asyncio.create_task(index.reload())
+        await asyncio.sleep(0)
+        fake.active = V2
+        fake.gate.set()
+        # Started later, finishes first: the cutover wins
+        await index.reload()
+        await slow
+        assert index.version.key == V2.key
+
+    asyncio.run(run())
+
+def test_is_embedded_checks_the_requested_version():
+    assert is_embedded(versioned(1), V2)
+    assert is_embedded(versioned(1, v2=False), DEFAULT_VERSION)
+    assert not is_embedded(versioned(1, v2=False), V2)
+    assert not is_embedded({"_id": "x", "embedding": None, "embedding_dim": None}, DEFAULT_VERSION)
@@ -0,0 +1,102 @@
+import pytest
+from app.models.product import FilterExpr
+from app.services.catalog_index import build_snapshot
+from app.services.filters import FilterError
+from config import settings
+
+def catalog(n: int = 60) -> list:
+    docs = []
+    for i in range(n):
+        doc = {"_id": f"p{i}", "name": f"Product {i}", "embedding": [1.0, i / n, 0.5], "brand": f"b{i % 3}"}
+        # Some products have no price: missing values never match a predicate
+        if i % 5:
+            doc["price"] = i
+        docs.append(doc)
+    return docs
+
+EXPRESSIONS = [
+    ({"field": "brand", "eq": "b1"}, lambda d: d["brand"] == "b1"),
+    ({"field": "brand", "in": ["b0", "b2"]}, lambda d: d["brand"] in ("b0", "b2")),
+    ({"field": "price", "gte": 10, "lt": 30}, lambda d: "price" in d and 10 <= d["price"] < 30),
+    (
+        {"and": [{"field": "brand", "eq": "b0"}, {"field": "price", "gt": 20}]},
+        lambda d: d["brand"] == "b0" and d.get("price", 0) > 20,
+    ),
+    (
+        {"or": [{"field": "brand", "eq": "b2"}, {"field": "price", "lte": 5}]},
+        lambda d: d["brand"] == "b2" or ("price" in d and d["price"] <= 5),
+    ),
+    ({"not": {"field": "price", "gte": 10}}, lambda d: not ("price" in d and d["price"] >= 10)),
+]
+
+@pytest.mark.parametrize("selectivity", [0.0, 1.1], ids=["postfilter", "prefilter"])
+@pytest.mark.parametrize("expr,expected", EXPRESSIONS)
+def test_filtered_search_matches_every_qualifying_product(monkeypatch, selectivity, expr, expected):
+    monkeypatch.setattr(settings, "filter_postfilter_selectivity", selectivity)
+    docs = catalog()
+    snapshot = build_snapshot(docs, 1)
+    hits = snapshot.search([1.0, 0.5, 0.5], top_k=len(docs), min_similarity=-1.0, filter=FilterExpr.model_validate(expr))
+    assert sorted(snapshot.ids[row] for row, _ in hits) == sorted(d["_id"] for d in docs if expected(d))
+
+def test_range_on_text_field_is_rejected():
+    snapshot = build_snapshot(catalog(), 1)
+    with pytest.raises(FilterError):
+        snapshot.search([1.0, 0.5, 0.5], filter=FilterExpr(field="brand", gt=1))
+
+def test_deleted_products_never_match():
+    snapshot = build_snapshot(catalog(), 1).with_changes([], ["p1", "p4"], 2)
+    hits = snapshot.search([1.0, 0.5, 0.5], top_k=100, min_similarity=-1.0, filter=FilterExpr(field="brand", eq="b1"))
+    ids = {snapshot.ids[row] for row, _ in hits}
+    assert "p1" not in ids and "p4" not in ids and "p7" in ids
+
+def test_column_cache_is_bounded_and_skips_missing_fields(monkeypatch):
+    monkeypatch.setattr(settings, "filter_column_cache_max", 2)
+    snapshot = build_snapshot(catalog(), 1)
+    for i in range(20):
+        snapshot.search([1.0, 0.5, 0.5], filter=FilterExpr(field=f"missing{i}", eq="x"))
+    assert len(snapshot._columns) == 0
+
+    for field in ("brand", "price", "name", "brand"):
+        snapshot.column(field)
+    # Least recently used first
+    assert list(snapshot._columns) == ["name", "brand"]
+
+def test_cached_columns_follow_incremental_changes():
+    snapshot = build_snapshot(catalog(), 1)
+    snapshot.column("brand")
+    snapshot.column("price")
+    changed = snapshot.with_changes(
+        [{"_id": "new", "name": "New", "embedding": [1.0, 0.5, 0.5], "brand": "b9", "price": 500}], [], 2
+    )
+    assert list(changed._columns) == ["brand", "price"]
+    hits = changed.search([1.0, 0.5, 0.5], top_k=5, min_similarity=-1.0, filter=FilterExpr(field="brand", eq="b9"))
+    assert [changed.ids[row] for row, _ in hits] == ["new"]
+    hits = changed.search([1.0, 0.5, 0.5], top_k=5, min_similarity=-1.0, filter=FilterExpr(field="price", gt=100))
+    assert [changed.ids[row] for row, _ in hits] == ["new"]
+
+    # A text value turns price categorical: the cached numeric column is dropped, not reused
+    text = changed.with_changes([{"_id": "odd", "name": "Odd", "embedding": [1.0, 0.5, 0.5], "price": "ask"}], [], 3)
+    assert "price" not in text._columns
+    with pytest.raises(FilterError):
+        text.search([1.0, 0.5, 0.5], filter=FilterExpr(field="price", gt=100))
+
+def test_compaction_keeps_cached_columns_aligned():
+    docs = catalog()
+    snapshot = build_snapshot(docs, 1)
+    snapshot.column("brand")
+    compacted = snapshot.with_changes([], [d["_id"] for d in docs[:40]], 2)
+    assert compacted.alive is None and len(compacted.products) == 20
+    hits = compacted.search([1.0, 0.5, 0.5], top_k=100, min_similarity=-1.0, filter=FilterExpr(field="brand", eq="b1"))
+    assert sorted(compacted.ids[row] for row, _ in hits) == sorted(d["_id"] for d in docs[40:] if d["brand"] == "b1")
+
+def test_uncached_column_is_built_once_per_filter(monkeypatch):
+    from app.services import catalog_index as catalog_index_module
+    monkeypatch.setattr(settings, "filter_column_cache_max", 0)
+    built = []
+    build_column = catalog_index_module.build_column
+    monkeypatch.setattr(catalog_index_module, "build_column", lambda raw: built.append(1) or build_column(raw))
+    snapshot = build_snapshot(catalog(), 1)
+    expr = FilterExpr.model_validate({"or": [{"field": "brand", "eq": "b0"}, {"field": "brand", "eq": "b1"}]})
+    snapshot.search([1.0, 0.5, 0.5], filter=expr)
+    assert len(built) == 1
+    assert len(snapshot._columns) == 0
@@ -0,0 +1,78 @@
+from io import BytesIO
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.api import product as product_api
+from app.services.catalog_index import build_snapshot, catalog_index
+from app.services.image_hash import IMAGE_HASH_FIELD, hash_hex, hash_image, match_upload
+from app.services.result_cache import result_cache
+from config import settings
+
+def picture(seed: int) -> Image.Image:
+    # Smooth random blobs: structure a perceptual hash can see
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (6, 6, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize((256, 256), Image.Resampling.BICUBIC)
+
+def encoded(img: Image.Image, fmt: str = "PNG", **options) -> BytesIO:
+    buffer = BytesIO()
+    img.save(buffer, format=fmt, **options)
+    buffer.seek(0)
+    return buffer
+
+@pytest.fixture
+def snapshot():
+    rng = np.random.default_rng(11)
+    docs = []
+    for i in range(12):
+        docs.append({
+            "_id": f"p{i}",
+            "name": f"Product {i}",
+            "embedding": rng.standard_normal(8).tolist(),
+            IMAGE_HASH_FIELD: hash_hex(hash_image(encoded(picture(i)))),
+        })
+    return build_snapshot(docs, 1)
+
+def test_reencoded_copy_matches_its_catalog_row(snapshot):
+    # Downscaled and saved as a lossy JPEG, as a shopper's screenshot would be
+    upload = encoded(picture(5).resize((180, 180)), "JPEG", quality=70)
+    row, distance = match_upload(snapshot, upload)
+    assert snapshot.ids[row] == "p5"
+    assert distance <= settings.image_hash_max_distance
+    # Rewound for the embedding path
+    assert upload.tell() == 0
+
+def test_unrelated_image_does_not_match(snapshot):
+    assert match_upload(snapshot, encoded(picture(99))) is None
+
+def test_deleted_product_is_never_matched(snapshot):
+    changed = snapshot.with_changes([], ["p5"], 2)
+    match = match_upload(changed, encoded(picture(5)))
+    assert match is None or changed.ids[match[0]] != "p5"
+
+def test_disabled_or_undecodable_uploads_fall_through(snapshot, monkeypatch):
+    garbage = BytesIO(b"\x89PNG\r\n\x1a\n" + b"\0" * 64)
+    assert match_upload(snapshot, garbage) is None
+    assert garbage.tell() == 0
+    monkeypatch.setattr(settings, "image_hash_max_distance", -1)
+    assert match_upload(snapshot, encoded(picture(5))) is None
+
+def test_upload_of_a_catalog_image_reuses_its_stored_vector(snapshot, monkeypatch):
+    monkeypatch.setattr(catalog_index, "snapshot", snapshot)
+    monkeypatch.setattr(catalog_index, "live", True)
+    result_cache.cache.clear()
+
+    async def no_jina(*args, **kwargs):
+        raise AssertionError("a hash match must not call the embedding service")
+    monkeypatch.setattr(product_api, "get_embedding_from_file", no_jina)
+
+    app = FastAPI()
+    app.include_router(product_api.router)
+    upload = encoded(picture(3), "JPEG", quality=80)
+    response = TestClient(app).post("/api/search-upload", files={"file": ("copy.jpg", upload, "image/jpeg")}, params={"top_k": 1})
+    assert response.status_code == 200
+    best = response.json()["results"][0]
+    assert best["product"]["_id"] == "p3"
+    assert best["similarity_score"] == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import OperationFailure
+from conftest import product
+from app.services.catalog_index import CatalogIndex
+from app.services.index_refresh import IndexRefresher
+from config import settings
+
+def test_poll_pages_past_rows_sharing_one_timestamp(sqlite_storage, monkeypatch):
+    monkeypatch.setattr(settings, "index_refresh_batch", 50)
+    index = CatalogIndex()
+    refresher = IndexRefresher(index)
+    start = datetime.now(timezone.utc) - timedelta(minutes=1)
+
+    async def run():
+        sqlite_storage.store.insert([product(i, start) for i in range(10)])
+        await index.reload()
+        refresher.watermark = datetime.fromtimestamp(index.loaded_at, tz=timezone.utc)
+
+        # More rows on one timestamp than fit in a page
+        stamp = datetime.now(timezone.utc)
+        sqlite_storage.store.insert([product(i, stamp) for i in range(10, 270)])
+        await refresher._poll_changes()
+        assert len(index.snapshot) == 270
+        assert refresher.watermark == stamp
+
+        # Committed after the poll but stamped before the watermark
+        sqlite_storage.store.insert([product(i, stamp - timedelta(seconds=2)) for i in range(270, 273)])
+        await refresher._poll_changes()
+        assert len(index.snapshot) == 273
+
+        # Nothing new: rows inside the re-read window are not applied twice
+        applied = refresher.stats["applied_upserts"]
+        await refresher._poll_changes()
+        assert refresher.stats["applied_upserts"] == applied == 263
+
+    asyncio.run(run())
+
+class FakeStream:
+    def __init__(self, token):
+        self.resume_token = token
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def next(self):
+        await asyncio.Event().wait()
+
+class FakeCollection:
+    """Change stream whose stored resume token fell off the oplog"""
+
+    def __init__(self):
+        self.opened = []
+
+    def watch(self, pipeline, full_document=None, resume_after=None, start_at_operation_time=None):
+        self.opened.append((resume_after, start_at_operation_time))
+        if resume_after == "stale-token":
+            raise OperationFailure("Resume of change stream was not possible", code=286)
+        return FakeStream("fresh-token")
+
+def test_lost_resume_token_reloads_and_opens_a_fresh_stream(sqlite_storage, monkeypatch):
+    from app.services import index_refresh as index_refresh_module
+    collection = FakeCollection()
+    monkeypatch.setattr(index_refresh_module.MongoDB, "get_collection", classmethod(lambda cls: collection))
+    monkeypatch.setattr(type(sqlite_storage), "supports_change_stream", True)
+    monkeypatch.setattr(settings, "index_refresh_mode", "change_stream")
+    sqlite_storage.store.insert([product(i, datetime.now(timezone.utc)) for i in range(3)])
+    index = CatalogIndex()
+    refresher = IndexRefresher(index)
+    refresher.resume_token = "stale-token"
+
+    async def run():
+        await index.reload()
+        loads = index.generation
+        task = asyncio.create_task(refresher._run())
+        for _ in range(100):
+            if index.live:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        return loads
+
+    loads = asyncio.run(run())
+    # Not retried with the dead token, nor replayed from the old snapshot's load time
+    assert collection.opened == [("stale-token", None), (None, None)]
+    assert index.generation == loads + 1
+    assert index.live and refresher.resume_token == "fresh-token"
+    assert refresher.stats["errors"] == 1 and not refresher.rebaseline
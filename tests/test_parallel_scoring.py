@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from app.services.parallel_scoring import ParallelScorer
+from app.services.similarity import normalize_rows, top_k_similar
+from config import settings
+
+@pytest.fixture
+def chunked(monkeypatch):
+    """A scorer forced onto the chunked path for small matrices"""
+    monkeypatch.setattr(settings, "search_threads", 4)
+    monkeypatch.setattr(settings, "search_parallel_min_rows", 1)
+    monkeypatch.setattr(settings, "search_chunk_rows", 37)
+    scorer = ParallelScorer()
+    yield scorer
+    if scorer._pool is not None:
+        scorer._pool.shutdown()
+
+def catalog(rows: int = 1000, dim: int = 16):
+    rng = np.random.default_rng(7)
+    matrix = normalize_rows(rng.standard_normal((rows, dim)).astype(np.float32))
+    query = matrix[3] + 0.1 * rng.standard_normal(dim).astype(np.float32)
+    return matrix, query / np.linalg.norm(query)
+
+@pytest.mark.parametrize("top_k,min_similarity", [(1, -1.0), (10, 0.0), (250, -1.0), (2000, 0.2)])
+def test_chunked_scan_matches_serial_scan(chunked, top_k, min_similarity):
+    matrix, query = catalog()
+    assert chunked.top_k(matrix, query, top_k, min_similarity) == top_k_similar(matrix, query, top_k, min_similarity)
+
+@pytest.mark.parametrize("top_k", [5, 100])
+def test_chunked_scan_matches_serial_scan_on_filtered_rows(chunked, top_k):
+    matrix, query = catalog()
+    rows = np.flatnonzero(np.arange(len(matrix)) % 3 != 1)
+    hits = chunked.top_k(matrix, query, top_k, 0.0, rows)
+    assert hits == top_k_similar(matrix, query, top_k, 0.0, rows)
+    assert all(row % 3 != 1 for row, _ in hits)
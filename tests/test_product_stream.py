@@ -0,0 +1,122 @@
+import asyncio
+import base64
+import numpy as np
+import orjson
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from conftest import product
+from app.api import product as product_api
+from app.services import mongodb
+from app.services.mongodb import MongoBackend
+from app.services.storage import storage
+
+def client() -> TestClient:
+    app = FastAPI()
+    app.include_router(product_api.router)
+    return TestClient(app)
+
+def lines(response) -> list:
+    return [orjson.loads(line) for line in response.content.splitlines()]
+
+def test_stream_sends_every_product_as_ndjson(sqlite_storage):
+    sqlite_storage.store.insert([product(i, None) for i in range(25)])
+    response = client().get("/api/products/stream", params={"batch_size": 10})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = lines(response)
+    assert len(rows) == 25 and len({row["_id"] for row in rows}) == 25
+    assert "embedding" not in rows[0]
+
+    shoes = lines(client().get("/api/products/stream", params={"category": "shoes", "batch_size": 7}))
+    assert len(shoes) == 12 and all(row["category"] == "shoes" for row in shoes)
+
+def test_stream_embeddings_are_base64_float32(sqlite_storage):
+    sqlite_storage.store.insert([product(i, None) for i in range(3)])
+    for row in lines(client().get("/api/products/stream", params={"include_embedding": True})):
+        i = int(row["name"].split()[-1])
+        vector = np.frombuffer(base64.b64decode(row["embedding"]), dtype="<f4")
+        assert row["embedding_dtype"] == "float32"
+        assert np.allclose(vector, product(i, None)["embedding"])
+
+def test_one_chunk_per_storage_batch(sqlite_storage):
+    sqlite_storage.store.insert([product(i, None) for i in range(25)])
+
+    async def run():
+        response = await product_api.stream_products(category=None, batch_size=10, include_embedding=False)
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(run())
+    assert [chunk.count(b"\n") for chunk in chunks] == [10, 10, 5]
+
+def test_disconnect_closes_the_storage_iterator(monkeypatch):
+    closed = []
+
+    async def endless(category, batch_size, version):
+        try:
+            while True:
+                yield [{"_id": "p1", "name": "Product 1", "url": "https://images.example.com/1.jpg"}]
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(storage, "iter_products", endless)
+
+    async def run():
+        response = await product_api.stream_products(category=None, batch_size=1, include_embedding=False)
+        body = response.body_iterator
+        await body.__anext__()
+        await body.__anext__()
+        # What Starlette does when the client goes away mid-stream
+        await body.aclose()
+
+    asyncio.run(run())
+    assert closed == [True]
+
+class FakeCursor:
+    def __init__(self, count: int):
+        self.docs = iter({"_id": f"{i:024x}", "name": f"Product {i}"} for i in range(count))
+        self.closed = False
+
+    def sort(self, *args):
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        self.closed = True
+
+def test_mongo_cursor_is_closed_when_the_consumer_stops(monkeypatch):
+    cursor = FakeCursor(100)
+
+    class Collection:
+        def find(self, *args, **kwargs):
+            return cursor
+
+    monkeypatch.setattr(mongodb.MongoDB, "get_collection", classmethod(lambda cls: Collection()))
+
+    async def run():
+        batches = MongoBackend().iter_products(batch_size=10)
+        first = await batches.__anext__()
+        await batches.aclose()
+        return first
+
+    assert len(asyncio.run(run())) == 10
+    assert cursor.closed
+
+def test_page_cursor_walks_the_catalog(sqlite_storage):
+    sqlite_storage.store.insert([product(i, None) for i in range(5)])
+    first = client().get("/api/products/page", params={"limit": 3}).json()
+    rest = client().get("/api/products/page", params={"limit": 3, "cursor": first["next_cursor"]}).json()
+    assert len(first["products"]) == 3 and len(rest["products"]) == 2
+    assert rest["next_cursor"] is None
+
+def test_malformed_page_cursor_is_rejected(sqlite_storage):
+    sqlite_storage.store.insert([product(i, None) for i in range(5)])
+    for cursor in ["not-a-cursor", "", "0" * 23]:
+        response = client().get("/api/products/page", params={"cursor": cursor})
+        assert response.status_code == 400
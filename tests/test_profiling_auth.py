@@ -0,0 +1,39 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.middleware import ProfilingMiddleware
+from app.api.profiling import router
+from app.services.profiling import token_matches
+from config import settings
+
+TOKEN = "s3cret-token"
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "profiling_token", TOKEN)
+    app = FastAPI()
+    app.include_router(router)
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(ProfilingMiddleware, token=TOKEN)
+    return TestClient(app)
+
+@pytest.mark.parametrize("supplied,expected", [
+    (TOKEN, True), ("wrong", False), ("", False), (None, False), ("tökén", False), ("🔑", False),
+])
+def test_token_matches(supplied, expected):
+    assert token_matches(supplied, TOKEN) is expected
+
+def test_non_ascii_token_is_not_a_server_error(client):
+    # Header bytes arrive latin-1 decoded; query strings percent-decoded as UTF-8
+    assert client.get("/api/ping", headers={"X-Profile": "t\xf6ken".encode("latin-1")}).status_code == 200
+    assert client.get("/api/ping", params={"profile": "tökén"}).status_code == 200
+    assert client.get("/api/profiling/slowest", headers={"X-Profile": "t\xf6ken".encode("latin-1")}).status_code == 404
+    assert client.get("/api/profiling/slowest", params={"token": "🔑"}).status_code == 404
+
+def test_right_token_still_opens_the_profiling_routes(client):
+    assert client.get("/api/profiling/slowest", params={"token": TOKEN}).status_code == 200
+    assert client.get("/api/profiling/slowest", headers={"X-Profile": TOKEN}).status_code == 200
@@ -0,0 +1,139 @@
+import asyncio
+import httpx
+import pytest
+from app.services.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/embeddings")
+
+def status_error(code: int) -> httpx.HTTPStatusError:
+    return httpx.HTTPStatusError(f"HTTP {code}", request=REQUEST, response=httpx.Response(code, request=REQUEST))
+
+def caller(**kwargs) -> ResilientCaller:
+    options = dict(max_retries=0, backoff_base=0.001, backoff_max=0.001, deadline=5.0, hedge_enabled=False,
+                   breaker_threshold=2, breaker_reset=0.05)
+    options.update(kwargs)
+    return ResilientCaller("test", **options)
+
+def flaky(*outcomes):
+    """Call after call, raise the next exception or return the next value"""
+    calls = []
+
+    async def fn():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+    return fn, calls
+
+def test_transient_errors_are_retried():
+    c = caller(max_retries=2, breaker_threshold=5)
+    fn, calls = flaky(httpx.ConnectError("refused"), status_error(503), "ok")
+    assert asyncio.run(c.call(fn)) == "ok"
+    assert len(calls) == 3
+    assert c.stats["retries"] == 2
+    assert c.breaker.state == CircuitBreaker.CLOSED and c.breaker.failures == 0
+
+def test_client_errors_are_not_retried_or_counted():
+    c = caller(max_retries=2)
+    fn, calls = flaky(status_error(400))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(c.call(fn))
+    assert len(calls) == 1
+    assert c.breaker.failures == 0
+
+def test_breaker_opens_fails_fast_and_closes_after_a_good_probe():
+    c = caller()
+    fn, calls = flaky(httpx.ConnectError("a"), httpx.ConnectError("b"), "ok")
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                await c.call(fn)
+        assert c.breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await c.call(fn)
+        assert len(calls) == 2
+
+        await asyncio.sleep(0.06)
+        assert await c.call(fn) == "ok"
+        assert c.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(run())
+    assert c.stats["short_circuited"] == 1
+
+def test_failed_probe_reopens_the_breaker():
+    c = caller(breaker_threshold=1)
+    fn, _ = flaky(httpx.ConnectError("a"), httpx.ConnectError("b"))
+
+    async def run():
+        with pytest.raises(httpx.ConnectError):
+            await c.call(fn)
+        await asyncio.sleep(0.06)
+        with pytest.raises(httpx.ConnectError):
+            await c.call(fn)
+        assert c.breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await c.call(fn)
+
+    asyncio.run(run())
+
+def test_only_one_half_open_probe_at_a_time():
+    c = caller(breaker_threshold=1)
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def slow():
+            await gate.wait()
+            return "ok"
+
+        c.breaker.record_failure()
+        await asyncio.sleep(0.06)
+        probe = asyncio.create_task(c.call(slow))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await c.call(slow)
+        gate.set()
+        assert await probe == "ok"
+        assert c.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(run())
+
+def test_cancelled_probe_does_not_wedge_the_breaker():
+    c = caller(breaker_threshold=1)
+
+    async def hang():
+        await asyncio.sleep(3600)
+
+    async def ok():
+        return "ok"
+
+    async def run():
+        c.breaker.record_failure()
+        await asyncio.sleep(0.06)
+        probe = asyncio.create_task(c.call(hang))
+        await asyncio.sleep(0)
+        assert c.breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # The next call becomes the probe and closes the breaker
+        assert await c.call(ok) == "ok"
+        assert c.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(run())
+
+def test_slow_call_is_hedged_and_the_backup_wins():
+    c = caller(hedge_enabled=True, hedge_min_samples=1, hedge_quantile=0.5)
+    c.latency.observe(0.01)
+    started = []
+
+    async def fn():
+        started.append(1)
+        if len(started) == 1:
+            await asyncio.sleep(3600)
+        return len(started)
+
+    assert asyncio.run(c.call(fn)) == 2
+    assert c.stats["hedges"] == 1 and c.stats["hedge_wins"] == 1
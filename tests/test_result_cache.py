@@ -0,0 +1,67 @@
+import asyncio
+import orjson
+from app.api import product as product_api
+from app.services.catalog_index import build_snapshot
+from app.services.result_cache import result_cache
+from app.services.search_sessions import search_sessions
+
+def snapshot(generation: int = 1):
+    docs = [{"_id": f"p{i}", "name": f"Product {i}", "embedding": [1.0, i / 10]} for i in range(10)]
+    return build_snapshot(docs, generation)
+
+def search(snap, query_url: str) -> dict:
+    body, _ = asyncio.run(product_api.ranked_response(snap, query_url, [1.0, 0.0], 3, 0.0, None))
+    return orjson.loads(body)
+
+def test_cache_hit_opens_a_session_of_its_own(monkeypatch):
+    result_cache.cache.clear()
+    scored = []
+    run_search = product_api.run_search
+    monkeypatch.setattr(product_api, "run_search", lambda *args: scored.append(1) or run_search(*args))
+    snap = snapshot()
+
+    first = search(snap, "https://a.example.com/1.jpg")
+    second = search(snap, "https://b.example.com/2.jpg")
+
+    assert len(scored) == 1
+    assert second["results"] == first["results"]
+    assert second["total_matches"] == first["total_matches"] == 10
+    # Nothing of the first requester leaks into the second response
+    assert second["query_url"] == "https://b.example.com/2.jpg"
+    assert second["session_token"] != first["session_token"]
+    assert search_sessions.get(second["session_token"]).query_url == "https://b.example.com/2.jpg"
+    assert search_sessions.get(first["session_token"]).query_url == "https://a.example.com/1.jpg"
+
+def test_index_change_bypasses_cached_pages(monkeypatch):
+    result_cache.cache.clear()
+    scored = []
+    run_search = product_api.run_search
+    monkeypatch.setattr(product_api, "run_search", lambda *args: scored.append(1) or run_search(*args))
+
+    search(snapshot(1), "https://a.example.com/1.jpg")
+    search(snapshot(2), "https://a.example.com/1.jpg")
+    assert len(scored) == 2
+
+def test_cached_page_outlives_the_first_session():
+    result_cache.cache.clear()
+    snap = snapshot()
+    first = search(snap, "https://a.example.com/1.jpg")
+    search_sessions.cache.pop(first["session_token"])
+
+    second = search(snap, "https://b.example.com/2.jpg")
+    assert second["results"] == first["results"]
+    session = search_sessions.get(second["session_token"])
+    # The new session pages on from the cached candidates
+    hits, total = session.page(snap, 3, 3, 0.0)
+    assert total == 10 and len(hits) == 3
+
+def test_no_session_fields_with_sessions_disabled(monkeypatch):
+    from config import settings
+    monkeypatch.setattr(settings, "search_session_candidates", 0)
+    result_cache.cache.clear()
+    snap = snapshot()
+    first = search(snap, "https://a.example.com/1.jpg")
+    second = search(snap, "https://b.example.com/2.jpg")
+    assert first.get("session_token") is None and second.get("session_token") is None
+    assert second["results"] == first["results"]
+    assert second["query_url"] == "https://b.example.com/2.jpg"
@@ -0,0 +1,74 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.product import router
+from app.services import cache as cache_module
+from app.services.catalog_index import build_snapshot, catalog_index
+from app.services.embedding_versions import EmbeddingVersion
+from app.services.search_sessions import search_sessions
+
+def catalog():
+    return [
+        {"_id": f"p{i}", "name": f"Product {i}", "embedding": [1.0, i / 20], "category": "shoes" if i % 2 else "bags", "price": i}
+        for i in range(20)
+    ]
+
+@pytest.fixture
+def client(monkeypatch):
+    snapshot = build_snapshot(catalog(), 1)
+    monkeypatch.setattr(catalog_index, "snapshot", snapshot)
+    monkeypatch.setattr(catalog_index, "live", True)
+    app = FastAPI()
+    app.include_router(router)
+    session = search_sessions.create("https://a.example.com/q.jpg", snapshot, snapshot.search([1.0, 0.0], top_k=20, min_similarity=-1.0))
+    client = TestClient(app)
+    client.token = session.token
+    client.ranking = [snapshot.ids[row] for row, _ in snapshot.search([1.0, 0.0], top_k=20, min_similarity=-1.0)]
+    return client
+
+def ids(body: dict) -> list:
+    return [hit["product"]["_id"] for hit in body["results"]]
+
+def test_pages_follow_the_original_ranking(client):
+    first = client.get(f"/api/search/sessions/{client.token}", params={"limit": 5}).json()
+    second = client.get(f"/api/search/sessions/{client.token}", params={"offset": 5, "limit": 5}).json()
+    assert ids(first) + ids(second) == client.ranking[:10]
+    assert first["total_matches"] == 20 and second["offset"] == 5
+    assert second["query_url"] == "https://a.example.com/q.jpg"
+
+def test_refinement_narrows_without_rescoring(client):
+    body = client.get(f"/api/search/sessions/{client.token}", params={
+        "limit": 20, "category": "shoes", "filter": '{"field": "price", "gte": 10}'
+    }).json()
+    assert ids(body) == [pid for pid in client.ranking if int(pid[1:]) % 2 and int(pid[1:]) >= 10]
+    assert body["total_matches"] == 5
+
+    strict = client.get(f"/api/search/sessions/{client.token}", params={"limit": 20, "min_similarity": 0.99}).json()
+    assert 0 < strict["total_matches"] < 20
+    assert all(hit["similarity_score"] >= 0.99 for hit in strict["results"])
+
+def test_bad_refinement_filter_is_a_400(client):
+    response = client.get(f"/api/search/sessions/{client.token}", params={"filter": '{"field": "category", "gt": 1}'})
+    assert response.status_code == 400
+
+def test_expired_session_is_a_404(client, monkeypatch):
+    assert client.get(f"/api/search/sessions/{client.token}").status_code == 200
+    now = cache_module.time.monotonic()
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now + search_sessions.cache.ttl + 1)
+    response = client.get(f"/api/search/sessions/{client.token}")
+    assert response.status_code == 404
+    assert search_sessions.get(client.token) is None
+
+def test_unknown_token_is_a_404(client):
+    assert client.get("/api/search/sessions/not-a-token").status_code == 404
+
+def test_session_from_another_embedding_version_is_a_404(client, monkeypatch):
+    other = build_snapshot(catalog(), 2, EmbeddingVersion("v2", "model-2", 2, "active"))
+    monkeypatch.setattr(catalog_index, "snapshot", other)
+    assert client.get(f"/api/search/sessions/{client.token}").status_code == 404
+
+def test_deleted_products_drop_out_of_later_pages(client, monkeypatch):
+    removed = client.ranking[0]
+    monkeypatch.setattr(catalog_index, "snapshot", catalog_index.snapshot.with_changes([], [removed], 2))
+    body = client.get(f"/api/search/sessions/{client.token}", params={"limit": 20}).json()
+    assert removed not in ids(body) and body["total_matches"] == 19
@@ -0,0 +1,89 @@
+import asyncio
+from io import BytesIO
+import pytest
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.api.middleware import UploadSizeLimitMiddleware, MULTIPART_OVERHEAD
+from app.services.uploads import UploadRejected, ingest_upload, open_image_guarded, sniff_image_type
+from config import settings
+
+def image_bytes(fmt: str, size=(8, 8)) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", size, (200, 10, 10)).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("fmt,kind", [("JPEG", "image/jpeg"), ("PNG", "image/png"), ("WEBP", "image/webp")])
+def test_sniffs_supported_formats(fmt, kind):
+    assert sniff_image_type(image_bytes(fmt)[:64]) == kind
+
+@pytest.mark.parametrize("head", [
+    b"GIF89a" + b"\0" * 32,
+    b"RIFF\0\0\0\0WAVEfmt ",
+    b"<svg xmlns='http://www.w3.org/2000/svg'>",
+])
+def test_unknown_data_is_not_an_image(head):
+    assert sniff_image_type(head) is None
+
+def test_avif_is_recognised():
+    assert sniff_image_type(b"\0\0\0\x1cftypavif" + b"\0" * 16) == "image/avif"
+
+def ingest(data: bytes, filename: str = "photo.jpg"):
+    return asyncio.run(ingest_upload(UploadFile(file=BytesIO(data), filename=filename)))
+
+def test_upload_type_comes_from_content_not_filename(monkeypatch):
+    monkeypatch.setattr(settings, "upload_chunk_size", 16)
+    data = image_bytes("PNG")
+    source, kind, size = ingest(data, filename="holiday.jpg")
+    assert kind == "image/png" and size == len(data)
+    # Rewound for the decoder
+    assert source.read() == data
+
+@pytest.mark.parametrize("data,status", [
+    (b"", 400),
+    (b"%PDF-1.7 not an image at all", 415),
+    (b"\0\0\0\x1cftypavif" + b"\0" * 64, 415),
+])
+def test_rejected_uploads(data, status):
+    with pytest.raises(UploadRejected) as e:
+        ingest(data)
+    assert e.value.status_code == status
+
+def test_upload_size_cap(monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_bytes", 1000)
+    monkeypatch.setattr(settings, "upload_chunk_size", 256)
+    data = image_bytes("JPEG")
+    with pytest.raises(UploadRejected) as e:
+        ingest(data + b"\0" * (1001 - len(data)))
+    assert e.value.status_code == 413
+    assert ingest(data + b"\0" * (1000 - len(data)))[2] == 1000
+
+def test_pixel_cap_refuses_before_decoding(monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_pixels", 100 * 100 - 1)
+    with pytest.raises(UploadRejected) as e:
+        open_image_guarded(BytesIO(image_bytes("PNG", (100, 100))))
+    assert e.value.status_code == 413
+    monkeypatch.setattr(settings, "upload_max_pixels", 100 * 100)
+    assert open_image_guarded(BytesIO(image_bytes("PNG", (100, 100)))).size == (100, 100)
+
+def limited_app(max_bytes: int) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return {"received": len(await request.body())}
+
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=max_bytes, paths=("/upload",))
+    return TestClient(app)
+
+def test_middleware_refuses_oversized_bodies():
+    client = limited_app(1000)
+    limit = 1000 + MULTIPART_OVERHEAD
+    assert client.post("/upload", content=b"x" * limit).json() == {"received": limit}
+    assert client.post("/upload", content=b"x" * (limit + 1)).status_code == 413
+
+    # No Content-Length: cut off while streaming
+    def chunks():
+        for _ in range(limit // 4096 + 2):
+            yield b"x" * 4096
+    assert client.post("/upload", content=chunks()).status_code == 413
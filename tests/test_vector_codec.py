@@ -0,0 +1,65 @@
+import asyncio
+import numpy as np
+import pytest
+from bson.binary import Binary
+from app.services.catalog_index import build_snapshot
+from app.services.embedding_versions import DEFAULT_VERSION
+from app.services.vector_codec import as_vector, encode_embedding
+
+VECTOR = np.random.default_rng(3).standard_normal(64).astype(np.float32)
+
+def test_float32_round_trip_is_exact():
+    fields = encode_embedding(VECTOR, "float32")
+    assert isinstance(fields["embedding"], Binary)
+    assert fields["embedding_dim"] == 64 and fields["embedding_dtype"] == "float32"
+    assert np.array_equal(as_vector(fields["embedding"], fields["embedding_dtype"]), VECTOR)
+
+def test_float16_round_trip_is_close():
+    fields = encode_embedding(VECTOR, "float16")
+    assert len(fields["embedding"]) == 64 * 2
+    decoded = as_vector(fields["embedding"], fields["embedding_dtype"])
+    assert decoded.dtype == np.float32
+    assert np.allclose(decoded, VECTOR, rtol=1e-3, atol=1e-3)
+
+def test_array_round_trip():
+    fields = encode_embedding(VECTOR, "array")
+    assert fields["embedding_dtype"] is None and isinstance(fields["embedding"], list)
+    assert np.array_equal(as_vector(fields["embedding"]), VECTOR)
+
+def test_packed_bytes_are_little_endian():
+    assert bytes(encode_embedding([1.0], "float32")["embedding"]) == b"\x00\x00\x80\x3f"
+    assert bytes(encode_embedding([1.0], "float16")["embedding"]) == b"\x00\x3c"
+
+def test_unknown_storage_is_rejected():
+    with pytest.raises(ValueError):
+        encode_embedding(VECTOR, "int8")
+
+def test_untagged_bytes_read_as_float32():
+    assert np.array_equal(as_vector(VECTOR.astype("<f4").tobytes()), VECTOR)
+
+def mixed_catalog() -> list:
+    rng = np.random.default_rng(5)
+    docs = []
+    for i, storage in enumerate(["array", "float32", "float16"] * 10):
+        vector = rng.standard_normal(16).astype(np.float32)
+        docs.append({"_id": f"p{i}", "name": f"Product {i}", **encode_embedding(vector, storage)})
+    return docs
+
+def test_mixed_formats_load_into_one_index():
+    docs = mixed_catalog()
+    snapshot = build_snapshot(docs, 1)
+    assert len(snapshot) == 30 and snapshot.dim == 16
+    # Every row ranks itself first, whichever format it was stored in
+    for doc in docs:
+        row, score = snapshot.search(as_vector(doc["embedding"], doc["embedding_dtype"]).tolist(), top_k=1)[0]
+        assert snapshot.ids[row] == doc["_id"] and score == pytest.approx(1.0, abs=1e-3)
+
+def test_mixed_formats_survive_the_sqlite_store(sqlite_storage):
+    docs = mixed_catalog()
+    sqlite_storage.store.upsert([dict(d, url=f"https://images.example.com/{i}.jpg") for i, d in enumerate(docs)])
+    loaded = asyncio.run(sqlite_storage.get_all_embeddings(DEFAULT_VERSION))
+    by_id = {d["_id"]: d for d in loaded}
+    for doc in docs:
+        stored = by_id[doc["_id"]]
+        expected = as_vector(doc["embedding"], doc["embedding_dtype"])
+        assert np.array_equal(as_vector(stored["embedding"], stored.get("embedding_dtype")), expected)